@@ -0,0 +1,222 @@
+# archivo.py - Archivo de pedidos viejos en una base histórica
+#
+# Los pedidos finalizados o cancelados con más de N días se mueven de
+# bar_pos.db a bar_pos_historico.db por lotes, cada lote en su transacción.
+# Así la base operativa conserva solo los pedidos recientes y las consultas de
+# mesas y pedidos abiertos trabajan sobre tablas chicas.
+#
+# Las consultas que necesitan el histórico completo (facturas viejas,
+# reconstrucción de resúmenes) y el archivo mismo adjuntan la base histórica
+# (ATTACH ... AS historico) solo mientras duran, con DatabaseManager.historico(),
+# y leen de dos vistas temporales, pedidos_todos y pedido_detalles_todos, que
+# unen los datos vivos con los archivados. No queda adjunta en las conexiones:
+# con ella adjunta, cada BEGIN IMMEDIATE de un pedido tomaría también el lock
+# de escritura del histórico. Los reportes leen las tablas de resumen, que
+# quedan en la base operativa y no se archivan.
+#
+# Con WAL el COMMIT de un lote no es atómico entre las dos bases: si se corta
+# en el medio, el lote puede quedar copiado en el histórico y también vivo.
+# Las vistas ignoran la copia archivada mientras el pedido siga vivo y la
+# próxima ejecución termina de moverlo.
+#
+# Uso:
+#   python archivo.py --dias 90 [--db bar_pos.db] [--compactar]
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+from migraciones import a_centavos
+
+ALIAS = "historico"
+
+# Versión de esquema de la base histórica (PRAGMA historico.user_version);
+# 1: importes en centavos
+VERSION_HISTORICO = 1
+
+COLUMNAS_PEDIDOS = "id, mesa_id, usuario_id, fecha_hora, total, estado, tipo_venta, metodo_pago"
+COLUMNAS_DETALLES = "id, pedido_id, producto_id, cantidad, precio_unitario, subtotal"
+
+_CREAR_HISTORICO = [
+    f'''
+        CREATE TABLE IF NOT EXISTS {ALIAS}.pedidos (
+            id INTEGER PRIMARY KEY,
+            mesa_id INTEGER,
+            usuario_id INTEGER,
+            fecha_hora DATETIME,
+            total INTEGER,
+            estado TEXT,
+            tipo_venta TEXT,
+            metodo_pago TEXT
+        )
+    ''',
+    f'''
+        CREATE TABLE IF NOT EXISTS {ALIAS}.pedido_detalles (
+            id INTEGER PRIMARY KEY,
+            pedido_id INTEGER NOT NULL,
+            producto_id INTEGER,
+            cantidad INTEGER NOT NULL,
+            precio_unitario INTEGER NOT NULL,
+            subtotal INTEGER NOT NULL
+        )
+    ''',
+    f'''
+        CREATE INDEX IF NOT EXISTS {ALIAS}.idx_pedidos_estado_fecha
+        ON pedidos (estado, fecha_hora)
+    ''',
+    f'''
+        CREATE INDEX IF NOT EXISTS {ALIAS}.idx_pedido_detalles_pedido
+        ON pedido_detalles (pedido_id)
+    ''',
+]
+
+def ruta_historico(db_name):
+    """Ruta de la base histórica de una base operativa (None si es en memoria)"""
+    if db_name == ":memory:":
+        return None
+    base, extension = os.path.splitext(db_name)
+    return f"{base}_{ALIAS}{extension or '.db'}"
+
+def adjuntar(conn, ruta):
+    """Adjunta la base histórica y crea las vistas; devuelve si la adjuntó esta llamada"""
+    if ruta is None:
+        # Sin histórico las vistas son solo los datos vivos
+        conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS pedidos_todos AS "
+                     f"SELECT {COLUMNAS_PEDIDOS} FROM main.pedidos")
+        conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS pedido_detalles_todos AS "
+                     f"SELECT {COLUMNAS_DETALLES} FROM main.pedido_detalles")
+        return False
+    
+    adjuntas = [fila[1] for fila in conn.execute("PRAGMA database_list")]
+    if ALIAS in adjuntas:
+        return False
+    conn.execute(f"ATTACH DATABASE ? AS {ALIAS}", (ruta,))
+    conn.execute(f"PRAGMA {ALIAS}.journal_mode=WAL")
+    conn.execute(f"PRAGMA {ALIAS}.synchronous=NORMAL")
+    for sql in _CREAR_HISTORICO:
+        conn.execute(sql)
+    _migrar_historico(conn)
+    
+    # Un pedido presente en las dos bases (lote interrumpido) se toma de la viva
+    conn.execute(f'''
+        CREATE TEMP VIEW IF NOT EXISTS pedidos_todos AS
+        SELECT {COLUMNAS_PEDIDOS} FROM main.pedidos
+        UNION ALL
+        SELECT {COLUMNAS_PEDIDOS} FROM {ALIAS}.pedidos h
+        WHERE NOT EXISTS (SELECT 1 FROM main.pedidos p WHERE p.id = h.id)
+    ''')
+    conn.execute(f'''
+        CREATE TEMP VIEW IF NOT EXISTS pedido_detalles_todos AS
+        SELECT {COLUMNAS_DETALLES} FROM main.pedido_detalles
+        UNION ALL
+        SELECT {COLUMNAS_DETALLES} FROM {ALIAS}.pedido_detalles h
+        WHERE NOT EXISTS (SELECT 1 FROM main.pedidos p WHERE p.id = h.pedido_id)
+    ''')
+    return True
+
+def separar(conn):
+    """Quita la base histórica de la conexión (fuera de una transacción)"""
+    conn.execute(f"DETACH DATABASE {ALIAS}")
+
+def _migrar_historico(conn):
+    """Pone al día una base histórica creada por una versión anterior"""
+    def version():
+        return conn.execute(f"PRAGMA {ALIAS}.user_version").fetchone()[0]
+    
+    if version() >= VERSION_HISTORICO:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Otra conexión pudo haberla migrado mientras esperábamos el lock
+        if version() < 1:
+            # Pedidos archivados con importes en pesos; una base recién creada está vacía
+            a_centavos(conn.cursor(), [(f"{ALIAS}.pedidos", ["total"]),
+                                       (f"{ALIAS}.pedido_detalles", ["precio_unitario", "subtotal"])])
+        conn.execute(f"PRAGMA {ALIAS}.user_version = {VERSION_HISTORICO}")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+def archivar(db, dias=90, lote=1000, al_avanzar=None):
+    """Mueve al histórico los pedidos cerrados con más de `dias` días; devuelve cuántos"""
+    if db.ruta_historico is None:
+        raise ValueError("Una base en memoria no tiene histórico")
+    if dias < 1 or lote < 1:
+        raise ValueError("Los días y el tamaño de lote deben ser mayores a cero")
+    
+    limite = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+    with db.historico() as conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS archivo_lote (id INTEGER PRIMARY KEY)")
+        return _archivar_lotes(db, limite, lote, al_avanzar)
+
+def _archivar_lotes(db, limite, lote, al_avanzar):
+    """Mueve los pedidos por lotes, con el histórico ya adjunto"""
+    movidos = 0
+    while True:
+        with db.transaccion() as cursor:
+            cursor.execute("DELETE FROM archivo_lote")
+            # Los pedidos abiertos nunca se archivan
+            cursor.execute('''
+                INSERT INTO archivo_lote (id)
+                SELECT id FROM main.pedidos
+                WHERE estado IN ('finalizado', 'cancelado') AND fecha_hora < ?
+                ORDER BY id LIMIT ?
+            ''', (limite, lote))
+            cantidad = cursor.rowcount
+            if cantidad == 0:
+                break
+            
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO {ALIAS}.pedidos ({COLUMNAS_PEDIDOS})
+                SELECT {COLUMNAS_PEDIDOS} FROM main.pedidos
+                WHERE id IN (SELECT id FROM archivo_lote)
+            ''')
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO {ALIAS}.pedido_detalles ({COLUMNAS_DETALLES})
+                SELECT {COLUMNAS_DETALLES} FROM main.pedido_detalles
+                WHERE pedido_id IN (SELECT id FROM archivo_lote)
+            ''')
+            cursor.execute("DELETE FROM main.pedido_detalles "
+                           "WHERE pedido_id IN (SELECT id FROM archivo_lote)")
+            cursor.execute("DELETE FROM main.pedidos WHERE id IN (SELECT id FROM archivo_lote)")
+        
+        movidos += cantidad
+        if al_avanzar:
+            al_avanzar(movidos)
+    
+    return movidos
+
+def compactar(db):
+    """Devuelve al sistema el espacio liberado en la base operativa (toma lock exclusivo)"""
+    conn = db.get_connection()
+    conn.execute("VACUUM main")
+    conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivo de pedidos viejos en la base histórica")
+    parser.add_argument("--db", default="bar_pos.db")
+    parser.add_argument("--dias", type=int, default=90,
+                        help="archivar pedidos cerrados con más de estos días")
+    parser.add_argument("--lote", type=int, default=1000, help="pedidos por transacción")
+    parser.add_argument("--compactar", action="store_true",
+                        help="compactar la base operativa al terminar (usar fuera de horario)")
+    args = parser.parse_args()
+    
+    from database import DatabaseManager
+    db = DatabaseManager(args.db)
+    try:
+        movidos = archivar(db, args.dias, args.lote,
+                           lambda n: print(f"\r{n} pedidos archivados", end="", file=sys.stderr))
+        print(file=sys.stderr)
+        if args.compactar:
+            compactar(db)
+    finally:
+        db.close()
+    
+    print(f"{movidos} pedidos movidos a {ruta_historico(args.db)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
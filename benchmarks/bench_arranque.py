@@ -0,0 +1,99 @@
+# bench_arranque.py - Tiempo de arranque en frío hasta la pantalla de login
+#
+# Lanza el sistema en un proceso nuevo varias veces y mide desde que se crea el
+# proceso hasta que la pantalla de login queda dibujada, separando el tiempo
+# de importar main, abrir la base y armar la interfaz. Sin pantalla disponible
+# (por ejemplo en un servidor) mide solo importación y apertura de la base.
+#
+# Uso: python benchmarks/bench_arranque.py [--repeticiones 10] [--db bar_pos.db]
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Se ejecuta en el proceso hijo; imprime una línea JSON con los tiempos de cada fase
+HIJO = r'''
+import sys, time, json
+inicio = time.perf_counter()
+import main
+tiempos = {'importar_main': time.perf_counter() - inicio}
+try:
+    root = main.tk.Tk()
+except main.tk.TclError:
+    t = time.perf_counter()
+    main.get_db().close()
+    tiempos['abrir_base'] = time.perf_counter() - t
+    tiempos['pantalla'] = False
+    print(json.dumps(tiempos))
+    sys.exit(0)
+
+t = time.perf_counter()
+app = main.POSSystem(root)
+def listo():
+    root.update_idletasks()
+    tiempos['armar_login'] = time.perf_counter() - t
+    tiempos['pantalla'] = True
+    print(json.dumps(tiempos))
+    sys.stdout.flush()
+    root.destroy()
+root.after_idle(listo)
+root.mainloop()
+app.db.close()
+'''
+
+def mediana(valores):
+    valores = sorted(valores)
+    return valores[len(valores) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío hasta el login")
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--db", default=os.path.join(RAIZ, "bar_pos.db"),
+                        help="base a copiar para el arranque (no se modifica)")
+    parser.add_argument("--presupuesto-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+    
+    totales = []
+    fases = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        # El sistema abre bar_pos.db en el directorio actual: se arranca en una copia
+        if os.path.exists(args.db):
+            shutil.copy(args.db, os.path.join(directorio, "bar_pos.db"))
+        entorno = dict(os.environ, PYTHONPATH=os.path.abspath(RAIZ))
+        entorno.pop("BAR_POS_SERVICIO", None)
+        
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            salida = subprocess.run([sys.executable, "-c", HIJO], cwd=directorio, env=entorno,
+                                    capture_output=True, text=True)
+            total = time.perf_counter() - inicio
+            if salida.returncode != 0:
+                print(salida.stderr, file=sys.stderr)
+                return 1
+            datos = json.loads(salida.stdout.strip().splitlines()[-1])
+            totales.append(total * 1000)
+            pantalla = datos.pop('pantalla')
+            for fase, segundos in datos.items():
+                fases.setdefault(fase, []).append(segundos * 1000)
+    
+    print(f"repeticiones={args.repeticiones} pantalla={'sí' if pantalla else 'no'}")
+    for fase, valores in fases.items():
+        print(f"  {fase:<14} mediana={mediana(valores):7.1f} ms  máx={max(valores):7.1f} ms")
+    total = mediana(totales)
+    print(f"  {'total':<14} mediana={total:7.1f} ms  máx={max(totales):7.1f} ms "
+          "(incluye el arranque del intérprete)")
+    
+    if total > args.presupuesto_ms:
+        print(f"FALLA: el arranque supera el presupuesto de {args.presupuesto_ms:.0f} ms")
+        return 1
+    print(f"OK: arranque dentro del presupuesto de {args.presupuesto_ms:.0f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# bench_busqueda.py - Latencia de búsqueda de productos por tecla con 10k productos
+#
+# Simula a un mozo tipeando nombres letra por letra y mide cada consulta de
+# DatabaseManager.buscar_productos. Sale con código 1 si el p99 supera el
+# presupuesto (10 ms por defecto).
+#
+# Uso: python benchmarks/bench_busqueda.py [--productos 10000] [--presupuesto-ms 10]
+import os
+import sys
+import random
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import DatabaseManager
+
+BASES = ["Cerveza", "Fernet", "Gin Tonic", "Vino Malbec", "Vino Cabernet", "Whisky",
+         "Mojito", "Negroni", "Aperol Spritz", "Caipirinha", "Hamburguesa", "Pizza",
+         "Empanada", "Milanesa", "Papas", "Rabas", "Helado", "Flan", "Tiramisú", "Agua"]
+VARIANTES = ["Clásico", "Doble", "Especial", "de la Casa", "Premium", "Sin Alcohol",
+             "Frutos Rojos", "Maracuyá", "Reserva", "Roble", "Grande", "Chica"]
+
+def poblar(db, cantidad, rnd):
+    """Agrega `cantidad` productos sintéticos al catálogo"""
+    categorias = [c[0] for c in db.get_categorias()]
+    with db.transaccion() as cursor:
+        cursor.executemany(
+            "INSERT INTO productos (nombre, precio, categoria_id, stock) VALUES (?, ?, ?, ?)",
+            ((f"{rnd.choice(BASES)} {rnd.choice(VARIANTES)} {i:05d}",
+              rnd.randrange(500, 20000) * 100, rnd.choice(categorias), rnd.randrange(100))
+             for i in range(cantidad))
+        )
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de búsqueda por tecla")
+    parser.add_argument("--productos", type=int, default=10000)
+    parser.add_argument("--busquedas", type=int, default=300)
+    parser.add_argument("--presupuesto-ms", type=float, default=10.0)
+    args = parser.parse_args()
+    
+    rnd = random.Random(42)
+    with tempfile.TemporaryDirectory() as directorio:
+        db = DatabaseManager(os.path.join(directorio, "bench.db"))
+        poblar(db, args.productos, rnd)
+        
+        tiempos = []
+        resultados = 0
+        for _ in range(args.busquedas):
+            texto = f"{rnd.choice(BASES)} {rnd.choice(VARIANTES)}".lower()
+            # Una consulta por cada tecla presionada
+            for i in range(1, len(texto) + 1):
+                inicio = time.perf_counter()
+                resultados += len(db.buscar_productos(texto[:i]))
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        db.close()
+    
+    p99 = percentil(tiempos, 99)
+    print(f"productos={args.productos} teclas={len(tiempos)} resultados={resultados}")
+    print(f"p50={percentil(tiempos, 50):.2f} ms  p95={percentil(tiempos, 95):.2f} ms  "
+          f"p99={p99:.2f} ms  max={max(tiempos):.2f} ms")
+    
+    if p99 > args.presupuesto_ms:
+        print(f"FALLA: p99 supera el presupuesto de {args.presupuesto_ms} ms")
+        return 1
+    print(f"OK: p99 dentro del presupuesto de {args.presupuesto_ms} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
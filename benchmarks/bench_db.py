@@ -0,0 +1,200 @@
+# bench_db.py - Noche de servicio sintética contra DatabaseManager
+#
+# Genera una carga parecida a la de una noche real: mozos que abren mesas,
+# ráfagas de agregar_producto_pedido, consultas del pedido, líneas eliminadas,
+# cobros con métodos de pago al azar, cancelaciones y ventas directas en caja.
+# Mide latencia (p50/p95/p99) y throughput por operación sobre una base en
+# archivo temporal y otra en memoria, sin interfaz gráfica, y escribe los
+# resultados en JSON para comparar entre versiones.
+#
+# Uso:
+#   python benchmarks/bench_db.py --salida resultados.json
+#   python benchmarks/bench_db.py --comparar resultados.json
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import DatabaseManager
+
+METODOS_PAGO = ["efectivo", "tarjeta", "transferencia"]
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+def preparar(db, mesas, mozos):
+    """Completa mesas y mozos hasta la cantidad pedida; devuelve sus ids"""
+    with db.transaccion() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM mesas")
+        existentes = cursor.fetchone()[0]
+        cursor.executemany("INSERT INTO mesas (numero, capacidad) VALUES (?, 4)",
+                           [(i,) for i in range(existentes + 1, mesas + 1)])
+        cursor.execute("SELECT COUNT(*) FROM usuarios WHERE tipo = 'mozo'")
+        existentes = cursor.fetchone()[0]
+        cursor.executemany("INSERT INTO usuarios (nombre, tipo) VALUES (?, 'mozo')",
+                           [(f"Mozo {i}",) for i in range(existentes + 1, mozos + 1)])
+        cursor.execute("SELECT id FROM mesas ORDER BY numero LIMIT ?", (mesas,))
+        mesa_ids = [fila[0] for fila in cursor.fetchall()]
+        cursor.execute("SELECT id FROM usuarios WHERE tipo = 'mozo' ORDER BY id LIMIT ?", (mozos,))
+        mozo_ids = [fila[0] for fila in cursor.fetchall()]
+    return mesa_ids, mozo_ids
+
+def noche(db, pedidos, mesas, mozos, semilla):
+    """Corre la noche sintética; devuelve {operación: [latencias en ms]} y la duración"""
+    rnd = random.Random(semilla)
+    mesa_ids, mozo_ids = preparar(db, mesas, mozos)
+    productos = [p[0] for p in db.get_productos_por_categoria()]
+    # Sin stock no se miden faltantes sino la carga: se repone al empezar
+    with db.transaccion() as cursor:
+        cursor.execute("UPDATE productos SET stock = 1000000")
+    db.catalogo.invalidar()
+    
+    tiempos = {}
+    def medir(operacion, *args):
+        inicio = time.perf_counter()
+        resultado = getattr(db, operacion)(*args)
+        tiempos.setdefault(operacion, []).append((time.perf_counter() - inicio) * 1000)
+        return resultado
+    
+    libres = list(mesa_ids)
+    abiertos = {}  # pedido_id -> mesa_id (None en caja)
+    cerrados = 0
+    inicio = time.perf_counter()
+    while cerrados < pedidos:
+        accion = rnd.random()
+        if libres and (accion < 0.25 or not abiertos):
+            # Un mozo sienta una mesa y carga la primera ronda
+            mesa_id = libres.pop(rnd.randrange(len(libres)))
+            pedido_id = medir("crear_pedido", mesa_id, rnd.choice(mozo_ids), "mesa")
+            abiertos[pedido_id] = mesa_id
+            accion = 0.3
+        elif accion < 0.3:
+            # Venta directa en caja
+            pedido_id = medir("crear_pedido", None, rnd.choice(mozo_ids), "caja")
+            abiertos[pedido_id] = None
+        else:
+            pedido_id = rnd.choice(list(abiertos))
+        
+        if accion < 0.7:
+            # Ráfaga de productos cargados de a uno desde la grilla
+            for _ in range(rnd.randint(1, 8)):
+                medir("agregar_producto_pedido", pedido_id, rnd.choice(productos), rnd.randint(1, 3))
+            detalles = medir("get_detalles_pedido", pedido_id)
+            if detalles and rnd.random() < 0.05:
+                medir("eliminar_detalle_pedido", rnd.choice(detalles)[0])
+        elif accion < 0.8:
+            medir("get_pedido_activo_mesa", abiertos[pedido_id] or mesa_ids[0])
+            medir("get_mesas")
+        else:
+            mesa_id = abiertos.pop(pedido_id)
+            if rnd.random() < 0.08 or not db.get_detalles_pedido(pedido_id):
+                medir("cancelar_pedido", pedido_id)
+            else:
+                medir("finalizar_pedido", pedido_id, rnd.choice(METODOS_PAGO))
+                medir("get_pedido_completo", pedido_id)
+            if mesa_id is not None:
+                libres.append(mesa_id)
+            cerrados += 1
+    
+    return tiempos, time.perf_counter() - inicio
+
+def resumir(tiempos, duracion):
+    """Estadísticas por operación y del total"""
+    resultado = {}
+    for operacion, valores in sorted(tiempos.items()):
+        resultado[operacion] = {
+            'n': len(valores),
+            'p50_ms': round(percentil(valores, 50), 4),
+            'p95_ms': round(percentil(valores, 95), 4),
+            'p99_ms': round(percentil(valores, 99), 4),
+            'media_ms': round(sum(valores) / len(valores), 4),
+            'ops_s': round(len(valores) / (sum(valores) / 1000), 1),
+        }
+    total = sum(len(v) for v in tiempos.values())
+    resultado['total'] = {'n': total, 'duracion_s': round(duracion, 3),
+                          'ops_s': round(total / duracion, 1)}
+    return resultado
+
+def version_codigo():
+    """Commit actual del repositorio, si está disponible"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip() or None
+    except OSError:
+        return None
+
+def comparar(actual, anterior):
+    """Imprime la variación de p95 por operación respecto de una corrida anterior"""
+    print(f"\nComparación con {anterior.get('version') or 'corrida anterior'} (p95):")
+    for base, operaciones in actual['resultados'].items():
+        previas = anterior['resultados'].get(base, {})
+        for operacion, datos in operaciones.items():
+            if operacion == 'total' or operacion not in previas:
+                continue
+            antes, ahora = previas[operacion]['p95_ms'], datos['p95_ms']
+            cambio = (ahora - antes) / antes * 100 if antes else 0.0
+            print(f"  {base:<8} {operacion:<24} {antes:8.3f} -> {ahora:8.3f} ms ({cambio:+.0f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Noche de servicio sintética contra DatabaseManager")
+    parser.add_argument("--pedidos", type=int, default=2000, help="pedidos cerrados por base")
+    parser.add_argument("--mesas", type=int, default=30)
+    parser.add_argument("--mozos", type=int, default=6)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--bases", nargs="+", choices=["archivo", "memoria"],
+                        default=["archivo", "memoria"])
+    parser.add_argument("--salida", help="archivo JSON donde escribir los resultados")
+    parser.add_argument("--comparar", help="resultados JSON de una corrida anterior")
+    args = parser.parse_args()
+    
+    resultados = {}
+    for base in args.bases:
+        with tempfile.TemporaryDirectory() as directorio:
+            db = DatabaseManager(os.path.join(directorio, "bench.db") if base == "archivo"
+                                 else ":memory:")
+            tiempos, duracion = noche(db, args.pedidos, args.mesas, args.mozos, args.semilla)
+            db.close()
+        resultados[base] = resumir(tiempos, duracion)
+    
+    informe = {
+        'version': version_codigo(),
+        'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'parametros': {'pedidos': args.pedidos, 'mesas': args.mesas,
+                       'mozos': args.mozos, 'semilla': args.semilla},
+        'resultados': resultados,
+    }
+    
+    for base, operaciones in resultados.items():
+        total = operaciones['total']
+        print(f"{base}: {total['n']} operaciones en {total['duracion_s']:.2f} s "
+              f"({total['ops_s']:.0f} op/s)")
+        for operacion, datos in operaciones.items():
+            if operacion == 'total':
+                continue
+            print(f"  {operacion:<24} n={datos['n']:<6} p50={datos['p50_ms']:7.3f} ms  "
+                  f"p95={datos['p95_ms']:7.3f} ms  p99={datos['p99_ms']:7.3f} ms")
+    
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(informe, json.load(f))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
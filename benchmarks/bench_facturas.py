@@ -0,0 +1,57 @@
+# bench_facturas.py - Compara facturas por segundo: platypus vs canvas directo
+#
+# Uso: python benchmarks/bench_facturas.py [--segundos 2] [--lineas 5 50 500]
+import os
+import io
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from factura import renderizar_factura, get_plantilla
+
+def pedido_sintetico(lineas):
+    """Arma un pedido completo con la cantidad de líneas indicada"""
+    detalles = []
+    for i in range(lineas):
+        cantidad = 1 + i % 4
+        precio = (800 + (i * 137) % 3000) * 100  # centavos
+        detalles.append((cantidad, precio, cantidad * precio, f"Producto de prueba {i + 1:04d}"))
+    return {
+        'pedido': (1, "2025-08-20 21:30:00", sum(d[2] for d in detalles),
+                   'efectivo', 'mesa', 7, "Juan Pérez"),
+        'detalles': detalles
+    }
+
+def medir(pedido_completo, rapido, segundos):
+    """Renderiza en memoria durante `segundos` y devuelve facturas por segundo"""
+    n = 0
+    inicio = time.perf_counter()
+    fin = inicio + segundos
+    while True:
+        renderizar_factura(pedido_completo, io.BytesIO(), rapido=rapido)
+        n += 1
+        ahora = time.perf_counter()
+        if ahora >= fin:
+            return n / (ahora - inicio)
+
+def main():
+    parser = argparse.ArgumentParser(description="Facturas por segundo: platypus vs canvas")
+    parser.add_argument("--segundos", type=float, default=2.0,
+                        help="tiempo de medición por caso")
+    parser.add_argument("--lineas", type=int, nargs="+", default=[5, 50, 500])
+    args = parser.parse_args()
+    
+    # La plantilla se compila una vez al iniciar, igual que en la aplicación
+    get_plantilla()
+    
+    print(f"{'líneas':>7} {'platypus/s':>12} {'canvas/s':>12} {'mejora':>8}")
+    for lineas in args.lineas:
+        pedido_completo = pedido_sintetico(lineas)
+        platypus = medir(pedido_completo, False, args.segundos)
+        directo = medir(pedido_completo, True, args.segundos)
+        print(f"{lineas:>7} {platypus:>12.1f} {directo:>12.1f} {directo / platypus:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# bench_servicio.py - Prueba de carga con N terminales concurrentes
+#
+# Cada terminal es un proceso que abre mesas, carga productos de a uno y cobra
+# (o cancela) el pedido. Con --modo servicio las terminales hablan con un
+# ServicioPedidos; con --modo directo cada una abre la base por su cuenta, como
+# hasta ahora. Al final se verifica la consistencia de la base: un solo pedido
+# abierto por mesa, totales iguales a la suma de sus líneas y mesas ocupadas
+# solo si tienen pedido abierto.
+#
+# Uso: python benchmarks/bench_servicio.py [--terminales 4] [--ciclos 50] [--modo servicio]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import DatabaseManager
+from servicio import ServicioPedidos, ClienteServicio
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+def terminal(args):
+    """Simula una terminal; devuelve latencias por operación y errores"""
+    modo, destino, semilla, ciclos = args
+    rnd = random.Random(semilla)
+    db = ClienteServicio(destino) if modo == "servicio" else DatabaseManager(destino)
+    tiempos = {}
+    rechazos = 0
+    errores = []
+    
+    def medir(operacion, *parametros):
+        inicio = time.perf_counter()
+        try:
+            return getattr(db, operacion)(*parametros)
+        finally:
+            tiempos.setdefault(operacion, []).append((time.perf_counter() - inicio) * 1000)
+    
+    productos = [p[0] for p in db.get_productos_por_categoria()]
+    mesas = [m[0] for m in db.get_mesas()]
+    for _ in range(ciclos):
+        try:
+            pedido_id = medir("crear_pedido", rnd.choice(mesas), 1 + semilla % 2, "mesa")
+            for _ in range(rnd.randint(2, 6)):
+                medir("agregar_producto_pedido", pedido_id, rnd.choice(productos), rnd.randint(1, 3))
+            medir("get_detalles_pedido", pedido_id)
+            if rnd.random() < 0.1:
+                medir("cancelar_pedido", pedido_id)
+            else:
+                medir("finalizar_pedido", pedido_id, rnd.choice(["efectivo", "tarjeta"]))
+        except ValueError:
+            # Otra terminal cerró el pedido de la mesa: es un rechazo esperado
+            rechazos += 1
+        except Exception as e:
+            errores.append(f"{type(e).__name__}: {e}")
+    db.close()
+    return tiempos, rechazos, errores
+
+def verificar(db_name):
+    """Devuelve las inconsistencias encontradas en la base"""
+    db = DatabaseManager(db_name)
+    cursor = db.get_connection().cursor()
+    problemas = []
+    cursor.execute('''
+        SELECT mesa_id, COUNT(*) FROM pedidos
+        WHERE estado = 'abierto' AND mesa_id IS NOT NULL
+        GROUP BY mesa_id HAVING COUNT(*) > 1
+    ''')
+    problemas += [f"mesa {m}: {n} pedidos abiertos" for m, n in cursor.fetchall()]
+    cursor.execute('''
+        SELECT p.id, p.total, COALESCE(SUM(pd.subtotal), 0) FROM pedidos p
+        LEFT JOIN pedido_detalles pd ON pd.pedido_id = p.id
+        GROUP BY p.id HAVING p.total != COALESCE(SUM(pd.subtotal), 0)
+    ''')
+    problemas += [f"pedido {p}: total {t} != líneas {s}" for p, t, s in cursor.fetchall()]
+    cursor.execute('''
+        SELECT m.numero FROM mesas m
+        WHERE (m.estado = 'ocupada') != EXISTS (
+            SELECT 1 FROM pedidos p WHERE p.mesa_id = m.id AND p.estado = 'abierto')
+    ''')
+    problemas += [f"mesa {m}: estado inconsistente" for (m,) in cursor.fetchall()]
+    db.close()
+    return problemas
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con terminales concurrentes")
+    parser.add_argument("--terminales", type=int, default=4)
+    parser.add_argument("--ciclos", type=int, default=50, help="pedidos por terminal")
+    parser.add_argument("--modo", choices=["servicio", "directo"], default="servicio")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        db_name = os.path.join(directorio, "bench.db")
+        servicio = None
+        if args.modo == "servicio":
+            servicio = ServicioPedidos(db_name, puerto=0)
+            servicio.iniciar()
+            destino = servicio.direccion
+        else:
+            DatabaseManager(db_name).close()  # crear el esquema antes de arrancar
+            destino = db_name
+        
+        inicio = time.perf_counter()
+        with Pool(args.terminales) as pool:
+            resultados = pool.map(terminal, [(args.modo, destino, i, args.ciclos)
+                                             for i in range(args.terminales)])
+        duracion = time.perf_counter() - inicio
+        
+        if servicio:
+            servicio.detener()
+        problemas = verificar(db_name)
+    
+    tiempos = {}
+    for parciales, _, _ in resultados:
+        for operacion, valores in parciales.items():
+            tiempos.setdefault(operacion, []).extend(valores)
+    rechazos = sum(r[1] for r in resultados)
+    errores = [e for r in resultados for e in r[2]]
+    total = sum(len(v) for v in tiempos.values())
+    
+    print(f"modo={args.modo} terminales={args.terminales} operaciones={total} "
+          f"({total / duracion:.0f} op/s) rechazos={rechazos} errores={len(errores)}")
+    for operacion, valores in sorted(tiempos.items()):
+        print(f"  {operacion:<24} n={len(valores):<6} p50={percentil(valores, 50):6.2f} ms  "
+              f"p95={percentil(valores, 95):6.2f} ms  p99={percentil(valores, 99):6.2f} ms")
+    for error in sorted(set(errores))[:10]:
+        print("Error:", error)
+    for problema in problemas[:10]:
+        print("Inconsistencia:", problema)
+    
+    if errores or problemas:
+        print(f"FALLA: {len(errores)} errores, {len(problemas)} inconsistencias")
+        return 1
+    print("OK: sin errores ni inconsistencias")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# stress_pedidos.py - Prueba de concurrencia de la apertura de pedidos por mesa
+#
+# Varios procesos, cada uno con varios hilos, abren pedidos sobre las mismas
+# mesas al mismo tiempo y de vez en cuando cancelan el pedido abierto de una
+# mesa para volver a disputarla. Al final no puede haber más de un pedido
+# abierto por mesa y cada mesa ocupada debe tener su pedido abierto.
+#
+# Uso: python benchmarks/stress_pedidos.py [--procesos 4] [--hilos 4] [--rondas 200]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import DatabaseManager
+
+def hilo(db, semilla, rondas, mesas, resultado):
+    """Abre pedidos en mesas al azar y cancela algunos para volver a disputarlas"""
+    rnd = random.Random(semilla)
+    for _ in range(rondas):
+        mesa_id = rnd.choice(mesas)
+        try:
+            pedido_id = db.crear_pedido(mesa_id, 1)
+            if rnd.random() < 0.2:
+                db.cancelar_pedido(pedido_id)
+            resultado['operaciones'] += 1
+        except ValueError:
+            # Otra terminal canceló el pedido antes que nosotros
+            resultado['rechazos'] += 1
+        except Exception as e:
+            resultado['errores'].append(f"{type(e).__name__}: {e}")
+
+def proceso(args):
+    """Corre varios hilos sobre una conexión por hilo del mismo DatabaseManager"""
+    db_name, semilla, hilos, rondas, mesas = args
+    db = DatabaseManager(db_name)
+    parciales = [{'operaciones': 0, 'rechazos': 0, 'errores': []} for _ in range(hilos)]
+    trabajadores = [threading.Thread(target=hilo, args=(db, semilla * 1000 + i, rondas, mesas,
+                                                        parciales[i]))
+                    for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    db.close()
+    return {'operaciones': sum(p['operaciones'] for p in parciales),
+            'rechazos': sum(p['rechazos'] for p in parciales),
+            'errores': [e for p in parciales for e in p['errores']]}
+
+def verificar(db_name):
+    """Devuelve las inconsistencias entre pedidos abiertos y estados de mesa"""
+    db = DatabaseManager(db_name)
+    cursor = db.get_connection().cursor()
+    cursor.execute('''
+        SELECT mesa_id, COUNT(*) FROM pedidos
+        WHERE estado = 'abierto' AND mesa_id IS NOT NULL
+        GROUP BY mesa_id HAVING COUNT(*) > 1
+    ''')
+    problemas = [f"mesa {m}: {n} pedidos abiertos" for m, n in cursor.fetchall()]
+    cursor.execute('''
+        SELECT m.id, m.estado FROM mesas m
+        WHERE (m.estado = 'ocupada') != EXISTS (
+            SELECT 1 FROM pedidos p WHERE p.mesa_id = m.id AND p.estado = 'abierto')
+    ''')
+    problemas += [f"mesa {m}: estado {e} inconsistente" for m, e in cursor.fetchall()]
+    db.close()
+    return problemas
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrencia en la apertura de pedidos por mesa")
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--hilos", type=int, default=4)
+    parser.add_argument("--rondas", type=int, default=200, help="operaciones por hilo")
+    parser.add_argument("--mesas", type=int, default=3, help="mesas en disputa")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        db_name = os.path.join(directorio, "stress.db")
+        DatabaseManager(db_name).close()  # crear el esquema antes de arrancar
+        mesas = list(range(1, args.mesas + 1))
+        
+        inicio = time.perf_counter()
+        with Pool(args.procesos) as pool:
+            resultados = pool.map(proceso, [(db_name, i, args.hilos, args.rondas, mesas)
+                                            for i in range(args.procesos)])
+        duracion = time.perf_counter() - inicio
+        problemas = verificar(db_name)
+    
+    operaciones = sum(r['operaciones'] for r in resultados)
+    errores = [e for r in resultados for e in r['errores']]
+    print(f"procesos={args.procesos} hilos={args.hilos} mesas={args.mesas} "
+          f"operaciones={operaciones} ({operaciones / duracion:.0f} op/s) "
+          f"rechazos={sum(r['rechazos'] for r in resultados)} errores={len(errores)}")
+    for error in sorted(set(errores))[:10]:
+        print("Error:", error)
+    for problema in problemas:
+        print("Inconsistencia:", problema)
+    
+    if errores or problemas:
+        print(f"FALLA: {len(errores)} errores, {len(problemas)} inconsistencias")
+        return 1
+    print("OK: un solo pedido abierto por mesa")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
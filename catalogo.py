@@ -0,0 +1,321 @@
+# catalogo.py - Importación y exportación masiva del catálogo (CSV / JSON Lines)
+#
+# Los archivos se leen fila por fila con generadores: nunca se cargan completos
+# en memoria. Cada fila se valida al leerla y se acumula en una tabla temporal
+# con executemany por lotes; cada lote se aplica con tres sentencias sobre
+# todo el conjunto (alta de categorías, actualización y alta de productos).
+# Toda la importación corre en una sola transacción: si alguna fila es
+# inválida no se aplica nada.
+#
+# Un producto se identifica por su código; si la fila no trae código (o el
+# código todavía no existe) se busca por nombre entre los productos sin código.
+# Los precios de los archivos están en pesos; en la base, en centavos. Un precio
+# con un único grupo de miles ('1.500') solo se acepta indicando con --miles el
+# separador de miles de la lista (ver moneda.a_centavos).
+#
+# Uso:
+#   python catalogo.py importar lista_precios.csv [--simular] [--miles .]
+#   python catalogo.py exportar catalogo.jsonl
+import os
+import sys
+import csv
+import json
+import sqlite3
+import argparse
+
+import moneda
+
+COLUMNAS = ["codigo", "nombre", "categoria", "precio", "stock", "stock_minimo", "activo"]
+OBLIGATORIAS = ["nombre", "categoria", "precio"]
+
+TAMANO_LOTE = 5000
+MAX_ERRORES = 20  # errores informados antes de abandonar la validación
+
+VERDADEROS = ["1", "si", "sí", "s", "true", "verdadero", "x"]
+FALSOS = ["0", "no", "n", "false", "falso", ""]
+
+def formato_de(ruta):
+    """Deduce el formato por la extensión del archivo"""
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".json", ".ndjson"):
+        return "jsonl"
+    raise ValueError("Formato no soportado (use .csv o .jsonl)")
+
+def _entero(valor):
+    """Convierte '10', 10 o 10.0 en entero"""
+    if isinstance(valor, bool):
+        raise ValueError
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return int(str(valor).strip())
+
+def _booleano(valor):
+    if isinstance(valor, bool):
+        return int(valor)
+    texto = str(valor).strip().lower()
+    if texto in VERDADEROS:
+        return 1
+    if texto in FALSOS:
+        return 0
+    raise ValueError
+
+def validar(fila, linea, miles=None):
+    """Normaliza una fila del archivo; devuelve la tupla para la tabla temporal"""
+    def campo(nombre):
+        valor = fila.get(nombre)
+        if valor is None or (isinstance(valor, str) and not valor.strip()):
+            return None
+        return valor.strip() if isinstance(valor, str) else valor
+    
+    for nombre in OBLIGATORIAS:
+        if campo(nombre) is None:
+            raise ValueError(f"Línea {linea}: falta {nombre}")
+    
+    try:
+        precio = moneda.a_centavos(campo("precio"), miles)
+    except ValueError as e:
+        raise ValueError(f"Línea {linea}: precio inválido ({e})")
+    if precio < 0:
+        raise ValueError(f"Línea {linea}: el precio no puede ser negativo")
+    
+    opcionales = []
+    for nombre, conversion in (("stock", _entero), ("stock_minimo", _entero), ("activo", _booleano)):
+        valor = campo(nombre)
+        try:
+            opcionales.append(None if valor is None else conversion(valor))
+        except (ValueError, TypeError):
+            raise ValueError(f"Línea {linea}: {nombre} inválido ({fila.get(nombre)!r})")
+    
+    codigo = campo("codigo")
+    codigo = None if codigo is None else str(codigo)
+    nombre = str(campo("nombre"))
+    # Dentro del archivo, una fila repetida reemplaza a la anterior
+    clave = f"c:{codigo}" if codigo else f"n:{nombre}"
+    return (clave, codigo, nombre, str(campo("categoria")), precio, *opcionales)
+
+def leer_csv(ruta):
+    """Genera (línea, fila) de un CSV con encabezado; acepta ',' o ';' como separador"""
+    with open(ruta, newline="", encoding="utf-8-sig") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.DictReader(f, dialect=dialecto)
+        lector.fieldnames = [c.strip().lower() for c in lector.fieldnames or []]
+        for fila in lector:
+            yield lector.line_num, fila
+
+def leer_jsonl(ruta):
+    """Genera (línea, fila) de un archivo JSON Lines (un objeto por línea)"""
+    with open(ruta, encoding="utf-8-sig") as f:
+        for linea, texto in enumerate(f, 1):
+            if not texto.strip():
+                continue
+            try:
+                fila = json.loads(texto)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Línea {linea}: JSON inválido ({e.msg})")
+            if not isinstance(fila, dict):
+                raise ValueError(f"Línea {linea}: se esperaba un objeto")
+            yield linea, {clave.lower(): valor for clave, valor in fila.items()}
+
+def leer(ruta):
+    """Genera las filas de un archivo de catálogo según su formato"""
+    return leer_csv(ruta) if formato_de(ruta) == "csv" else leer_jsonl(ruta)
+
+class _Simulacion(Exception):
+    """Deshace la transacción de una importación simulada"""
+
+def _aplicar_lote(cursor, lote, resultado):
+    """Aplica un lote de filas validadas sobre categorías y productos"""
+    cursor.executemany('''
+        INSERT OR REPLACE INTO importacion
+            (clave, codigo, nombre, categoria, precio, stock, stock_minimo, activo)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', lote)
+    cursor.execute('''
+        INSERT OR IGNORE INTO categorias (nombre)
+        SELECT DISTINCT categoria FROM importacion
+    ''')
+    resultado['categorias'] += cursor.rowcount
+    
+    # Resolver el producto de cada fila: por código y, si no, por nombre
+    cursor.execute('''
+        UPDATE importacion SET producto_id = COALESCE(
+            (SELECT p.id FROM productos p
+             WHERE importacion.codigo IS NOT NULL AND p.codigo = importacion.codigo),
+            (SELECT p.id FROM productos p
+             WHERE p.nombre = importacion.nombre AND p.codigo IS NULL
+             ORDER BY p.id LIMIT 1)
+        )
+    ''')
+    
+    # Solo se escriben los productos que cambian: menos triggers de catálogo y FTS
+    cursor.execute('''
+        UPDATE productos SET
+            codigo = COALESCE(i.codigo, productos.codigo),
+            nombre = i.nombre,
+            precio = i.precio,
+            categoria_id = c.id,
+            stock = COALESCE(i.stock, productos.stock),
+            stock_minimo = COALESCE(i.stock_minimo, productos.stock_minimo),
+            activo = COALESCE(i.activo, productos.activo)
+        FROM importacion i JOIN categorias c ON c.nombre = i.categoria
+        WHERE productos.id = i.producto_id
+          AND (productos.codigo IS NOT COALESCE(i.codigo, productos.codigo)
+               OR productos.nombre IS NOT i.nombre
+               OR productos.precio IS NOT i.precio
+               OR productos.categoria_id IS NOT c.id
+               OR productos.stock IS NOT COALESCE(i.stock, productos.stock)
+               OR productos.stock_minimo IS NOT COALESCE(i.stock_minimo, productos.stock_minimo)
+               OR productos.activo IS NOT COALESCE(i.activo, productos.activo))
+    ''')
+    resultado['actualizados'] += cursor.rowcount
+    
+    cursor.execute('''
+        INSERT INTO productos (codigo, nombre, precio, categoria_id, stock, stock_minimo, activo)
+        SELECT i.codigo, i.nombre, i.precio, c.id, COALESCE(i.stock, 0),
+               COALESCE(i.stock_minimo, 5), COALESCE(i.activo, 1)
+        FROM importacion i JOIN categorias c ON c.nombre = i.categoria
+        WHERE i.producto_id IS NULL
+    ''')
+    resultado['insertados'] += cursor.rowcount
+    cursor.execute("DELETE FROM importacion")
+
+def importar(db, filas, tamano_lote=TAMANO_LOTE, simular=False, miles=None):
+    """Importa filas (línea, dict) en una sola transacción; devuelve los totales
+    
+    Con simular=True valida y calcula los cambios pero deshace todo al final.
+    `miles` es el separador de miles de los precios ('.' o ','), si se conoce.
+    """
+    resultado = {'filas': 0, 'insertados': 0, 'actualizados': 0, 'categorias': 0}
+    errores = []
+    conn = db.get_connection()
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS importacion (
+            clave TEXT PRIMARY KEY,
+            codigo TEXT,
+            nombre TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            precio INTEGER NOT NULL,
+            stock INTEGER,
+            stock_minimo INTEGER,
+            activo INTEGER,
+            producto_id INTEGER
+        )
+    ''')
+    
+    try:
+        with db.transaccion() as cursor:
+            cursor.execute("DELETE FROM importacion")
+            lote = []
+            for linea, fila in filas:
+                resultado['filas'] += 1
+                try:
+                    lote.append(validar(fila, linea, miles))
+                except ValueError as e:
+                    errores.append(str(e))
+                    if len(errores) >= MAX_ERRORES:
+                        break
+                
+                if len(lote) >= tamano_lote:
+                    # Con errores se sigue validando, pero ya no se escribe nada
+                    if not errores:
+                        _aplicar_lote(cursor, lote, resultado)
+                    lote = []
+            
+            if errores:
+                raise ValueError("Importación cancelada, no se aplicó ningún cambio:\n"
+                                 + "\n".join(errores))
+            if lote:
+                _aplicar_lote(cursor, lote, resultado)
+            if simular:
+                raise _Simulacion()
+    except _Simulacion:
+        pass
+    finally:
+        db.catalogo.invalidar()
+        db.vigilante_stock.invalidar()
+    
+    return resultado
+
+def filas_catalogo(db):
+    """Genera los productos del catálogo como diccionarios, leyendo con un cursor"""
+    cursor = db.get_connection().cursor()
+    cursor.execute('''
+        SELECT p.codigo, p.nombre, c.nombre, p.precio, p.stock, p.stock_minimo, p.activo
+        FROM productos p
+        LEFT JOIN categorias c ON c.id = p.categoria_id
+        ORDER BY c.nombre, p.nombre
+    ''')
+    try:
+        for fila in cursor:
+            fila = dict(zip(COLUMNAS, fila))
+            fila['precio'] = moneda.a_pesos(fila['precio'])
+            yield fila
+    finally:
+        cursor.close()
+
+def exportar(db, ruta):
+    """Escribe el catálogo completo en CSV o JSON Lines; devuelve la cantidad de productos"""
+    formato = formato_de(ruta)
+    cantidad = 0
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", newline="", encoding="utf-8") as f:
+        if formato == "csv":
+            escritor = csv.DictWriter(f, fieldnames=COLUMNAS)
+            escritor.writeheader()
+        for fila in filas_catalogo(db):
+            if formato == "csv":
+                escritor.writerow(fila)
+            else:
+                f.write(json.dumps(fila, ensure_ascii=False) + "\n")
+            cantidad += 1
+    os.replace(temporal, ruta)
+    return cantidad
+
+def main():
+    parser = argparse.ArgumentParser(description="Importación y exportación del catálogo")
+    parser.add_argument("accion", choices=["importar", "exportar"])
+    parser.add_argument("archivo", help="archivo .csv o .jsonl")
+    parser.add_argument("--db", default="bar_pos.db")
+    parser.add_argument("--simular", action="store_true",
+                        help="validar e informar los cambios sin aplicarlos")
+    parser.add_argument("--miles", choices=[".", ","],
+                        help="separador de miles de los precios (para valores como 1.500)")
+    args = parser.parse_args()
+    
+    from database import DatabaseManager
+    try:
+        db = DatabaseManager(args.db)
+    except sqlite3.Error as e:
+        print(f"No se pudo abrir la base de datos: {e}", file=sys.stderr)
+        return 1
+    
+    try:
+        if args.accion == "exportar":
+            print(f"{exportar(db, args.archivo)} productos exportados a {args.archivo}")
+        else:
+            resultado = importar(db, leer(args.archivo), simular=args.simular,
+                                 miles=args.miles)
+            print(f"{resultado['filas']} filas: {resultado['insertados']} productos nuevos, "
+                  f"{resultado['actualizados']} actualizados, "
+                  f"{resultado['categorias']} categorías nuevas"
+                  + (" (simulación, sin cambios)" if args.simular else ""))
+    except (ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    except sqlite3.Error as e:
+        # Base bloqueada por otra terminal, restricción violada, etc.: nada quedó aplicado
+        print(f"Error de la base de datos: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
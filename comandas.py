@@ -0,0 +1,259 @@
+# comandas.py - Despacho de comandas a barra y cocina
+#
+# agregar_productos_pedido deja una fila en la tabla comandas (la bandeja de
+# salida) dentro de la misma transacción que las líneas del pedido. Un hilo
+# despachador revisa la bandeja, espera a que el mozo termine de cargar la
+# ronda (una ventana corta sin líneas nuevas), agrupa las líneas por estación
+# y pedido y manda cada ticket a la salida de su estación sin frenar la
+# pantalla de venta. Quitar la línea o cancelar el pedido antes de que la
+# comanda salga la descarta en la misma transacción.
+#
+# Las filas se reservan por unos segundos antes de imprimir (despachador y
+# vence), así que varias terminales sobre la misma base no imprimen dos
+# veces, y si un proceso muere con filas reservadas otro las retoma al
+# vencer la reserva. La entrega es al menos una vez: un corte entre imprimir
+# y marcar la fila como enviada repite ese ticket al reiniciar.
+#
+# Salidas por estación (BAR_POS_COMANDAS, separadas por ';'):
+#   barra=archivo:comandas/barra.txt;cocina=socket:127.0.0.1:9100
+# Por defecto cada estación escribe en comandas/<estacion>.txt.
+# BAR_POS_COMANDAS=0 desactiva el despacho en esta terminal.
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime
+
+ESTACIONES = ["barra", "cocina"]
+DIRECTORIO_COMANDAS = "comandas"
+
+VENTANA = 0.4        # segundos sin cargas nuevas para dar por terminada una ronda
+ESPERA_MAXIMA = 3.0  # segundos que puede esperar una línea aunque la ronda siga
+INTERVALO = 0.25     # segundos entre revisiones de la bandeja
+RESERVA = 10.0       # segundos que una terminal retiene las filas que imprime
+REINTENTO = 5.0      # segundos antes de reintentar una salida que falló
+LOTE = 200           # filas por revisión
+CONSERVAR_DIAS = 1   # las comandas enviadas se borran después de este tiempo
+
+# Comandos ESC/POS: inicializar la impresora y cortar el papel
+ESC_INICIAR = b"\x1b@"
+ESC_CORTAR = b"\n\n\n\x1dV\x00"
+
+log = logging.getLogger("bar_pos.comandas")
+
+class SalidaArchivo:
+    """Agrega cada ticket al final de un archivo de texto"""
+    
+    def __init__(self, ruta):
+        self.ruta = ruta
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+    
+    def enviar(self, texto):
+        with open(self.ruta, "a", encoding="utf-8") as f:
+            f.write(texto + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def cerrar(self):
+        pass
+
+class SalidaSocket:
+    """Manda cada ticket por TCP, como a una impresora ESC/POS de red (puerto 9100)"""
+    
+    def __init__(self, host, puerto, timeout=3):
+        self.host = host
+        self.puerto = puerto
+        self.timeout = timeout
+        self._conexion = None
+    
+    def enviar(self, texto):
+        datos = ESC_INICIAR + texto.encode("cp850", errors="replace") + ESC_CORTAR
+        try:
+            if self._conexion is None:
+                self._conexion = socket.create_connection((self.host, self.puerto), self.timeout)
+            self._conexion.sendall(datos)
+        except OSError:
+            # La impresora se reinició o se desconectó: reconectar en el próximo envío
+            self.cerrar()
+            raise
+    
+    def cerrar(self):
+        if self._conexion is not None:
+            try:
+                self._conexion.close()
+            except OSError:
+                pass
+            self._conexion = None
+
+def crear_salidas(configuracion=None):
+    """Arma las salidas por estación a partir de 'estacion=tipo:destino;...'"""
+    salidas = {estacion: SalidaArchivo(os.path.join(DIRECTORIO_COMANDAS, f"{estacion}.txt"))
+               for estacion in ESTACIONES}
+    for parte in (configuracion or "").split(";"):
+        if not parte.strip():
+            continue
+        estacion, _, destino = parte.partition("=")
+        tipo, _, direccion = destino.partition(":")
+        estacion = estacion.strip()
+        if estacion not in ESTACIONES:
+            raise ValueError(f"Estación desconocida: {estacion}")
+        if tipo == "archivo":
+            salidas[estacion] = SalidaArchivo(direccion)
+        elif tipo == "socket":
+            host, _, puerto = direccion.rpartition(":")
+            salidas[estacion] = SalidaSocket(host or "127.0.0.1", int(puerto))
+        else:
+            raise ValueError(f"Salida de comandas no válida: {parte}")
+    return salidas
+
+def formatear_ticket(estacion, pedido_id, mesa, mozo, lineas):
+    """Texto del ticket de una estación: encabezado y una línea por producto"""
+    encabezado = f"Mesa {mesa}" if mesa is not None else "Caja"
+    texto = [
+        f"==== {estacion.upper()} ====",
+        f"{encabezado} - {mozo or ''}".rstrip(" -"),
+        f"{datetime.now().strftime('%d/%m/%Y %H:%M')}   Pedido {pedido_id:06d}",
+        "-" * 32,
+    ]
+    texto += [f"{cantidad:>3} x {nombre}" for cantidad, nombre in lineas]
+    return "\n".join(texto) + "\n"
+
+class Despachador:
+    """Hilo que lleva las comandas pendientes de la base a las salidas de cada estación"""
+    
+    def __init__(self, db, salidas, ventana=VENTANA, intervalo=INTERVALO):
+        self.db = db
+        self.salidas = salidas
+        self.ventana = ventana
+        self.intervalo = intervalo
+        self.nombre = uuid.uuid4().hex  # identifica las reservas de esta terminal
+        self._detener = threading.Event()
+        self._hilo = None
+    
+    def iniciar(self):
+        self._purgar()
+        self._hilo = threading.Thread(target=self._ejecutar, name="comandas", daemon=True)
+        self._hilo.start()
+        return self
+    
+    def detener(self, espera=5):
+        """Termina el hilo; lo que quede pendiente sale en el próximo arranque"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+        for salida in self.salidas.values():
+            salida.cerrar()
+    
+    def _purgar(self):
+        with self.db.transaccion() as cursor:
+            cursor.execute("DELETE FROM comandas WHERE enviada IS NOT NULL AND enviada < datetime('now', ?)",
+                           (f"-{CONSERVAR_DIAS} days",))
+    
+    def _ejecutar(self):
+        while not self._detener.is_set():
+            espera = self.intervalo
+            try:
+                self.despachar()
+            except Exception:
+                log.exception("Error al despachar comandas")
+                espera = REINTENTO
+            self._detener.wait(espera)
+    
+    def despachar(self):
+        """Despacha las comandas listas; devuelve cuántas líneas salieron"""
+        # Casi siempre no hay nada para tomar: se mira sin el lock de escritura
+        ahora = time.time()
+        cursor = self.db.get_connection().cursor()
+        cursor.execute('''
+            SELECT 1 FROM comandas INDEXED BY idx_comandas_pendientes
+            WHERE enviada IS NULL AND creada <= ? AND (vence IS NULL OR vence < ?)
+            LIMIT 1
+        ''', (ahora - self.ventana, ahora))
+        if cursor.fetchone() is None:
+            return 0
+        
+        filas = self._reservar(ahora)
+        if filas:
+            self._enviar(filas)
+        return len(filas)
+    
+    def _reservar(self, ahora):
+        """Toma las comandas listas que no están reservadas por otra terminal
+        
+        Las líneas de un pedido para una estación están listas cuando el mozo
+        dejó de cargar durante la ventana, o cuando la primera ya esperó
+        ESPERA_MAXIMA aunque la carga siga.
+        """
+        with self.db.transaccion() as cursor:
+            cursor.execute('''
+                UPDATE comandas SET despachador = ?, vence = ?
+                WHERE id IN (
+                    SELECT c.id FROM comandas c INDEXED BY idx_comandas_pendientes
+                    JOIN (
+                        SELECT pedido_id, estacion FROM comandas INDEXED BY idx_comandas_pendientes
+                        WHERE enviada IS NULL
+                        GROUP BY pedido_id, estacion
+                        HAVING MAX(creada) <= ? OR MIN(creada) <= ?
+                    ) listas USING (pedido_id, estacion)
+                    WHERE c.enviada IS NULL AND (c.vence IS NULL OR c.vence < ?)
+                    ORDER BY c.id LIMIT ?
+                )
+            ''', (self.nombre, ahora + RESERVA, ahora - self.ventana, ahora - ESPERA_MAXIMA,
+                  ahora, LOTE))
+            if cursor.rowcount == 0:
+                return []
+            
+            cursor.execute('''
+                SELECT co.id, co.estacion, co.pedido_id, m.numero, u.nombre,
+                       co.cantidad, COALESCE(pr.nombre, 'Producto ' || co.producto_id)
+                FROM comandas co
+                JOIN pedidos p ON p.id = co.pedido_id
+                LEFT JOIN mesas m ON m.id = p.mesa_id
+                LEFT JOIN usuarios u ON u.id = p.usuario_id
+                LEFT JOIN productos pr ON pr.id = co.producto_id
+                WHERE co.despachador = ? AND co.vence = ? AND co.enviada IS NULL
+                ORDER BY co.id
+            ''', (self.nombre, ahora + RESERVA))
+            return cursor.fetchall()
+    
+    def _enviar(self, filas):
+        """Imprime un ticket por estación y pedido; marca como enviadas las que salieron"""
+        tickets = {}
+        for id_, estacion, pedido_id, mesa, mozo, cantidad, nombre in filas:
+            ticket = tickets.setdefault((estacion, pedido_id), {'mesa': mesa, 'mozo': mozo,
+                                                                'ids': [], 'lineas': {}})
+            ticket['ids'].append(id_)
+            # El mismo producto cargado dos veces en la ronda sale en una sola línea
+            ticket['lineas'][nombre] = ticket['lineas'].get(nombre, 0) + cantidad
+        
+        enviadas, fallidas = [], []
+        for (estacion, pedido_id), ticket in tickets.items():
+            lineas = [(cantidad, nombre) for nombre, cantidad in ticket['lineas'].items()]
+            texto = formatear_ticket(estacion, pedido_id, ticket['mesa'], ticket['mozo'], lineas)
+            try:
+                self.salidas[estacion].enviar(texto)
+                enviadas += ticket['ids']
+            except Exception:
+                log.exception("No se pudo enviar la comanda del pedido %s a %s", pedido_id, estacion)
+                fallidas += ticket['ids']
+        
+        with self.db.transaccion() as cursor:
+            cursor.executemany("UPDATE comandas SET enviada = datetime('now') WHERE id = ?",
+                               [(id_,) for id_ in enviadas])
+            # Las que fallaron quedan pendientes y se reintentan cuando vence la espera
+            cursor.executemany('''
+                UPDATE comandas SET vence = ?, intentos = intentos + 1, despachador = NULL
+                WHERE id = ?
+            ''', [(time.time() + REINTENTO, id_) for id_ in fallidas])
+
+def iniciar(db):
+    """Arranca el despachador de comandas de esta terminal; None si está desactivado"""
+    configuracion = os.environ.get("BAR_POS_COMANDAS", "")
+    if configuracion == "0" or not hasattr(db, 'get_connection'):
+        # Con el servicio de pedidos, despacha el proceso del servicio
+        return None
+    return Despachador(db, crear_salidas(configuracion)).iniciar()
@@ -1,129 +1,485 @@
 # database.py - Configuración y manejo de la base de datos
 import sqlite3
 import os
+import time
+import weakref
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from migraciones import aplicar_migraciones, get_version, VERSION_ACTUAL
+import resumenes
+import archivo
 
-class DatabaseManager:
-    def __init__(self, db_name="bar_pos.db"):
+class _Testigo:
+    """Objeto guardado en el threading.local de un hilo: se descarta cuando el hilo termina"""
+
+class ConnectionManager:
+    """Mantiene una conexión persistente por hilo, configurada una sola vez
+    
+    La conexión de un hilo se cierra sola cuando el hilo termina, o antes con
+    liberar(), así que los hilos de trabajo de corta vida no dejan conexiones
+    abiertas.
+    """
+    
+    def __init__(self, db_name, busy_timeout=5000, cached_statements=256):
         self.db_name = db_name
-        self.init_database()
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._conexiones = []
+        self._lock = threading.Lock()
+        self._cerrado = False
+        self._al_conectar = []  # funciones aplicadas a cada conexión nueva
+        
+        # Las bases en memoria se comparten entre hilos con una URI de caché compartida
+        if db_name == ":memory:":
+            self._destino = f"file:bar_pos_mem_{id(self)}?mode=memory&cache=shared"
+            self._uri = True
+        else:
+            self._destino = db_name
+            self._uri = False
+        
+        # La base en memoria vive mientras haya al menos una conexión abierta: se
+        # sostiene con una propia, que no depende de que siga vivo ningún hilo
+        if self._uri:
+            self._conexiones.append(self._conectar())
+        self.get()
     
-    def get_connection(self):
-        """Obtiene conexión a la base de datos"""
-        return sqlite3.connect(self.db_name)
+    def get(self):
+        """Obtiene la conexión del hilo actual, creándola si hace falta"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self._cerrado:
+                raise sqlite3.ProgrammingError("El administrador de conexiones está cerrado")
+            conn = self._conectar()
+            with self._lock:
+                self._conexiones.append(conn)
+            self._local.conn = conn
+            # Cuando el hilo termina se descarta su threading.local con el testigo
+            # y el finalizador cierra la conexión
+            self._local.testigo = testigo = _Testigo()
+            self._local.finalizador = weakref.finalize(testigo, self._soltar, conn)
+            self._local.finalizador.atexit = False  # al salir cierra cerrar()
+        return conn
     
-    def init_database(self):
-        """Inicializa la base de datos con todas las tablas necesarias"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Tabla de categorías
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categorias (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL UNIQUE,
-                activo INTEGER DEFAULT 1
-            )
-        ''')
-        
-        # Tabla de productos
+    def liberar(self):
+        """Cierra la conexión del hilo actual; la próxima llamada a get() abre otra"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            self._local.finalizador()
+    
+    def abiertas(self):
+        """Cantidad de conexiones abiertas en este momento"""
+        with self._lock:
+            return len(self._conexiones)
+    
+    def _soltar(self, conn):
+        """Cierra una conexión y la quita de las abiertas"""
+        with self._lock:
+            if conn in self._conexiones:
+                self._conexiones.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    
+    def _conectar(self):
+        """Abre y configura una nueva conexión"""
+        # isolation_level=None: las transacciones se abren explícitamente con BEGIN
+        conn = sqlite3.connect(self._destino, uri=self._uri,
+                               timeout=self.busy_timeout / 1000,
+                               isolation_level=None,
+                               check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        if not self._uri:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        for funcion in self._al_conectar:
+            funcion(conn)
+        return conn
+    
+    def al_conectar(self, funcion):
+        """Registra una función que configura cada conexión, incluidas las ya abiertas"""
+        with self._lock:
+            self._al_conectar.append(funcion)
+            conexiones = list(self._conexiones)
+        for conn in conexiones:
+            funcion(conn)
+    
+    def cerrar(self):
+        """Cierra todas las conexiones abiertas por cualquier hilo"""
+        with self._lock:
+            self._cerrado = True
+            conexiones, self._conexiones = self._conexiones, []
+        for conn in conexiones:
+            try:
+                if not self._uri:
+                    conn.execute("PRAGMA optimize")
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+class CatalogoCache:
+    """Caché en memoria de categorías y productos activos
+    
+    Se invalida al escribir el menú desde este proceso y, para detectar cambios
+    de otros procesos, compara PRAGMA data_version (barato, sin leer tablas) y
+    solo si cambió consulta las versiones del catálogo y del stock que mantienen
+    los triggers. Si solo cambió el stock (una venta de otra terminal) se relee
+    el stock de los productos sin recargar el menú.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._version = None
+        self._version_stock = None
+        self._categorias = []
+        self._por_categoria = {}
+        self._por_id = {}
+        self._posiciones = {}  # producto_id -> (índice en _todos, categoria_id, índice en la categoría)
+        self._todos = []
+    
+    def invalidar(self):
+        """Descarta la caché; se recarga en la próxima lectura"""
+        with self._lock:
+            self._version = None
+    
+    def _vigente(self):
+        """Verifica que la caché siga al día y la recarga si hace falta"""
+        conn = self.db.get_connection()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._version is not None and getattr(self._local, 'data_version', None) == data_version:
+            return
+        
+        version, version_stock = self.db._leer_versiones_catalogo()
+        with self._lock:
+            if self._version != version:
+                self._cargar(version)
+            elif self._version_stock != version_stock:
+                self._aplicar_stock(self.db._leer_stock())
+            self._version_stock = version_stock
+        self._local.data_version = data_version
+    
+    def _cargar(self, version):
+        """Carga el catálogo completo y lo indexa por categoría y por id"""
+        categorias, filas = self.db._leer_catalogo()
+        
+        por_categoria = {}
+        por_id = {}
+        todos = []
+        for fila in filas:
+            producto = fila[:5]
+            todos.append(producto)
+            por_id[producto[0]] = producto
+            por_categoria.setdefault(fila[5], []).append(producto)
+        
+        # Dentro de cada categoría se ordena solo por nombre de producto
+        for productos in por_categoria.values():
+            productos.sort(key=lambda p: p[1])
+        
+        # Posición de cada producto en las listas, para cambiar su stock sin buscarlo
+        en_categoria = {}
+        for categoria_id, productos in por_categoria.items():
+            for indice, producto in enumerate(productos):
+                en_categoria[producto[0]] = (categoria_id, indice)
+        posiciones = {producto[0]: (indice,) + en_categoria[producto[0]]
+                      for indice, producto in enumerate(todos)}
+        
+        self._categorias = categorias
+        self._por_categoria = por_categoria
+        self._por_id = por_id
+        self._posiciones = posiciones
+        self._todos = todos
+        self._version = version
+    
+    def actualizar_stock(self, movimientos):
+        """Refleja en la caché el stock de los productos (id, nombre, stock, ...) vendidos"""
+        with self._lock:
+            if self._version is None:
+                return
+            self._aplicar_stock(movimientos)
+    
+    def _aplicar_stock(self, movimientos):
+        """Reemplaza el stock de los productos en caché; se llama con el lock tomado"""
+        for movimiento in movimientos:
+            producto_id, stock = movimiento[0], movimiento[2]
+            anterior = self._por_id.get(producto_id)
+            if anterior is None or anterior[3] == stock:
+                continue
+            
+            nuevo = anterior[:3] + (stock,) + anterior[4:]
+            indice, categoria_id, indice_categoria = self._posiciones[producto_id]
+            self._por_id[producto_id] = nuevo
+            self._todos[indice] = nuevo
+            self._por_categoria[categoria_id][indice_categoria] = nuevo
+    
+    def get_productos(self, categoria_id=None):
+        """Productos activos de una categoría, o todos si categoria_id es None"""
+        self._vigente()
+        if categoria_id:
+            return list(self._por_categoria.get(categoria_id, []))
+        return list(self._todos)
+    
+    def get_producto(self, producto_id):
+        """Producto activo por id, o None"""
+        self._vigente()
+        return self._por_id.get(producto_id)
+    
+    def get_categorias(self):
+        """Categorías activas ordenadas por nombre"""
+        self._vigente()
+        return list(self._categorias)
+
+class VigilanteStock:
+    """Sigue los productos con stock en o por debajo de su mínimo
+    
+    Se carga desde el índice parcial idx_productos_stock_bajo y luego se
+    actualiza solo con los productos que movió cada venta, sin recorrer la tabla.
+    Si PRAGMA data_version indica que otra conexión (otra terminal) escribió, se
+    vuelve a cargar antes de responder.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._bajos = None  # producto_id -> (nombre, stock, stock_minimo)
+    
+    def _cargar(self):
+        cursor = self.db.get_connection().cursor()
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS productos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                precio DECIMAL(10,2) NOT NULL,
-                categoria_id INTEGER,
-                stock INTEGER DEFAULT 0,
-                activo INTEGER DEFAULT 1,
-                FOREIGN KEY (categoria_id) REFERENCES categorias (id)
-            )
+            SELECT id, nombre, stock, stock_minimo FROM productos INDEXED BY idx_productos_stock_bajo
+            WHERE stock <= stock_minimo AND activo = 1
         ''')
+        self._bajos = {fila[0]: tuple(fila[1:]) for fila in cursor.fetchall()}
+    
+    def get_bajos(self):
+        """Productos en alerta: lista de (id, nombre, stock, stock_minimo)"""
+        data_version = self.db.get_connection().execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            if self._bajos is None or getattr(self._local, 'data_version', None) != data_version:
+                self._cargar()
+            self._local.data_version = data_version
+            return [(producto_id,) + datos for producto_id, datos in sorted(self._bajos.items())]
+    
+    def registrar(self, movimientos):
+        """Aplica (id, nombre, stock, stock_minimo) y devuelve los que entraron en alerta o bajaron"""
+        alertas = []
+        with self._lock:
+            if self._bajos is None:
+                self._cargar()
+                # La carga ya refleja estos movimientos: informar los que están en alerta
+                return [m for m in movimientos if m[0] in self._bajos]
+            
+            for producto_id, nombre, stock, stock_minimo in movimientos:
+                anterior = self._bajos.get(producto_id)
+                if stock_minimo is not None and stock <= stock_minimo:
+                    self._bajos[producto_id] = (nombre, stock, stock_minimo)
+                    if anterior is None or stock < anterior[1]:
+                        alertas.append((producto_id, nombre, stock, stock_minimo))
+                elif anterior is not None:
+                    del self._bajos[producto_id]
+        return alertas
+    
+    def invalidar(self):
+        """Descarta lo seguido; se recarga del índice en la próxima consulta"""
+        with self._lock:
+            self._bajos = None
+
+class DatabaseManager:
+    # Qué hacer al finalizar si un producto no tiene stock suficiente:
+    # 'permitir' (el stock puede quedar negativo y no se devuelven alertas),
+    # 'advertir' (se permite y se devuelven las alertas de stock bajo) o
+    # 'rechazar' (no se finaliza el pedido). Se configura con BAR_POS_POLITICA_STOCK.
+    POLITICAS_STOCK = ['permitir', 'advertir', 'rechazar']
+    POLITICA_STOCK_DEFECTO = 'advertir'
+    
+    # Cambios de mesas que se conservan al purgar el registro
+    CAMBIOS_CONSERVADOS = 5000
+    
+    def __init__(self, db_name="bar_pos.db", politica_stock=None):
+        politica_stock = politica_stock or politica_stock_configurada()
+        if politica_stock not in self.POLITICAS_STOCK:
+            raise ValueError("Política de stock no válida")
         
-        # Tabla de mesas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS mesas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero INTEGER NOT NULL UNIQUE,
-                capacidad INTEGER DEFAULT 4,
-                estado TEXT DEFAULT 'libre' -- libre, ocupada, reservada
-            )
-        ''')
+        self.db_name = db_name
+        self.politica_stock = politica_stock
+        self.conexiones = ConnectionManager(db_name)
+        self.catalogo = CatalogoCache(self)
+        self.vigilante_stock = VigilanteStock(self)
+        self._fts = None
+        self._local_cambios = threading.local()
+        # Cierra las conexiones al descartar la instancia o al salir del programa;
+        # el finalizador solo guarda las conexiones, no la instancia
+        self._finalizador = weakref.finalize(self, self.conexiones.cerrar)
+        self.init_database()
         
-        # Tabla de mozos/usuarios
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                tipo TEXT DEFAULT 'mozo', -- mozo, cajero, admin
-                activo INTEGER DEFAULT 1
-            )
-        ''')
+        # Base de los pedidos archivados, adjunta solo con historico()
+        self.ruta_historico = archivo.ruta_historico(db_name)
+    
+    def get_connection(self):
+        """Obtiene la conexión persistente del hilo actual"""
+        return self.conexiones.get()
+    
+    def liberar_conexion(self):
+        """Cierra la conexión del hilo actual (al terminar una tarea en un hilo de trabajo)"""
+        self.conexiones.liberar()
+    
+    @contextmanager
+    def historico(self):
+        """Adjunta la base histórica a la conexión del hilo mientras dura el bloque
         
-        # Tabla de pedidos/órdenes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pedidos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                mesa_id INTEGER,
-                usuario_id INTEGER,
-                fecha_hora DATETIME DEFAULT CURRENT_TIMESTAMP,
-                total DECIMAL(10,2) DEFAULT 0,
-                estado TEXT DEFAULT 'abierto', -- abierto, finalizado, cancelado
-                tipo_venta TEXT DEFAULT 'mesa', -- mesa, caja
-                metodo_pago TEXT, -- efectivo, tarjeta, transferencia
-                FOREIGN KEY (mesa_id) REFERENCES mesas (id),
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        ''')
+        Dentro del bloque, las vistas pedidos_todos y pedido_detalles_todos unen
+        los pedidos vivos con los archivados. Debe abrirse fuera de transaccion().
+        """
+        conn = self.get_connection()
+        adjuntada = archivo.adjuntar(conn, self.ruta_historico)
+        try:
+            yield conn
+        finally:
+            if adjuntada:
+                archivo.separar(conn)
+    
+    @contextmanager
+    def transaccion(self):
+        """Ejecuta un bloque dentro de una transacción de escritura"""
+        conn = self.get_connection()
+        # IMMEDIATE toma el lock de escritura al inicio y evita deadlocks al escalar
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+    
+    def close(self):
+        """Cierra las conexiones a la base de datos"""
+        self._finalizador()
+    
+    def init_database(self):
+        """Inicializa la base de datos con todas las tablas necesarias"""
+        # Esquema al día (el caso normal al reiniciar una terminal): no hay nada que crear
+        if get_version(self.get_connection()) == VERSION_ACTUAL:
+            self.purgar_cambios()
+            return
         
-        # Tabla de detalles de pedidos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pedido_detalles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pedido_id INTEGER,
-                producto_id INTEGER,
-                cantidad INTEGER NOT NULL,
-                precio_unitario DECIMAL(10,2) NOT NULL,
-                subtotal DECIMAL(10,2) NOT NULL,
-                FOREIGN KEY (pedido_id) REFERENCES pedidos (id),
-                FOREIGN KEY (producto_id) REFERENCES productos (id)
-            )
-        ''')
+        with self.transaccion() as cursor:
+            # Tabla de categorías
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS categorias (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT NOT NULL UNIQUE,
+                    activo INTEGER DEFAULT 1
+                )
+            ''')
+            
+            # Tabla de productos
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS productos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT NOT NULL,
+                    precio INTEGER NOT NULL,
+                    categoria_id INTEGER,
+                    stock INTEGER DEFAULT 0,
+                    activo INTEGER DEFAULT 1,
+                    FOREIGN KEY (categoria_id) REFERENCES categorias (id)
+                )
+            ''')
+            
+            # Tabla de mesas
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS mesas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    numero INTEGER NOT NULL UNIQUE,
+                    capacidad INTEGER DEFAULT 4,
+                    estado TEXT DEFAULT 'libre' -- libre, ocupada, reservada
+                )
+            ''')
+            
+            # Tabla de mozos/usuarios
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS usuarios (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT NOT NULL,
+                    tipo TEXT DEFAULT 'mozo', -- mozo, cajero, admin
+                    activo INTEGER DEFAULT 1
+                )
+            ''')
+            
+            # Tabla de pedidos/órdenes
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pedidos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    mesa_id INTEGER,
+                    usuario_id INTEGER,
+                    fecha_hora DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    total INTEGER DEFAULT 0,
+                    estado TEXT DEFAULT 'abierto', -- abierto, finalizado, cancelado
+                    tipo_venta TEXT DEFAULT 'mesa', -- mesa, caja
+                    metodo_pago TEXT, -- efectivo, tarjeta, transferencia
+                    FOREIGN KEY (mesa_id) REFERENCES mesas (id),
+                    FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+                )
+            ''')
+            
+            # Tabla de detalles de pedidos
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pedido_detalles (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    pedido_id INTEGER,
+                    producto_id INTEGER,
+                    cantidad INTEGER NOT NULL,
+                    precio_unitario INTEGER NOT NULL,
+                    subtotal INTEGER NOT NULL,
+                    FOREIGN KEY (pedido_id) REFERENCES pedidos (id),
+                    FOREIGN KEY (producto_id) REFERENCES productos (id)
+                )
+            ''')
         
-        conn.commit()
-        conn.close()
+        # Actualizar el esquema (índices, columnas nuevas) a la última versión
+        aplicar_migraciones(self.get_connection())
+        self.purgar_cambios()
         
         # Insertar datos iniciales si no existen
         self.insert_initial_data()
     
     def insert_initial_data(self):
         """Inserta datos iniciales para pruebas"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Verificar si ya hay datos
-        cursor.execute("SELECT COUNT(*) FROM categorias")
-        if cursor.fetchone()[0] == 0:
+        with self.transaccion() as cursor:
+            # Verificar si ya hay datos
+            cursor.execute("SELECT COUNT(*) FROM categorias")
+            if cursor.fetchone()[0] > 0:
+                return
+            
             # Insertar categorías
             categorias = [
-                ("Bebidas",),
-                ("Comidas",),
-                ("Postres",),
-                ("Entradas",)
+                ("Bebidas", "barra"),
+                ("Comidas", "cocina"),
+                ("Postres", "cocina"),
+                ("Entradas", "cocina")
             ]
-            cursor.executemany("INSERT INTO categorias (nombre) VALUES (?)", categorias)
+            cursor.executemany("INSERT INTO categorias (nombre, estacion) VALUES (?, ?)", categorias)
             
-            # Insertar productos
+            # Insertar productos (precios en centavos)
             productos = [
-                ("Cerveza Quilmes", 1500, 1, 50),
-                ("Fernet con Coca", 2000, 1, 30),
-                ("Agua Mineral", 800, 1, 40),
-                ("Hamburguesa Completa", 3500, 2, 20),
-                ("Papas Fritas", 1800, 2, 25),
-                ("Milanesa Napolitana", 4000, 2, 15),
-                ("Helado", 1200, 3, 20),
-                ("Flan", 1000, 3, 15),
-                ("Rabas", 2200, 4, 18),
-                ("Empanadas (6u)", 2500, 4, 30)
+                ("Cerveza Quilmes", 150000, 1, 50),
+                ("Fernet con Coca", 200000, 1, 30),
+                ("Agua Mineral", 80000, 1, 40),
+                ("Hamburguesa Completa", 350000, 2, 20),
+                ("Papas Fritas", 180000, 2, 25),
+                ("Milanesa Napolitana", 400000, 2, 15),
+                ("Helado", 120000, 3, 20),
+                ("Flan", 100000, 3, 15),
+                ("Rabas", 220000, 4, 18),
+                ("Empanadas (6u)", 250000, 4, 30)
             ]
             cursor.executemany(
                 "INSERT INTO productos (nombre, precio, categoria_id, stock) VALUES (?, ?, ?, ?)", 
@@ -143,179 +499,302 @@ class DatabaseManager:
             ]
             cursor.executemany("INSERT INTO usuarios (nombre, tipo) VALUES (?, ?)", usuarios)
         
-        conn.commit()
-        conn.close()
+        self.catalogo.invalidar()
     
     # Métodos para productos
     def get_productos_por_categoria(self, categoria_id=None):
-        """Obtiene productos filtrados por categoría"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """Obtiene productos filtrados por categoría (desde la caché del catálogo)"""
+        return self.catalogo.get_productos(categoria_id)
+    
+    def get_producto(self, producto_id):
+        """Obtiene un producto activo por id, o None"""
+        return self.catalogo.get_producto(producto_id)
+    
+    def get_categorias(self):
+        """Obtiene todas las categorías activas"""
+        return self.catalogo.get_categorias()
+    
+    def _leer_catalogo(self):
+        """Lee de la base todas las categorías activas y productos activos"""
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT id, nombre FROM categorias WHERE activo = 1 ORDER BY nombre")
+        categorias = cursor.fetchall()
         
-        if categoria_id:
+        cursor.execute('''
+            SELECT p.id, p.nombre, p.precio, p.stock, c.nombre as categoria, p.categoria_id
+            FROM productos p
+            LEFT JOIN categorias c ON p.categoria_id = c.id
+            WHERE p.activo = 1
+            ORDER BY c.nombre, p.nombre
+        ''')
+        productos = cursor.fetchall()
+        return categorias, productos
+    
+    def buscar_productos(self, texto, limite=50):
+        """Busca productos activos cuyo nombre contenga palabras que empiecen con el texto"""
+        palabras = texto.split()
+        if not palabras:
+            return []
+        
+        cursor = self.get_connection().cursor()
+        if self._tiene_fts():
+            # Cada palabra es un prefijo entre comillas (evita la sintaxis de FTS5)
+            consulta = " ".join('"' + p.replace('"', '""') + '"*' for p in palabras)
             cursor.execute('''
                 SELECT p.id, p.nombre, p.precio, p.stock, c.nombre as categoria
-                FROM productos p
+                FROM productos_fts f
+                JOIN productos p ON p.id = f.rowid
                 LEFT JOIN categorias c ON p.categoria_id = c.id
-                WHERE p.categoria_id = ? AND p.activo = 1
-                ORDER BY p.nombre
-            ''', (categoria_id,))
+                WHERE productos_fts MATCH ? AND p.activo = 1
+                ORDER BY f.rank, p.nombre
+                LIMIT ?
+            ''', (consulta, limite))
         else:
-            cursor.execute('''
+            condiciones = " AND ".join("(p.nombre LIKE ? OR p.nombre LIKE ?)" for _ in palabras)
+            parametros = []
+            for p in palabras:
+                parametros += [p + "%", "% " + p + "%"]
+            cursor.execute(f'''
                 SELECT p.id, p.nombre, p.precio, p.stock, c.nombre as categoria
                 FROM productos p
                 LEFT JOIN categorias c ON p.categoria_id = c.id
-                WHERE p.activo = 1
-                ORDER BY c.nombre, p.nombre
-            ''')
-        
-        productos = cursor.fetchall()
-        conn.close()
-        return productos
+                WHERE p.activo = 1 AND {condiciones}
+                ORDER BY p.nombre
+                LIMIT ?
+            ''', parametros + [limite])
+        return cursor.fetchall()
     
-    def get_categorias(self):
-        """Obtiene todas las categorías activas"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, nombre FROM categorias WHERE activo = 1 ORDER BY nombre")
-        categorias = cursor.fetchall()
-        conn.close()
-        return categorias
+    def _tiene_fts(self):
+        """Indica si la base tiene el índice FTS5 de productos"""
+        if self._fts is None:
+            cursor = self.get_connection().cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'productos_fts'")
+            self._fts = cursor.fetchone() is not None
+        return self._fts
+    
+    def get_productos_stock_bajo(self):
+        """Obtiene los productos con stock en o por debajo de su mínimo"""
+        return self.vigilante_stock.get_bajos()
+    
+    def get_catalogo_version(self):
+        """Obtiene la versión del catálogo (cambia con cada escritura del menú)"""
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT version FROM catalogo_version WHERE id = 1")
+        return cursor.fetchone()[0]
+    
+    def _leer_versiones_catalogo(self):
+        """(versión del catálogo, versión del stock) que mantienen los triggers"""
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT version, stock FROM catalogo_version WHERE id = 1")
+        return cursor.fetchone()
+    
+    def _leer_stock(self):
+        """Lee el stock actual de los productos activos: (id, nombre, stock)"""
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT id, nombre, stock FROM productos WHERE activo = 1")
+        return cursor.fetchall()
     
     # Métodos para mesas
     def get_mesas(self):
         """Obtiene todas las mesas"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         cursor.execute("SELECT id, numero, capacidad, estado FROM mesas ORDER BY numero")
-        mesas = cursor.fetchall()
-        conn.close()
-        return mesas
+        return cursor.fetchall()
     
     def cambiar_estado_mesa(self, mesa_id, nuevo_estado):
         """Cambia el estado de una mesa"""
+        with self.transaccion() as cursor:
+            self._cambiar_estado_mesa(cursor, mesa_id, nuevo_estado)
+    
+    def _cambiar_estado_mesa(self, cursor, mesa_id, nuevo_estado, pedido_id=None):
+        """Cambia el estado de una mesa dentro de una transacción abierta"""
         if nuevo_estado not in ['libre', 'ocupada', 'reservada']:
             raise ValueError("Estado de mesa no válido")
         
+        cursor.execute("UPDATE mesas SET estado = ? WHERE id = ?", (nuevo_estado, mesa_id))
+        
+        # Registrar el cambio para que las demás terminales lo apliquen
+        cursor.execute('''
+            INSERT INTO cambios (mesa_id, estado, pedido_id, fecha_hora)
+            VALUES (?, ?, ?, ?)
+        ''', (mesa_id, nuevo_estado, pedido_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    
+    # Métodos para el registro de cambios
+    def get_cambios_desde(self, seq):
+        """Devuelve (último seq, cambios posteriores a seq)
+        
+        Cada cambio es (seq, mesa_id, estado, pedido_id). Si el registro ya se
+        purgó más allá de seq, los cambios son None y hay que recargar todo.
+        """
         conn = self.get_connection()
+        # data_version solo cambia cuando otra conexión confirma una escritura:
+        # si no cambió desde la última consulta de este hilo, no hay nada nuevo
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        anterior = getattr(self._local_cambios, 'anterior', None)
+        if anterior == (seq, data_version):
+            return seq, []
+        
         cursor = conn.cursor()
-        cursor.execute("UPDATE mesas SET estado = ? WHERE id = ?", (nuevo_estado, mesa_id))
-        conn.commit()
-        conn.close()
+        cursor.execute("SELECT MIN(seq) FROM cambios")
+        minimo = cursor.fetchone()[0]
+        if minimo is not None and seq < minimo - 1:
+            cursor.execute("SELECT MAX(seq) FROM cambios")
+            return cursor.fetchone()[0], None
+        
+        cursor.execute('''
+            SELECT seq, mesa_id, estado, pedido_id FROM cambios
+            WHERE seq > ? ORDER BY seq
+        ''', (seq,))
+        cambios = cursor.fetchall()
+        ultimo = cambios[-1][0] if cambios else seq
+        self._local_cambios.anterior = (ultimo, data_version)
+        return ultimo, cambios
+    
+    def get_ultimo_cambio(self):
+        """Obtiene el seq del último cambio registrado (0 si no hay)"""
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios")
+        return cursor.fetchone()[0]
+    
+    def purgar_cambios(self):
+        """Descarta los cambios viejos, conservando los últimos CAMBIOS_CONSERVADOS"""
+        # Se mira primero sin lock para no tomar el de escritura en cada arranque
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT MAX(seq) - MIN(seq) FROM cambios")
+        if (cursor.fetchone()[0] or 0) < self.CAMBIOS_CONSERVADOS:
+            return
+        
+        with self.transaccion() as cursor:
+            cursor.execute(
+                "DELETE FROM cambios WHERE seq <= (SELECT MAX(seq) FROM cambios) - ?",
+                (self.CAMBIOS_CONSERVADOS,)
+            )
     
     # Métodos para usuarios
     def get_usuarios(self):
         """Obtiene todos los usuarios activos"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         cursor.execute("SELECT id, nombre, tipo FROM usuarios WHERE activo = 1 ORDER BY nombre")
-        usuarios = cursor.fetchall()
-        conn.close()
-        return usuarios
+        return cursor.fetchall()
     
     # Métodos para pedidos
     def crear_pedido(self, mesa_id, usuario_id, tipo_venta="mesa"):
-        """Crea un nuevo pedido"""
+        """Crea un nuevo pedido; en una mesa con pedido abierto devuelve ese pedido"""
         if tipo_venta not in ['mesa', 'caja']:
             raise ValueError("Tipo de venta no válido")
         
-        # Verificar que no haya un pedido abierto para la mesa
-        if mesa_id and tipo_venta == "mesa":
-            pedido_existente = self.get_pedido_activo_mesa(mesa_id)
-            if pedido_existente:
-                return pedido_existente[0]  # Retornar el pedido existente
-        
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO pedidos (mesa_id, usuario_id, tipo_venta, fecha_hora)
-            VALUES (?, ?, ?, ?)
-        ''', (mesa_id, usuario_id, tipo_venta, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        
-        pedido_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        # Si es una mesa, cambiar estado a ocupada
-        if tipo_venta == "mesa" and mesa_id:
-            self.cambiar_estado_mesa(mesa_id, "ocupada")
+        fecha_hora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.transaccion() as cursor:
+            if not (mesa_id and tipo_venta == "mesa"):
+                cursor.execute('''
+                    INSERT INTO pedidos (mesa_id, usuario_id, tipo_venta, fecha_hora)
+                    VALUES (?, ?, ?, ?)
+                ''', (mesa_id, usuario_id, tipo_venta, fecha_hora))
+                return cursor.lastrowid
+            
+            # El índice único parcial admite un solo pedido abierto por mesa: si otra
+            # terminal ya lo abrió, el INSERT no hace nada y se devuelve el existente
+            cursor.execute('''
+                INSERT INTO pedidos (mesa_id, usuario_id, tipo_venta, fecha_hora)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (mesa_id) WHERE estado = 'abierto' DO NOTHING
+                RETURNING id
+            ''', (mesa_id, usuario_id, tipo_venta, fecha_hora))
+            fila = cursor.fetchone()
+            if fila is None:
+                cursor.execute(
+                    "SELECT id FROM pedidos WHERE mesa_id = ? AND estado = 'abierto'", (mesa_id,)
+                )
+                return cursor.fetchone()[0]
+            
+            pedido_id = fila[0]
+            self._cambiar_estado_mesa(cursor, mesa_id, "ocupada", pedido_id)
         
         return pedido_id
     
     def agregar_producto_pedido(self, pedido_id, producto_id, cantidad):
-        """Agrega un producto al pedido"""
-        if cantidad <= 0:
-            raise ValueError("La cantidad debe ser mayor a cero")
-        
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Verificar que el pedido existe y está abierto
-        cursor.execute("SELECT estado FROM pedidos WHERE id = ?", (pedido_id,))
-        pedido = cursor.fetchone()
-        if not pedido or pedido[0] != 'abierto':
-            raise ValueError("El pedido no existe o ya está cerrado")
-        
-        # Obtener precio del producto
-        cursor.execute("SELECT precio FROM productos WHERE id = ? AND activo = 1", (producto_id,))
-        producto = cursor.fetchone()
-        if not producto:
-            raise ValueError("El producto no existe o no está activo")
-        
-        precio = producto[0]
-        subtotal = precio * cantidad
-        
-        # Verificar si el producto ya existe en el pedido
-        cursor.execute('''
-            SELECT id, cantidad FROM pedido_detalles 
-            WHERE pedido_id = ? AND producto_id = ?
-        ''', (pedido_id, producto_id))
-        
-        detalle_existente = cursor.fetchone()
-        
-        if detalle_existente:
-            # Actualizar cantidad existente
-            nueva_cantidad = detalle_existente[1] + cantidad
-            nuevo_subtotal = precio * nueva_cantidad
-            cursor.execute('''
-                UPDATE pedido_detalles 
-                SET cantidad = ?, subtotal = ?
-                WHERE id = ?
-            ''', (nueva_cantidad, nuevo_subtotal, detalle_existente[0]))
-        else:
-            # Insertar nuevo detalle
-            cursor.execute('''
-                INSERT INTO pedido_detalles (pedido_id, producto_id, cantidad, precio_unitario, subtotal)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (pedido_id, producto_id, cantidad, precio, subtotal))
+        """Agrega un producto al pedido y devuelve la línea resultante"""
+        return self.agregar_productos_pedido(pedido_id, [(producto_id, cantidad)])[0]
+    
+    def agregar_productos_pedido(self, pedido_id, items):
+        """Agrega varios productos (producto_id, cantidad) al pedido en una sola transacción"""
+        items = list(items)
+        if not items:
+            raise ValueError("No hay productos para agregar")
+        for producto_id, cantidad in items:
+            if cantidad <= 0:
+                raise ValueError("La cantidad debe ser mayor a cero")
+        
+        with self.transaccion() as cursor:
+            return self._agregar_productos(cursor, pedido_id, items)
+    
+    def _agregar_productos(self, cursor, pedido_id, items):
+        """Agrega los productos dentro de la transacción en curso; devuelve las líneas"""
+        lineas = []
+        incremento = 0
+        for producto_id, cantidad in items:
+            linea = self._upsert_detalle(cursor, pedido_id, producto_id, cantidad)
+            incremento += linea[2] * cantidad
+            lineas.append(linea)
+        
+        # Actualizar total del pedido con el incremento de esta ronda
+        cursor.execute(
+            "UPDATE pedidos SET total = COALESCE(total, 0) + ? WHERE id = ?",
+            (incremento, pedido_id)
+        )
+        
+        # Comanda para barra o cocina: se confirma junto con las líneas y
+        # comandas.py la despacha después, aunque el sistema se reinicie
+        creada = time.time()
+        cursor.executemany('''
+            INSERT INTO comandas (pedido_id, producto_id, cantidad, estacion, creada)
+            SELECT ?, p.id, ?, COALESCE(c.estacion, 'cocina'), ?
+            FROM productos p LEFT JOIN categorias c ON c.id = p.categoria_id
+            WHERE p.id = ?
+        ''', [(pedido_id, cantidad, creada, producto_id) for producto_id, cantidad in items])
         
-        # Actualizar total del pedido
+        return lineas
+    
+    def _upsert_detalle(self, cursor, pedido_id, producto_id, cantidad):
+        """Inserta o acumula una línea del pedido; devuelve (id, cantidad, precio_unitario, subtotal)"""
+        # El JOIN con pedidos valida que el pedido esté abierto en la misma sentencia.
+        # Una línea existente conserva el precio con el que se cargó por primera vez.
         cursor.execute('''
-            UPDATE pedidos SET total = (
-                SELECT SUM(subtotal) FROM pedido_detalles WHERE pedido_id = ?
-            ) WHERE id = ?
-        ''', (pedido_id, pedido_id))
+            INSERT INTO pedido_detalles (pedido_id, producto_id, cantidad, precio_unitario, subtotal)
+            SELECT pe.id, pr.id, ?, pr.precio, pr.precio * ?
+            FROM productos pr, pedidos pe
+            WHERE pr.id = ? AND pr.activo = 1
+              AND pe.id = ? AND pe.estado = 'abierto'
+            ON CONFLICT (pedido_id, producto_id) DO UPDATE SET
+                cantidad = cantidad + excluded.cantidad,
+                subtotal = precio_unitario * (cantidad + excluded.cantidad)
+            RETURNING id, cantidad, precio_unitario, subtotal
+        ''', (cantidad, cantidad, producto_id, pedido_id))
+        linea = cursor.fetchone()
+        
+        if linea is None:
+            # No se insertó nada: determinar el motivo para informar el error correcto
+            cursor.execute("SELECT estado FROM pedidos WHERE id = ?", (pedido_id,))
+            pedido = cursor.fetchone()
+            if not pedido or pedido[0] != 'abierto':
+                raise ValueError("El pedido no existe o ya está cerrado")
+            raise ValueError("El producto no existe o no está activo")
         
-        conn.commit()
-        conn.close()
+        return linea
     
     def get_pedido_activo_mesa(self, mesa_id):
         """Obtiene el pedido activo de una mesa"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         cursor.execute('''
             SELECT id, total FROM pedidos 
             WHERE mesa_id = ? AND estado = 'abierto'
             ORDER BY fecha_hora DESC LIMIT 1
         ''', (mesa_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        return cursor.fetchone()
     
     def get_detalles_pedido(self, pedido_id):
         """Obtiene los detalles de un pedido"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         cursor.execute('''
             SELECT pd.id, p.nombre, pd.cantidad, pd.precio_unitario, pd.subtotal
             FROM pedido_detalles pd
@@ -323,22 +802,22 @@ class DatabaseManager:
             WHERE pd.pedido_id = ?
             ORDER BY p.nombre
         ''', (pedido_id,))
-        detalles = cursor.fetchall()
-        conn.close()
-        return detalles
+        return cursor.fetchall()
     
     def eliminar_detalle_pedido(self, detalle_id):
         """Elimina un detalle del pedido"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        with self.transaccion() as cursor:
+            self._eliminar_detalle(cursor, detalle_id)
+    
+    def _eliminar_detalle(self, cursor, detalle_id):
+        """Elimina un detalle dentro de la transacción en curso"""
         # Obtener pedido_id antes de eliminar
-        cursor.execute("SELECT pedido_id FROM pedido_detalles WHERE id = ?", (detalle_id,))
+        cursor.execute("SELECT pedido_id, producto_id FROM pedido_detalles WHERE id = ?", (detalle_id,))
         result = cursor.fetchone()
         if not result:
             raise ValueError("El detalle del pedido no existe")
         
-        pedido_id = result[0]
+        pedido_id, producto_id = result
         
         # Verificar que el pedido está abierto
         cursor.execute("SELECT estado FROM pedidos WHERE id = ?", (pedido_id,))
@@ -347,67 +826,104 @@ class DatabaseManager:
             raise ValueError("No se puede modificar un pedido cerrado")
         
         # Eliminar detalle
-        cursor.execute("DELETE FROM pedido_detalles WHERE id = ?", (detalle_id,))
+        cursor.execute("DELETE FROM pedido_detalles WHERE id = ? RETURNING subtotal", (detalle_id,))
+        subtotal = cursor.fetchone()[0]
+        
+        # Descontar la línea eliminada del total del pedido
+        cursor.execute(
+            "UPDATE pedidos SET total = COALESCE(total, 0) - ? WHERE id = ?",
+            (subtotal, pedido_id)
+        )
+        self._anular_comandas(cursor, pedido_id, producto_id)
+    
+    def _anular_comandas(self, cursor, pedido_id, producto_id=None):
+        """Descarta las comandas del pedido (o de un producto) que todavía no salieron
         
-        # Actualizar total del pedido
+        Las que un despachador tiene reservadas ya se están imprimiendo y no se tocan;
+        las que fallaron y esperan reintento sí se descartan.
+        """
         cursor.execute('''
-            UPDATE pedidos SET total = COALESCE((
-                SELECT SUM(subtotal) FROM pedido_detalles WHERE pedido_id = ?
-            ), 0) WHERE id = ?
-        ''', (pedido_id, pedido_id))
-        
-        conn.commit()
-        conn.close()
+            DELETE FROM comandas INDEXED BY idx_comandas_pendientes
+            WHERE pedido_id = ? AND (? IS NULL OR producto_id = ?) AND enviada IS NULL
+              AND (despachador IS NULL OR vence < ?)
+        ''', (pedido_id, producto_id, producto_id, time.time()))
     
     def finalizar_pedido(self, pedido_id, metodo_pago):
-        """Finaliza un pedido"""
+        """Finaliza un pedido, descuenta el stock y devuelve las alertas de stock bajo"""
         if metodo_pago not in ['efectivo', 'tarjeta', 'transferencia']:
             raise ValueError("Método de pago no válido")
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Obtener información del pedido
-        cursor.execute("SELECT mesa_id, estado FROM pedidos WHERE id = ?", (pedido_id,))
-        result = cursor.fetchone()
-        
-        if not result:
-            raise ValueError("El pedido no existe")
-        
-        if result[1] != 'abierto':
-            raise ValueError("El pedido ya está finalizado")
-        
-        mesa_id = result[0]
-        
-        # Verificar que el pedido tiene productos
-        cursor.execute("SELECT COUNT(*) FROM pedido_detalles WHERE pedido_id = ?", (pedido_id,))
-        if cursor.fetchone()[0] == 0:
-            raise ValueError("No se puede finalizar un pedido sin productos")
-        
-        # Actualizar pedido
-        cursor.execute('''
-            UPDATE pedidos 
-            SET estado = 'finalizado', metodo_pago = ?
-            WHERE id = ?
-        ''', (metodo_pago, pedido_id))
-        
-        # Liberar mesa si es venta en mesa
-        if mesa_id:
-            self.cambiar_estado_mesa(mesa_id, "libre")
-        
-        conn.commit()
-        conn.close()
+        with self.transaccion() as cursor:
+            # Obtener información del pedido
+            cursor.execute("SELECT mesa_id, estado FROM pedidos WHERE id = ?", (pedido_id,))
+            result = cursor.fetchone()
+            
+            if not result:
+                raise ValueError("El pedido no existe")
+            
+            if result[1] != 'abierto':
+                raise ValueError("El pedido ya está finalizado")
+            
+            mesa_id = result[0]
+            
+            # Verificar que el pedido tiene productos
+            cursor.execute("SELECT COUNT(*) FROM pedido_detalles WHERE pedido_id = ?", (pedido_id,))
+            if cursor.fetchone()[0] == 0:
+                raise ValueError("No se puede finalizar un pedido sin productos")
+            
+            # Actualizar pedido
+            cursor.execute('''
+                UPDATE pedidos 
+                SET estado = 'finalizado', metodo_pago = ?
+                WHERE id = ?
+            ''', (metodo_pago, pedido_id))
+            
+            # Descontar el stock de todas las líneas en una sola sentencia
+            if self.politica_stock == 'rechazar':
+                # Stock leído de la base dentro de la transacción, no de la caché:
+                # otra terminal pudo haber vendido desde que se cargó el catálogo
+                cursor.execute('''
+                    SELECT pr.nombre FROM pedido_detalles pd
+                    JOIN productos pr ON pr.id = pd.producto_id
+                    WHERE pd.pedido_id = ? AND pr.stock < pd.cantidad
+                ''', (pedido_id,))
+                faltantes = [fila[0] for fila in cursor.fetchall()]
+                if faltantes:
+                    raise ValueError("Stock insuficiente: " + ", ".join(faltantes))
+            
+            cursor.execute('''
+                UPDATE productos SET stock = stock - pd.cantidad
+                FROM pedido_detalles pd
+                WHERE pd.pedido_id = ? AND productos.id = pd.producto_id
+                RETURNING productos.id, productos.nombre, productos.stock, productos.stock_minimo
+            ''', (pedido_id,))
+            movimientos = cursor.fetchall()
+            
+            # Acumular la venta en los resúmenes
+            resumenes.acumular_finalizado(cursor, pedido_id)
+            
+            # Liberar mesa si es venta en mesa
+            if mesa_id:
+                self._cambiar_estado_mesa(cursor, mesa_id, "libre", pedido_id)
+        
+        # Devolver las alertas de stock bajo que generó esta venta; con 'permitir'
+        # se siguen registrando (get_productos_stock_bajo) pero no se avisan
+        self.catalogo.actualizar_stock(movimientos)
+        alertas = self.vigilante_stock.registrar(movimientos)
+        return [] if self.politica_stock == 'permitir' else alertas
     
     def get_pedido_completo(self, pedido_id):
-        """Obtiene información completa del pedido para facturación"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        """Obtiene información completa del pedido para facturación (también archivado)"""
+        with self.historico() as conn:
+            return self._leer_pedido_completo(conn.cursor(), pedido_id)
+    
+    def _leer_pedido_completo(self, cursor, pedido_id):
+        """Lee el pedido y sus líneas de las vistas con el histórico adjunto"""
         # Información del pedido
         cursor.execute('''
             SELECT p.id, p.fecha_hora, p.total, p.metodo_pago, p.tipo_venta,
                    m.numero as mesa_numero, u.nombre as usuario_nombre
-            FROM pedidos p
+            FROM pedidos_todos p
             LEFT JOIN mesas m ON p.mesa_id = m.id
             JOIN usuarios u ON p.usuario_id = u.id
             WHERE p.id = ?
@@ -416,53 +932,81 @@ class DatabaseManager:
         pedido_info = cursor.fetchone()
         
         if not pedido_info:
-            conn.close()
             return None
         
         # Detalles del pedido
         cursor.execute('''
             SELECT pd.cantidad, pd.precio_unitario, pd.subtotal, pr.nombre
-            FROM pedido_detalles pd
+            FROM pedido_detalles_todos pd
             JOIN productos pr ON pd.producto_id = pr.id
             WHERE pd.pedido_id = ?
             ORDER BY pr.nombre
         ''', (pedido_id,))
         
         detalles = cursor.fetchall()
-        conn.close()
         
         return {
             'pedido': pedido_info,
             'detalles': detalles
         }
     
+    def get_pedidos_finalizados(self, desde, hasta):
+        """Obtiene los ids de pedidos finalizados con fecha_hora en [desde, hasta)"""
+        with self.historico() as conn:
+            cursor = conn.execute('''
+                SELECT id FROM pedidos_todos
+                WHERE estado = 'finalizado' AND fecha_hora >= ? AND fecha_hora < ?
+                ORDER BY fecha_hora, id
+            ''', (desde, hasta))
+            return [fila[0] for fila in cursor.fetchall()]
+    
     def cancelar_pedido(self, pedido_id):
         """Cancela un pedido abierto"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Obtener información del pedido
-        cursor.execute("SELECT mesa_id, estado FROM pedidos WHERE id = ?", (pedido_id,))
-        result = cursor.fetchone()
-        
-        if not result:
-            raise ValueError("El pedido no existe")
-        
-        if result[1] != 'abierto':
-            raise ValueError("Solo se pueden cancelar pedidos abiertos")
-        
-        mesa_id = result[0]
-        
-        # Cancelar pedido
-        cursor.execute("UPDATE pedidos SET estado = 'cancelado' WHERE id = ?", (pedido_id,))
-        
-        # Liberar mesa si es venta en mesa
-        if mesa_id:
-            self.cambiar_estado_mesa(mesa_id, "libre")
-        
-        conn.commit()
-        conn.close()
+        with self.transaccion() as cursor:
+            # Obtener información del pedido
+            cursor.execute("SELECT mesa_id, estado FROM pedidos WHERE id = ?", (pedido_id,))
+            result = cursor.fetchone()
+            
+            if not result:
+                raise ValueError("El pedido no existe")
+            
+            if result[1] != 'abierto':
+                raise ValueError("Solo se pueden cancelar pedidos abiertos")
+            
+            mesa_id = result[0]
+            
+            # Cancelar pedido
+            cursor.execute("UPDATE pedidos SET estado = 'cancelado' WHERE id = ?", (pedido_id,))
+            resumenes.acumular_cancelado(cursor, pedido_id)
+            self._anular_comandas(cursor, pedido_id)
+            
+            # Liberar mesa si es venta en mesa
+            if mesa_id:
+                self._cambiar_estado_mesa(cursor, mesa_id, "libre", pedido_id)
+
+    # Métodos para resúmenes de ventas
+    def reconstruir_resumenes(self):
+        """Recalcula los resúmenes de ventas y devuelve las diferencias encontradas"""
+        with self.historico(), self.transaccion() as cursor:
+            resumenes.reconstruir(cursor)
+            return resumenes.verificar(cursor)
+    
+    def verificar_resumenes(self):
+        """Compara los resúmenes de ventas con los pedidos; devuelve las diferencias"""
+        with self.historico() as conn:
+            return resumenes.verificar(conn.cursor())
+
+def politica_stock_configurada():
+    """Política de stock de BAR_POS_POLITICA_STOCK, o la predeterminada"""
+    return os.environ.get("BAR_POS_POLITICA_STOCK") or DatabaseManager.POLITICA_STOCK_DEFECTO
 
 # Función para crear instancia global de la base de datos
-def get_db():
-    return DatabaseManager()
\ No newline at end of file
+def get_db(politica_stock=None):
+    # Con BAR_POS_SERVICIO=host:puerto la terminal usa el servicio de pedidos
+    # compartido (ver servicio.py) en lugar de abrir la base directamente; la
+    # política de stock es entonces la del servicio
+    direccion = os.environ.get("BAR_POS_SERVICIO")
+    if direccion:
+        from servicio import ClienteServicio
+        return ClienteServicio(direccion)
+    return DatabaseManager(politica_stock=politica_stock)
\ No newline at end of file
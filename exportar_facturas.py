@@ -0,0 +1,149 @@
+# exportar_facturas.py - Regeneración masiva de facturas por rango de fechas
+#
+# Uso:
+#   python exportar_facturas.py --desde 2025-08-01 --hasta 2025-08-31 --zip
+#
+# Las facturas se renderizan en paralelo con un proceso por núcleo. Cada archivo
+# se escribe primero con extensión .tmp y se renombra al terminar, así una
+# ejecución interrumpida se reanuda salteando las facturas ya generadas.
+import os
+import sys
+import argparse
+import zipfile
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+from database import DatabaseManager
+from factura import renderizar_factura
+
+# Base de datos de cada proceso trabajador
+_db = None
+
+def _iniciar_trabajador(db_name):
+    """Abre la base de datos en el proceso trabajador"""
+    global _db
+    _db = DatabaseManager(db_name)
+
+def ruta_factura(directorio, pedido_id):
+    """Ruta estable de la factura de un pedido (permite reanudar)"""
+    return os.path.join(directorio, f"factura_{pedido_id:06d}.pdf")
+
+def _renderizar(trabajo):
+    """Renderiza una factura en el proceso trabajador; devuelve (pedido_id, error)"""
+    pedido_id, directorio, rapido = trabajo
+    try:
+        pedido_completo = _db.get_pedido_completo(pedido_id)
+        if not pedido_completo:
+            raise ValueError("No se pudo obtener la información del pedido")
+        destino = ruta_factura(directorio, pedido_id)
+        temporal = destino + ".tmp"
+        renderizar_factura(pedido_completo, temporal, rapido)
+        os.replace(temporal, destino)
+        return pedido_id, None
+    except Exception as e:
+        return pedido_id, str(e)
+
+def exportar_facturas(db_name, desde, hasta, directorio, procesos=None,
+                      rapido=False, progreso=None):
+    """Genera las facturas faltantes del rango; devuelve (archivos, errores)"""
+    os.makedirs(directorio, exist_ok=True)
+    
+    db = DatabaseManager(db_name)
+    try:
+        pedidos = db.get_pedidos_finalizados(desde, hasta)
+    finally:
+        db.close()
+    
+    # Reanudar: solo se renderizan las facturas que todavía no existen
+    pendientes = [p for p in pedidos if not os.path.exists(ruta_factura(directorio, p))]
+    hechas = len(pedidos) - len(pendientes)
+    errores = []
+    
+    if progreso:
+        progreso(hechas, len(pedidos))
+    
+    if pendientes:
+        trabajos = [(p, directorio, rapido) for p in pendientes]
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_trabajador,
+                                 initargs=(db_name,)) as executor:
+            for pedido_id, error in executor.map(_renderizar, trabajos, chunksize=16):
+                if error:
+                    errores.append((pedido_id, error))
+                else:
+                    hechas += 1
+                if progreso:
+                    progreso(hechas, len(pedidos))
+    
+    archivos = [ruta_factura(directorio, p) for p in pedidos
+                if os.path.exists(ruta_factura(directorio, p))]
+    return archivos, errores
+
+def empaquetar_zip(archivos, destino):
+    """Guarda las facturas en un archivo zip"""
+    # Los PDF ya vienen comprimidos: se almacenan sin volver a comprimir
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_STORED) as zf:
+        for archivo in archivos:
+            zf.write(archivo, os.path.basename(archivo))
+
+def unir_pdf(archivos, destino):
+    """Une las facturas en un único PDF (requiere pypdf)"""
+    from pypdf import PdfWriter
+    
+    writer = PdfWriter()
+    for archivo in archivos:
+        writer.append(archivo)
+    with open(destino, "wb") as f:
+        writer.write(f)
+
+def _fecha(valor):
+    return datetime.strptime(valor, "%Y-%m-%d")
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta las facturas de un rango de fechas")
+    parser.add_argument("--desde", type=_fecha, required=True, help="fecha inicial (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=_fecha, required=True, help="fecha final inclusive (AAAA-MM-DD)")
+    parser.add_argument("--db", default="bar_pos.db")
+    parser.add_argument("--directorio", default=None,
+                        help="carpeta de salida (por defecto facturas/exportadas_<desde>_<hasta>)")
+    parser.add_argument("--procesos", type=int, default=None, help="procesos (por defecto, uno por núcleo)")
+    parser.add_argument("--rapido", action="store_true", help="dibujar con el canvas directo")
+    parser.add_argument("--zip", action="store_true", help="empaquetar las facturas en un .zip")
+    parser.add_argument("--unir", action="store_true", help="unir las facturas en un único PDF")
+    args = parser.parse_args()
+    
+    desde = args.desde.strftime("%Y-%m-%d")
+    hasta = (args.hasta + timedelta(days=1)).strftime("%Y-%m-%d")
+    directorio = args.directorio or os.path.join(
+        "facturas", f"exportadas_{desde}_{args.hasta.strftime('%Y-%m-%d')}")
+    
+    def progreso(hechas, total):
+        print(f"\rFacturas: {hechas}/{total}", end="", file=sys.stderr, flush=True)
+    
+    try:
+        archivos, errores = exportar_facturas(args.db, desde, hasta, directorio,
+                                              args.procesos, args.rapido, progreso)
+    except KeyboardInterrupt:
+        print("\nInterrumpido. Vuelva a ejecutar el mismo comando para continuar.", file=sys.stderr)
+        return 130
+    print(file=sys.stderr)
+    
+    for pedido_id, error in errores:
+        print(f"Error en pedido {pedido_id}: {error}", file=sys.stderr)
+    
+    if args.zip:
+        empaquetar_zip(archivos, directorio + ".zip")
+        print(f"Zip generado: {directorio}.zip")
+    
+    if args.unir:
+        try:
+            unir_pdf(archivos, directorio + ".pdf")
+            print(f"PDF unificado generado: {directorio}.pdf")
+        except ImportError:
+            print("pypdf no está instalado.\nInstale con: pip install pypdf", file=sys.stderr)
+            return 1
+    
+    print(f"{len(archivos)} facturas en {directorio}")
+    return 1 if errores else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+# factura.py - Generación de facturas PDF en segundo plano
+import os
+import sys
+import queue
+import subprocess
+import threading
+from datetime import datetime
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from moneda import formatear
+
+DIRECTORIO_FACTURAS = "facturas"
+
+ENCABEZADO = ["Bar & Restaurant", "Dirección: Calle Principal 123", "Tel: (341) 123-4567"]
+
+class PlantillaFactura:
+    """Estilos y geometría de la factura, compilados una sola vez"""
+    
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            alignment=TA_CENTER
+        )
+        
+        self.header_style = ParagraphStyle(
+            'CustomHeader',
+            parent=styles['Normal'],
+            fontSize=12,
+            spaceAfter=20,
+            alignment=TA_CENTER
+        )
+        
+        self.info_col_widths = [1.5*inch, 2*inch, 1.5*inch, 2*inch]
+        self.info_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ])
+        
+        self.productos_col_widths = [3*inch, 1*inch, 1.5*inch, 1.5*inch]
+        self.productos_table_style = TableStyle([
+            # Encabezados
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            
+            # Contenido
+            ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -2), 10),
+            ('ALIGN', (1, 1), (-1, -2), 'CENTER'),
+            ('ALIGN', (0, 1), (0, -2), 'LEFT'),
+            
+            # Línea de total
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, -1), (-1, -1), 12),
+            ('ALIGN', (2, -1), (-1, -1), 'RIGHT'),
+            ('BACKGROUND', (2, -1), (-1, -1), colors.lightgrey),
+            
+            # Bordes
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+        
+        # Geometría para el dibujo directo sobre el canvas (misma página y márgenes)
+        self.pagesize = letter
+        self.margen = inch
+        self.alto_fila = 18
+        x = self.margen
+        self.columnas_x = []
+        for ancho in self.productos_col_widths:
+            self.columnas_x.append(x)
+            x += ancho
+        self.ancho_tabla = x - self.margen
+
+_plantilla = None
+_plantilla_lock = threading.Lock()
+
+def get_plantilla():
+    """Obtiene la plantilla compartida, creándola la primera vez"""
+    global _plantilla
+    if _plantilla is None:
+        with _plantilla_lock:
+            if _plantilla is None:
+                _plantilla = PlantillaFactura()
+    return _plantilla
+
+def _datos_factura(pedido_completo):
+    """Extrae los datos a imprimir: (info, filas de productos, total)"""
+    pedido_info = pedido_completo['pedido']
+    fecha_formateada = datetime.strptime(pedido_info[1], "%Y-%m-%d %H:%M:%S").strftime("%d/%m/%Y %H:%M")
+    
+    info_data = [
+        ['Factura N°:', f"{pedido_info[0]:06d}", 'Fecha:', fecha_formateada],
+        ['Atendido por:', pedido_info[6], 'Método de Pago:', pedido_info[3].title()],
+        ['Mesa N°:' if pedido_info[5] else 'Tipo:', 
+         pedido_info[5] if pedido_info[5] else 'Venta Directa', '', '']
+    ]
+    
+    filas = []
+    total_general = 0  # centavos: la suma es exacta
+    for detalle in pedido_completo['detalles']:
+        cantidad, precio_unitario, subtotal, nombre = detalle
+        total_general += subtotal
+        filas.append([
+            nombre,
+            str(cantidad),
+            formatear(precio_unitario),
+            formatear(subtotal)
+        ])
+    
+    return info_data, filas, formatear(total_general)
+
+def _renderizar_platypus(pedido_completo, destino):
+    """Arma la factura con el motor de maquetación de platypus"""
+    plantilla = get_plantilla()
+    info_data, filas, total = _datos_factura(pedido_completo)
+    
+    # Crear documento PDF
+    doc = SimpleDocTemplate(destino, pagesize=letter)
+    story = []
+    
+    # Encabezado
+    story.append(Paragraph("FACTURA", plantilla.title_style))
+    story.append(Paragraph(ENCABEZADO[0], plantilla.header_style))
+    story.append(Paragraph("<br/>".join(ENCABEZADO[1:]), plantilla.header_style))
+    story.append(Spacer(1, 20))
+    
+    # Información del pedido
+    info_table = Table(info_data, colWidths=plantilla.info_col_widths)
+    info_table.setStyle(plantilla.info_table_style)
+    
+    story.append(info_table)
+    story.append(Spacer(1, 30))
+    
+    # Tabla de productos con encabezado y línea de total
+    productos_data = [['Producto', 'Cantidad', 'Precio Unit.', 'Subtotal']] + filas
+    productos_data.append(['', '', 'TOTAL:', total])
+    
+    productos_table = Table(productos_data, colWidths=plantilla.productos_col_widths, repeatRows=1)
+    productos_table.setStyle(plantilla.productos_table_style)
+    
+    story.append(productos_table)
+    story.append(Spacer(1, 30))
+    
+    # Pie de página
+    story.append(Paragraph("¡Gracias por su visita!", plantilla.header_style))
+    
+    # Generar PDF
+    doc.build(story)
+
+def _recortar(texto, fuente, tamano, ancho):
+    """Acorta el texto con '…' para que entre en `ancho` puntos"""
+    if stringWidth(texto, fuente, tamano) <= ancho:
+        return texto
+    while texto and stringWidth(texto + "…", fuente, tamano) > ancho:
+        texto = texto[:-1]
+    return texto.rstrip() + "…"
+
+def _renderizar_canvas(pedido_completo, destino):
+    """Dibuja la factura directamente con el canvas, sin maquetación"""
+    plantilla = get_plantilla()
+    info_data, filas, total = _datos_factura(pedido_completo)
+    ancho, alto = plantilla.pagesize
+    margen = plantilla.margen
+    alto_fila = plantilla.alto_fila
+    xs = plantilla.columnas_x
+    anchos = plantilla.productos_col_widths
+    x_fin = margen + plantilla.ancho_tabla
+    
+    c = canvas.Canvas(destino, pagesize=plantilla.pagesize)
+    
+    # Encabezado
+    y = alto - margen - 18
+    c.setFont('Helvetica-Bold', 18)
+    c.drawCentredString(ancho / 2, y, "FACTURA")
+    y -= 40
+    c.setFont('Helvetica', 12)
+    for linea in ENCABEZADO:
+        c.drawCentredString(ancho / 2, y, linea)
+        y -= 16
+    y -= 20
+    
+    # Información del pedido
+    info_x = [margen]
+    for ancho_col in plantilla.info_col_widths[:-1]:
+        info_x.append(info_x[-1] + ancho_col)
+    for fila in info_data:
+        for col, valor in enumerate(fila):
+            c.setFont('Helvetica-Bold' if col in (0, 2) else 'Helvetica', 10)
+            c.drawString(info_x[col], y, str(valor))
+        y -= 14
+    y -= 30
+    
+    def encabezado_tabla(y):
+        c.setFillColor(colors.grey)
+        c.rect(margen, y - alto_fila, plantilla.ancho_tabla, alto_fila, stroke=1, fill=1)
+        c.setFillColor(colors.whitesmoke)
+        c.setFont('Helvetica-Bold', 12)
+        for x, ancho_col, titulo in zip(xs, anchos, ['Producto', 'Cantidad', 'Precio Unit.', 'Subtotal']):
+            c.drawCentredString(x + ancho_col / 2, y - alto_fila + 5, titulo)
+        c.setFillColor(colors.black)
+        return y - alto_fila
+    
+    def cuadricula(y_inicio, y_fin):
+        c.setLineWidth(1)
+        for x in xs + [x_fin]:
+            c.line(x, y_inicio, x, y_fin)
+    
+    # Tabla de productos, paginando y repitiendo el encabezado
+    y_tabla = y
+    y = encabezado_tabla(y)
+    c.setFont('Helvetica', 10)
+    for fila in filas:
+        if y - alto_fila < margen:
+            cuadricula(y_tabla, y)
+            c.showPage()
+            y_tabla = y = alto - margen
+            y = encabezado_tabla(y)
+            c.setFont('Helvetica', 10)
+        y -= alto_fila
+        c.line(margen, y, x_fin, y)
+        texto_y = y + 5
+        # El canvas no recorta: un nombre largo invadiría la columna de cantidad
+        c.drawString(xs[0] + 6, texto_y, _recortar(fila[0], 'Helvetica', 10, anchos[0] - 12))
+        for col in (1, 2, 3):
+            c.drawCentredString(xs[col] + anchos[col] / 2, texto_y, fila[col])
+    
+    # Línea de total
+    if y - alto_fila < margen:
+        cuadricula(y_tabla, y)
+        c.showPage()
+        y_tabla = y = alto - margen
+    y -= alto_fila
+    c.setFillColor(colors.lightgrey)
+    c.rect(xs[2], y, anchos[2] + anchos[3], alto_fila, stroke=0, fill=1)
+    c.setFillColor(colors.black)
+    c.line(margen, y, x_fin, y)
+    c.line(margen, y_tabla, x_fin, y_tabla)
+    cuadricula(y_tabla, y)
+    c.setFont('Helvetica-Bold', 12)
+    c.drawRightString(xs[3] - 6, y + 5, 'TOTAL:')
+    c.drawRightString(x_fin - 6, y + 5, total)
+    
+    # Pie de página
+    y -= 50
+    if y < margen:
+        c.showPage()
+        y = alto - margen
+    c.setFont('Helvetica', 12)
+    c.drawCentredString(ancho / 2, y, "¡Gracias por su visita!")
+    
+    c.save()
+
+def renderizar_factura(pedido_completo, destino, rapido=False):
+    """Renderiza la factura en una ruta o archivo abierto; rapido usa el canvas directo"""
+    if rapido:
+        _renderizar_canvas(pedido_completo, destino)
+    else:
+        _renderizar_platypus(pedido_completo, destino)
+
+def generar_factura_pdf(pedido_completo, directorio=DIRECTORIO_FACTURAS, rapido=False):
+    """Genera la factura PDF de un pedido y devuelve la ruta del archivo"""
+    # Crear directorio de facturas si no existe
+    os.makedirs(directorio, exist_ok=True)
+    
+    pedido_info = pedido_completo['pedido']
+    filename = os.path.join(
+        directorio,
+        f"factura_{pedido_info[0]:06d}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    )
+    
+    renderizar_factura(pedido_completo, filename, rapido)
+    return filename
+
+def abrir_archivo(filename):
+    """Abre un archivo con el visor del sistema sin esperar a que se cierre"""
+    if sys.platform.startswith('win'):
+        os.startfile(filename)
+    elif sys.platform.startswith('darwin'):
+        subprocess.Popen(['open', filename])
+    else:
+        subprocess.Popen(['xdg-open', filename])
+
+class ColaFacturas:
+    """Genera facturas con un grupo de hilos y avisa a la interfaz con root.after"""
+    
+    INTERVALO_REVISION = 100  # ms entre revisiones de resultados en el hilo de Tk
+    
+    def __init__(self, db, root, trabajadores=2, rapido=False):
+        self.db = db
+        self.root = root
+        self.rapido = rapido
+        self._trabajos = queue.Queue()
+        self._resultados = queue.Queue()
+        self._hilos = []
+        self._activa = True
+        
+        for i in range(trabajadores):
+            hilo = threading.Thread(target=self._trabajar, name=f"factura-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        
+        self._revision = self.root.after(self.INTERVALO_REVISION, self._revisar_resultados)
+    
+    def encolar(self, pedido_id, al_terminar=None, al_fallar=None):
+        """Encola la factura de un pedido; los callbacks corren en el hilo de Tk"""
+        self._trabajos.put((pedido_id, al_terminar, al_fallar))
+    
+    def _trabajar(self):
+        """Bucle de cada hilo trabajador"""
+        while True:
+            trabajo = self._trabajos.get()
+            if trabajo is None:
+                break
+            
+            pedido_id, al_terminar, al_fallar = trabajo
+            try:
+                pedido_completo = self.db.get_pedido_completo(pedido_id)
+                if not pedido_completo:
+                    raise ValueError("No se pudo obtener la información del pedido")
+                filename = generar_factura_pdf(pedido_completo, rapido=self.rapido)
+                self._resultados.put((al_terminar, filename))
+            except Exception as e:
+                self._resultados.put((al_fallar, e))
+    
+    def _revisar_resultados(self):
+        """Entrega en el hilo de Tk los resultados de los trabajos terminados"""
+        while True:
+            try:
+                callback, valor = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            if callback:
+                callback(valor)
+        
+        if self._activa:
+            self._revision = self.root.after(self.INTERVALO_REVISION, self._revisar_resultados)
+    
+    def cerrar(self, timeout=10):
+        """Detiene los hilos trabajadores una vez vaciada la cola"""
+        self._activa = False
+        try:
+            self.root.after_cancel(self._revision)
+        except Exception:
+            pass
+        for _ in self._hilos:
+            self._trabajos.put(None)
+        # Dar tiempo a que terminen las facturas pendientes antes de cerrar la base
+        for hilo in self._hilos:
+            hilo.join(timeout)
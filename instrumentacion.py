@@ -0,0 +1,225 @@
+# instrumentacion.py - Tiempos por operación y registro de consultas lentas
+#
+# Se activa con BAR_POS_METRICAS=1; sin la variable no se instrumenta nada.
+# Envuelve los métodos públicos de DatabaseManager y los refrescos de la
+# interfaz, cuenta las llamadas y arma un histograma de latencia por operación.
+# Las sentencias SQL se miden con el trace callback de sqlite3, solo mientras
+# el hilo está dentro de una operación medida: una sentencia dura hasta que
+# empieza la siguiente de la misma operación o hasta que la operación termina,
+# así que su tiempo incluye leer las filas desde Python. Lo que ejecutan los
+# hilos de fondo fuera de una operación (comandas, diario) no se mide, porque
+# el tiempo hasta su próxima sentencia sería espera y no trabajo. Las que superan el umbral (BAR_POS_METRICAS_UMBRAL_MS, 50 ms por
+# defecto) se escriben en un log rotativo.
+import os
+import re
+import json
+import time
+import bisect
+import logging
+import functools
+import threading
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# Límites superiores (ms) de los baldes del histograma; el último balde es abierto
+BALDES_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+UMBRAL_LENTA_MS = 50
+ARCHIVO_LENTAS = "consultas_lentas.log"
+
+# Métodos de POSSystem que refrescan la interfaz
+REFRESCOS_UI = ['load_mesas', 'load_productos', 'load_pedido_actual', 'generar_factura_pdf']
+
+# Métodos de DatabaseManager que no son operaciones
+NO_MEDIDOS = ['get_connection', 'transaccion', 'close', 'init_database', 'insert_initial_data']
+
+class Histograma:
+    """Cantidad, total, máximo y distribución por baldes de una serie de tiempos"""
+    
+    def __init__(self):
+        self.cuenta = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.baldes = [0] * (len(BALDES_MS) + 1)
+    
+    def registrar(self, ms):
+        self.cuenta += 1
+        self.total += ms
+        self.maximo = max(self.maximo, ms)
+        self.baldes[bisect.bisect_left(BALDES_MS, ms)] += 1
+    
+    def percentil(self, p):
+        """Límite superior del balde en el que cae el percentil p"""
+        objetivo = self.cuenta * p / 100
+        acumulado = 0
+        for i, n in enumerate(self.baldes):
+            acumulado += n
+            if n and acumulado >= objetivo:
+                return min(BALDES_MS[i], self.maximo) if i < len(BALDES_MS) else self.maximo
+        return self.maximo
+    
+    def resumen(self):
+        histograma = {f"<={limite}": n for limite, n in zip(BALDES_MS, self.baldes) if n}
+        if self.baldes[-1]:
+            histograma[f">{BALDES_MS[-1]}"] = self.baldes[-1]
+        return {
+            'llamadas': self.cuenta,
+            'total_ms': round(self.total, 3),
+            'media_ms': round(self.total / self.cuenta, 3) if self.cuenta else 0.0,
+            'p50_ms': round(self.percentil(50), 3),
+            'p95_ms': round(self.percentil(95), 3),
+            'p99_ms': round(self.percentil(99), 3),
+            'max_ms': round(self.maximo, 3),
+            'histograma': histograma,
+        }
+
+def normalizar_sql(sql):
+    """Agrupa sentencias iguales salvo por sus valores"""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    return " ".join(sql.split())[:300]
+
+class Metricas:
+    """Acumula tiempos por operación y por sentencia SQL"""
+    
+    def __init__(self, umbral_lenta_ms=UMBRAL_LENTA_MS, archivo_lentas=ARCHIVO_LENTAS):
+        self.umbral_lenta_ms = umbral_lenta_ms
+        self._operaciones = {}  # nombre -> Histograma
+        self._sentencias = {}   # sql normalizado -> Histograma
+        self._lock = threading.Lock()
+        self._local = threading.local()  # sentencia en curso y operaciones abiertas de cada hilo
+        
+        self.log_lentas = logging.getLogger("bar_pos.consultas_lentas")
+        self.log_lentas.propagate = False
+        if not self.log_lentas.handlers:
+            manejador = RotatingFileHandler(archivo_lentas, maxBytes=1024 * 1024,
+                                            backupCount=3, encoding="utf-8")
+            manejador.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.log_lentas.addHandler(manejador)
+            self.log_lentas.setLevel(logging.INFO)
+    
+    def registrar(self, nombre, ms):
+        """Suma una medición a la operación indicada"""
+        with self._lock:
+            histograma = self._operaciones.get(nombre)
+            if histograma is None:
+                histograma = self._operaciones[nombre] = Histograma()
+            histograma.registrar(ms)
+    
+    def medir(self, nombre, funcion):
+        """Devuelve `funcion` envuelta para medir cada llamada bajo `nombre`"""
+        @functools.wraps(funcion)
+        def medida(*args, **kwargs):
+            inicio = self._empezar()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                self._terminar(nombre, inicio)
+        return medida
+    
+    def _empezar(self):
+        """Abre la medición de una operación en este hilo; devuelve el instante de inicio"""
+        self._local.profundidad = getattr(self._local, 'profundidad', 0) + 1
+        return time.perf_counter()
+    
+    def _terminar(self, nombre, inicio):
+        """Cierra la medición de una operación que empezó en `inicio`"""
+        fin = time.perf_counter()
+        self._cerrar_sentencia(fin)
+        self._local.profundidad -= 1
+        self.registrar(nombre, (fin - inicio) * 1000)
+    
+    def _traza(self, sql):
+        """Trace callback de sqlite3: se llama al empezar cada sentencia"""
+        if sql.startswith("--"):
+            return  # subprogramas de triggers: son parte de la sentencia en curso
+        if not getattr(self._local, 'profundidad', 0):
+            return  # fuera de una operación medida: no hay con qué cerrar la sentencia
+        ahora = time.perf_counter()
+        self._cerrar_sentencia(ahora)
+        self._local.sentencia = (sql, ahora)
+    
+    def _cerrar_sentencia(self, ahora):
+        """Registra la sentencia en curso del hilo, si la hay"""
+        sentencia = getattr(self._local, 'sentencia', None)
+        if sentencia is None:
+            return
+        self._local.sentencia = None
+        sql, inicio = sentencia
+        ms = (ahora - inicio) * 1000
+        
+        clave = normalizar_sql(sql)
+        with self._lock:
+            histograma = self._sentencias.get(clave)
+            if histograma is None:
+                histograma = self._sentencias[clave] = Histograma()
+            histograma.registrar(ms)
+        if ms >= self.umbral_lenta_ms:
+            self.log_lentas.info("%.1f ms [%s] %s", ms, threading.current_thread().name,
+                                 " ".join(sql.split()))
+    
+    def instrumentar_db(self, db):
+        """Mide los métodos públicos de la base y, si es local, sus sentencias SQL"""
+        for nombre in dir(type(db)):
+            if nombre.startswith("_") or nombre in NO_MEDIDOS:
+                continue
+            metodo = getattr(db, nombre)
+            if not callable(metodo):
+                continue
+            if nombre == 'llamar':
+                # Cliente del servicio: una métrica por operación remota
+                setattr(db, nombre, self._medir_llamada(metodo))
+            else:
+                setattr(db, nombre, self.medir(f"db.{nombre}", metodo))
+        
+        if hasattr(db, 'conexiones'):
+            db.conexiones.al_conectar(lambda conn: conn.set_trace_callback(self._traza))
+    
+    def _medir_llamada(self, llamar):
+        @functools.wraps(llamar)
+        def medida(metodo, *args):
+            inicio = self._empezar()
+            try:
+                return llamar(metodo, *args)
+            finally:
+                self._terminar(f"db.{metodo}", inicio)
+        return medida
+    
+    def instrumentar_ui(self, app):
+        """Mide los refrescos de la interfaz; debe llamarse antes de construir las pantallas"""
+        for nombre in REFRESCOS_UI:
+            setattr(app, nombre, self.medir(f"ui.{nombre}", getattr(app, nombre)))
+    
+    def resumen(self, sentencias=20):
+        """Estadísticas por operación y de las sentencias con más tiempo acumulado"""
+        with self._lock:
+            operaciones = {nombre: h.resumen() for nombre, h in sorted(self._operaciones.items())}
+            lentas = sorted(self._sentencias.items(), key=lambda item: -item[1].total)
+            return {
+                'operaciones': operaciones,
+                'sentencias': {sql: h.resumen() for sql, h in lentas[:sentencias]},
+            }
+    
+    def volcar(self, ruta):
+        """Escribe el resumen completo en un archivo JSON"""
+        datos = {'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                 'umbral_lenta_ms': self.umbral_lenta_ms}
+        datos.update(self.resumen(sentencias=None))
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+    
+    def reiniciar(self):
+        """Descarta todo lo medido hasta ahora"""
+        with self._lock:
+            self._operaciones.clear()
+            self._sentencias.clear()
+
+def activar(app):
+    """Instrumenta base e interfaz si BAR_POS_METRICAS está definida; devuelve las métricas o None"""
+    if not os.environ.get("BAR_POS_METRICAS"):
+        return None
+    
+    metricas = Metricas(float(os.environ.get("BAR_POS_METRICAS_UMBRAL_MS", UMBRAL_LENTA_MS)))
+    metricas.instrumentar_db(app.db)
+    metricas.instrumentar_ui(app)
+    return metricas
@@ -0,0 +1,338 @@
+# journal.py - Diario local de ediciones de pedidos con escritura diferida
+#
+# Con varias terminales sobre la misma base, agregar o quitar un producto puede
+# quedar esperando el lock de escritura de SQLite o fallar con "database is
+# locked". Con el diario, cada edición se agrega como una línea JSON a un
+# archivo local (con fsync) y se confirma enseguida; un hilo escritor la aplica
+# después en la base, en transacciones por lotes y en el orden en que se cargó,
+# así que las ediciones de un mismo pedido nunca se reordenan.
+#
+# Cada lote guarda en journal_aplicado, en la misma transacción, la última
+# secuencia aplicada. Al reiniciar se aplican las ediciones del archivo
+# posteriores a esa secuencia: ninguna se pierde ni se aplica dos veces.
+#
+# Solo se reintenta cuando la base está ocupada (SQLITE_BUSY / SQLITE_LOCKED).
+# Cualquier otro error de la base (disco lleno, error de E/S, falta una tabla)
+# hace fallar las ediciones del lote, que se informan con al_fallar y se marcan
+# en el archivo como descartadas para no reaplicarlas al reiniciar.
+#
+# Los resultados se entregan a la interfaz con entregar(), que se llama desde
+# root.after en el hilo de Tk.
+#
+# Un archivo por terminal (BAR_POS_TERMINAL, por defecto el nombre del equipo),
+# tomado con un lock exclusivo: una segunda instancia con el mismo archivo no
+# arranca. BAR_POS_JOURNAL=0 escribe directo en la base como antes.
+import os
+import json
+import uuid
+import queue
+import socket
+import logging
+import sqlite3
+import threading
+from itertools import islice
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+TAMANO_LOTE = 100
+REINTENTO_MINIMO = 0.05  # segundos de espera tras encontrar la base ocupada
+REINTENTO_MAXIMO = 2.0
+TAMANO_COMPACTAR = 1024 * 1024  # bytes del archivo a partir de los que se vacía
+
+log = logging.getLogger("bar_pos.journal")
+
+def base_ocupada(error):
+    """True si el error de sqlite3 es por otra conexión con el lock (vale reintentar)"""
+    codigo = getattr(error, 'sqlite_errorcode', None)
+    if codigo is not None:
+        return codigo & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    mensaje = str(error).lower()
+    return "locked" in mensaje or "busy" in mensaje
+
+def _bloquear(archivo):
+    """Toma el lock exclusivo del archivo sin esperar; OSError si otro proceso lo tiene"""
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+
+def ruta_journal(db_name, terminal=None):
+    """Ruta del diario de una terminal para una base (None si la base es en memoria)"""
+    if db_name == ":memory:":
+        return None
+    terminal = terminal or os.environ.get("BAR_POS_TERMINAL") or socket.gethostname()
+    base, _ = os.path.splitext(db_name)
+    return f"{base}_journal_{terminal}.jsonl"
+
+class Journal:
+    """Ediciones de pedidos confirmadas en un archivo local y aplicadas en segundo plano"""
+    
+    def __init__(self, db, ruta=None, tamano_lote=TAMANO_LOTE):
+        self.db = db
+        self.ruta = ruta
+        self.tamano_lote = tamano_lote
+        self.id = None
+        self._archivo = None
+        self._encabezado = 0       # bytes de la primera línea del archivo
+        self._seq = 0
+        self._descartadas = 0      # secuencia hasta la que no hay que reaplicar nada
+        self._cola = deque()       # (edicion, al_aplicar, al_fallar) en orden de carga
+        self._pendientes = {}      # pedido_id -> ediciones sin aplicar
+        self._resultados = queue.Queue()  # (callback, valor) para el hilo de Tk
+        self._lock = threading.Lock()
+        self._cambio = threading.Condition(self._lock)
+        self._detener = False
+        self._hilo = None
+    
+    def iniciar(self):
+        """Abre el diario, encola lo que quedó sin aplicar y arranca el escritor"""
+        ediciones = self._abrir()
+        cursor = self.db.get_connection().cursor()
+        cursor.execute("SELECT seq FROM journal_aplicado WHERE journal = ?", (self.id,))
+        fila = cursor.fetchone()
+        aplicada = max(fila[0] if fila else 0, self._descartadas)
+        
+        pendientes = [e for e in ediciones if e['seq'] > aplicada]
+        if pendientes:
+            log.info("Reaplicando %d ediciones del diario %s", len(pendientes), self.ruta)
+        for edicion in pendientes:
+            self._encolar(edicion, None, None)
+        self._seq = max([aplicada] + [e['seq'] for e in ediciones])
+        
+        self._hilo = threading.Thread(target=self._escribir, name="journal", daemon=True)
+        self._hilo.start()
+        return self
+    
+    def _abrir(self):
+        """Lee el archivo del diario y lo deja abierto para agregar; devuelve sus ediciones"""
+        if self.ruta is None:
+            self.id = uuid.uuid4().hex
+            return []
+        
+        # El lock se toma antes de leer: otra instancia podría estar agregando o vaciando
+        archivo = open(self.ruta, "a+b")
+        try:
+            _bloquear(archivo)
+        except OSError:
+            archivo.close()
+            raise ValueError(f"El diario {self.ruta} ya está en uso por otra instancia; "
+                             f"use BAR_POS_TERMINAL para distinguir las terminales de este equipo")
+        
+        ediciones = []
+        valido = 0
+        archivo.seek(0)
+        for numero, linea in enumerate(archivo):
+            try:
+                datos = json.loads(linea)
+            except ValueError:
+                break  # línea cortada por un corte de luz: se descarta
+            if not linea.endswith(b"\n"):
+                break
+            if numero == 0:
+                self.id = datos.get('journal') if isinstance(datos, dict) else None
+                self._encabezado = len(linea)
+            elif isinstance(datos, dict) and isinstance(datos.get('descartadas_hasta'), int):
+                self._descartadas = max(self._descartadas, datos['descartadas_hasta'])
+            elif isinstance(datos, dict) and isinstance(datos.get('seq'), int):
+                ediciones.append(datos)
+            else:
+                # Sin secuencia no se puede ubicar en el orden: no se aplica
+                log.warning("Línea %d del diario %s ignorada: %r", numero + 1, self.ruta, datos)
+            valido += len(linea)
+        
+        if self.id is None:
+            # Archivo nuevo o sin encabezado válido
+            self.id = uuid.uuid4().hex
+            encabezado = (json.dumps({'journal': self.id}) + "\n").encode("utf-8")
+            archivo.truncate(0)
+            archivo.write(encabezado)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+            self._encabezado = valido = len(encabezado)
+            ediciones = []
+        elif archivo.seek(0, os.SEEK_END) != valido:
+            # Sacar el final cortado para que la próxima línea no quede pegada
+            archivo.truncate(valido)
+        
+        archivo.seek(0, os.SEEK_END)
+        self._archivo = archivo
+        return ediciones
+    
+    def _encolar(self, edicion, al_aplicar, al_fallar):
+        self._cola.append((edicion, al_aplicar, al_fallar))
+        pedido_id = edicion.get('pedido_id')
+        self._pendientes[pedido_id] = self._pendientes.get(pedido_id, 0) + 1
+    
+    def _anotar(self, edicion, al_aplicar, al_fallar):
+        """Escribe la edición en el archivo y la encola; devuelve su secuencia"""
+        with self._lock:
+            if self._detener:
+                raise ValueError("El diario de pedidos está cerrado")
+            self._seq += 1
+            edicion['seq'] = self._seq
+            if self._archivo is not None:
+                self._archivo.write((json.dumps(edicion) + "\n").encode("utf-8"))
+                self._archivo.flush()
+                os.fsync(self._archivo.fileno())
+            self._encolar(edicion, al_aplicar, al_fallar)
+            self._cambio.notify_all()
+            return edicion['seq']
+    
+    def agregar(self, pedido_id, producto_id, cantidad, al_aplicar=None, al_fallar=None):
+        """Anota un producto agregado al pedido; al_aplicar recibe la línea resultante"""
+        if cantidad <= 0:
+            raise ValueError("La cantidad debe ser mayor a cero")
+        return self._anotar({'op': 'agregar', 'pedido_id': pedido_id,
+                             'producto_id': producto_id, 'cantidad': cantidad},
+                            al_aplicar, al_fallar)
+    
+    def eliminar(self, pedido_id, detalle_id, al_aplicar=None, al_fallar=None):
+        """Anota la eliminación de una línea del pedido"""
+        return self._anotar({'op': 'eliminar', 'pedido_id': pedido_id, 'detalle_id': detalle_id},
+                            al_aplicar, al_fallar)
+    
+    def pendientes(self, pedido_id=None):
+        """Ediciones todavía no aplicadas en la base, de un pedido o de todos"""
+        with self._lock:
+            if pedido_id is None:
+                return len(self._cola)
+            return self._pendientes.get(pedido_id, 0)
+    
+    def esperar(self, pedido_id=None, timeout=None):
+        """Bloquea hasta que se apliquen las ediciones pendientes; False si venció el plazo"""
+        with self._lock:
+            return self._cambio.wait_for(
+                lambda: not (self._pendientes.get(pedido_id, 0) if pedido_id is not None
+                             else self._cola), timeout)
+    
+    def entregar(self):
+        """Llama en este hilo los callbacks de lo aplicado; devuelve cuántas ediciones siguen en curso"""
+        while True:
+            try:
+                callback, valor = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            callback(valor)
+        return self.pendientes() + self._resultados.qsize()
+    
+    def cerrar(self, espera=10):
+        """Aplica lo pendiente (hasta `espera` segundos) y cierra; el resto queda en el archivo"""
+        with self._lock:
+            self._detener = True
+            self._cambio.notify_all()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+        with self._lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+    
+    def _escribir(self):
+        """Hilo escritor: aplica la cola por lotes, reintentando mientras la base esté ocupada"""
+        espera = REINTENTO_MINIMO
+        while True:
+            with self._lock:
+                while not self._cola and not self._detener:
+                    self._cambio.wait()
+                if not self._cola:
+                    return
+                lote = list(islice(self._cola, self.tamano_lote))
+            
+            try:
+                resultados = self._aplicar(lote)
+            except sqlite3.Error as e:
+                if not base_ocupada(e):
+                    # La base no puede aplicar el lote (disco lleno, E/S, esquema):
+                    # reintentar no sirve, se informan las ediciones como fallidas
+                    log.error("No se pudo aplicar un lote de %d ediciones: %s", len(lote), e)
+                    self._terminar_lote(lote, [(False, e)] * len(lote), descartar=True)
+                    continue
+                # Base ocupada: el lote sigue primero en la cola y se reintenta
+                log.warning("Base ocupada, se reintenta un lote de %d ediciones: %s", len(lote), e)
+                with self._lock:
+                    if self._detener:
+                        return
+                    self._cambio.wait(espera)
+                espera = min(espera * 2, REINTENTO_MAXIMO)
+                continue
+            espera = REINTENTO_MINIMO
+            self._terminar_lote(lote, resultados)
+    
+    def _terminar_lote(self, lote, resultados, descartar=False):
+        """Saca el lote de la cola y entrega sus resultados; con descartar, lo marca en el archivo"""
+        with self._lock:
+            if descartar and self._archivo is not None:
+                marca = {'descartadas_hasta': lote[-1][0].get('seq')}
+                self._archivo.write((json.dumps(marca) + "\n").encode("utf-8"))
+                self._archivo.flush()
+                os.fsync(self._archivo.fileno())
+            for _ in lote:
+                edicion = self._cola.popleft()[0]
+                pedido_id = edicion.get('pedido_id')
+                self._pendientes[pedido_id] -= 1
+                if not self._pendientes[pedido_id]:
+                    del self._pendientes[pedido_id]
+            self._cambio.notify_all()
+            if not self._cola:
+                self._compactar()
+        
+        for (edicion, al_aplicar, al_fallar), (aplicada, valor) in zip(lote, resultados):
+            callback = al_aplicar if aplicada else al_fallar
+            if callback:
+                self._resultados.put((callback, valor))
+            elif not aplicada:
+                log.warning("Edición %s descartada: %s", edicion, valor)
+    
+    def _aplicar(self, lote):
+        """Aplica un lote en una transacción; cada edición que falla se deshace sola"""
+        resultados = []
+        with self.db.transaccion() as cursor:
+            for edicion, _, _ in lote:
+                cursor.execute("SAVEPOINT edicion")
+                try:
+                    if edicion['op'] == 'agregar':
+                        valor = self.db._agregar_productos(
+                            cursor, edicion['pedido_id'],
+                            [(edicion['producto_id'], edicion['cantidad'])])[0]
+                    else:
+                        valor = self.db._eliminar_detalle(cursor, edicion['detalle_id'])
+                    cursor.execute("RELEASE edicion")
+                    resultados.append((True, valor))
+                except Exception as e:
+                    if isinstance(e, sqlite3.OperationalError):
+                        raise  # base ocupada se reintenta; otro error falla el lote completo
+                    # El pedido se cerró, el producto ya no existe o la línea del
+                    # diario está mal formada: solo se descarta esta edición
+                    if not isinstance(e, (ValueError, sqlite3.IntegrityError)):
+                        log.exception("Edición %s mal formada", edicion)
+                    cursor.execute("ROLLBACK TO edicion")
+                    cursor.execute("RELEASE edicion")
+                    resultados.append((False, e))
+            
+            cursor.execute('''
+                INSERT INTO journal_aplicado (journal, seq) VALUES (?, ?)
+                ON CONFLICT (journal) DO UPDATE SET seq = excluded.seq
+            ''', (self.id, lote[-1][0]['seq']))
+        return resultados
+    
+    def _compactar(self):
+        """Vacía el archivo cuando todo lo anotado ya está en la base (con el lock tomado)"""
+        if self._archivo is None or self._archivo.tell() < TAMANO_COMPACTAR:
+            return
+        self._archivo.truncate(self._encabezado)
+        self._archivo.seek(0, os.SEEK_END)
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+
+def iniciar(db):
+    """Arranca el diario de esta terminal; None si está desactivado o se usa el servicio"""
+    if os.environ.get("BAR_POS_JOURNAL") == "0" or not hasattr(db, 'get_connection'):
+        # El servicio de pedidos ya ordena las escrituras con su propio hilo escritor
+        return None
+    return Journal(db, ruta_journal(db.db_name)).iniciar()
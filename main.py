@@ -1,18 +1,21 @@
 # main.py - Interfaz principal del sistema POS (Versión mejorada)
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from database import get_db
+from widgets import MapaMesas, GrillaProductos, PanelPedido
+from reportes import REPORTES, ConsultaReporte
+from moneda import formatear
+import instrumentacion
+import comandas
+import journal
 import threading
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 
 class POSSystem:
+    INTERVALO_CAMBIOS = 500  # ms entre revisiones del registro de cambios
+    INTERVALO_JOURNAL = 50  # ms entre entregas de ediciones aplicadas del diario
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Sistema POS - Bar")
@@ -20,15 +23,29 @@ class POSSystem:
         self.root.configure(bg="#2c3e50")
         
         self.db = get_db()
+        self.facturas = None  # ColaFacturas, se crea con la primera factura
+        # Despacho de comandas a barra y cocina en segundo plano
+        self.comandas = comandas.iniciar(self.db)
+        # Ediciones de pedidos a un diario local: no esperan el lock de la base
+        self.journal = journal.iniciar(self.db)
+        self._revision_journal = None
+        self._reintentos_journal = set()  # (pedido_id, acción) esperando al diario
+        # Métricas opcionales (BAR_POS_METRICAS=1); antes de armar las pantallas
+        self.metricas = instrumentacion.activar(self)
         self.usuario_actual = None
         self.pedido_actual = None
         self.mesa_actual = None
+        self.seq_cambios = 0
+        self._revision_cambios = None
         
         # Variable para controlar ventana de venta directa
         self.venta_directa_window = None
         
         self.setup_styles()
         self.create_login_screen()
+        
+        # ReportLab tarda en importarse: se carga en segundo plano con el login ya visible
+        self.root.after_idle(self.precargar_facturas)
     
     def setup_styles(self):
         """Configura los estilos de la interfaz"""
@@ -158,17 +175,15 @@ class POSSystem:
         tk.Label(left_frame, text="MESAS", font=('Arial', 14, 'bold'),
                 bg="#ecf0f1").pack(pady=10)
         
-        # Botón para refrescar mesas
-        refresh_btn = tk.Button(left_frame, text="🔄 Refrescar",
-                               command=self.load_mesas, font=('Arial', 10),
-                               bg="#95a5a6", fg="white")
-        refresh_btn.pack(pady=5)
-        
         # Frame para las mesas
         self.mesas_frame = tk.Frame(left_frame, bg="#ecf0f1")
         self.mesas_frame.pack(expand=True, fill="both", padx=10)
+        self.mapa_mesas = MapaMesas(self.mesas_frame, self.seleccionar_mesa)
         
+        # Carga inicial; después solo se aplican los cambios de las demás terminales
+        self.seq_cambios = self.db.get_ultimo_cambio()
         self.load_mesas()
+        self.vigilar_cambios()
         
         # Panel derecho - Productos y pedido
         right_frame = tk.Frame(ventas_frame, bg="#ecf0f1")
@@ -216,6 +231,9 @@ class POSSystem:
         # Lista de productos
         self.productos_frame = tk.Frame(productos_frame, bg="#ecf0f1")
         self.productos_frame.pack(expand=True, fill="both")
+        self.grilla_productos = GrillaProductos(self.productos_frame, self.agregar_producto)
+        self.crear_buscador(productos_frame, self.grilla_productos, self.load_productos,
+                            antes_de=self.productos_frame)
         
         # Panel del pedido actual
         pedido_frame = tk.Frame(content_frame, bg="#ecf0f1", width=350)
@@ -234,7 +252,7 @@ class POSSystem:
         self.total_frame.pack(fill="x", padx=10, pady=10)
         self.total_frame.pack_propagate(False)
         
-        self.total_label = tk.Label(self.total_frame, text="Total: $0.00",
+        self.total_label = tk.Label(self.total_frame, text=f"Total: {formatear(0)}",
                                    font=('Arial', 14, 'bold'),
                                    bg="#ecf0f1")
         self.total_label.pack()
@@ -252,6 +270,9 @@ class POSSystem:
                                      bg="#e67e22", fg="white", state="disabled")
         self.cancelar_btn.pack(pady=2, fill="x")
         
+        self.panel_pedido = PanelPedido(self.pedido_listbox_frame, self.eliminar_detalle,
+                                        self.actualizar_total_pedido)
+        
         self.load_productos()
     
     def create_caja_tab(self):
@@ -282,53 +303,338 @@ class POSSystem:
         buttons_frame.pack(pady=20)
         
         reportes_btn = tk.Button(buttons_frame, text="Ver Reportes",
+                                command=self.abrir_ventana_reportes,
                                 font=('Arial', 12, 'bold'),
                                 bg="#9b59b6", fg="white", padx=20, pady=10)
         reportes_btn.pack(pady=10, fill="x")
         
+        metricas_btn = tk.Button(buttons_frame, text="Ver Métricas",
+                                command=self.abrir_ventana_metricas,
+                                font=('Arial', 12, 'bold'),
+                                bg="#34495e", fg="white", padx=20, pady=10)
+        metricas_btn.pack(pady=10, fill="x")
+        
         productos_btn = tk.Button(buttons_frame, text="Gestionar Productos",
+                                 command=self.abrir_ventana_productos,
                                  font=('Arial', 12, 'bold'),
                                  bg="#1abc9c", fg="white", padx=20, pady=10)
         productos_btn.pack(pady=10, fill="x")
     
-    def load_mesas(self):
-        """Carga las mesas en el panel izquierdo"""
-        # Limpiar mesas existentes
-        for widget in self.mesas_frame.winfo_children():
-            widget.destroy()
+    def abrir_ventana_reportes(self):
+        """Abre la ventana de reportes de ventas"""
+        reportes_window = tk.Toplevel(self.root)
+        reportes_window.title("Reportes de Ventas")
+        reportes_window.geometry("700x500")
+        reportes_window.configure(bg="#ecf0f1")
+        reportes_window.transient(self.root)
+        
+        # Filtros
+        filtros_frame = tk.Frame(reportes_window, bg="#ecf0f1")
+        filtros_frame.pack(fill="x", padx=10, pady=10)
+        
+        claves = list(REPORTES)
+        reporte_var = tk.StringVar(value=REPORTES[claves[0]][0])
+        ttk.Combobox(filtros_frame, textvariable=reporte_var, state="readonly",
+                     values=[REPORTES[c][0] for c in claves],
+                     font=('Arial', 10), width=25).pack(side="left", padx=5)
+        
+        hoy = datetime.now()
+        desde_var = tk.StringVar(value=hoy.strftime("%Y-%m-01"))
+        hasta_var = tk.StringVar(value=hoy.strftime("%Y-%m-%d"))
+        
+        tk.Label(filtros_frame, text="Desde:", font=('Arial', 10), bg="#ecf0f1").pack(side="left")
+        tk.Entry(filtros_frame, textvariable=desde_var, font=('Arial', 10), width=11).pack(side="left", padx=5)
+        tk.Label(filtros_frame, text="Hasta:", font=('Arial', 10), bg="#ecf0f1").pack(side="left")
+        tk.Entry(filtros_frame, textvariable=hasta_var, font=('Arial', 10), width=11).pack(side="left", padx=5)
+        
+        # Resultados
+        tabla_frame = tk.Frame(reportes_window, bg="#ecf0f1")
+        tabla_frame.pack(expand=True, fill="both", padx=10)
+        
+        tabla = ttk.Treeview(tabla_frame, show="headings")
+        scrollbar = ttk.Scrollbar(tabla_frame, orient="vertical", command=tabla.yview)
+        tabla.configure(yscrollcommand=scrollbar.set)
+        tabla.pack(side="left", expand=True, fill="both")
+        scrollbar.pack(side="right", fill="y")
+        
+        estado_label = tk.Label(reportes_window, text="", font=('Arial', 10), bg="#ecf0f1")
+        estado_label.pack(pady=5)
+        
+        consulta = {'actual': None, 'filas': 0}
+        
+        def recibir(pagina):
+            for fila in pagina:
+                tabla.insert("", "end", values=[
+                    formatear(v) if i == 2 and v is not None else v
+                    for i, v in enumerate(fila)
+                ])
+            consulta['filas'] += len(pagina)
+            estado_label.configure(text=f"Cargando... {consulta['filas']} filas")
         
-        try:
-            mesas = self.db.get_mesas()
+        def terminar():
+            estado_label.configure(text=f"{consulta['filas']} filas")
+        
+        def fallar(error):
+            estado_label.configure(text="")
+            messagebox.showerror("Error", f"Error al generar reporte: {str(error)}")
+        
+        def generar():
+            try:
+                desde = datetime.strptime(desde_var.get(), "%Y-%m-%d")
+                hasta = datetime.strptime(hasta_var.get(), "%Y-%m-%d") + timedelta(days=1)
+            except ValueError:
+                messagebox.showerror("Error", "Fechas inválidas (use AAAA-MM-DD)")
+                return
             
-            # Crear botones de mesa en una grilla
-            cols = 3
-            for i, mesa in enumerate(mesas):
-                row = i // cols
-                col = i % cols
-                
-                mesa_id, numero, capacidad, estado = mesa
-                
-                # Color según estado
-                color = {
-                    'libre': '#2ecc71',
-                    'ocupada': '#e74c3c',
-                    'reservada': '#f39c12'
-                }.get(estado, '#95a5a6')
-                
-                btn = tk.Button(self.mesas_frame, text=f"Mesa {numero}",
-                               command=lambda m=mesa: self.seleccionar_mesa(m),
-                               font=('Arial', 10, 'bold'),
-                               bg=color, fg="white",
-                               width=8, height=3)
-                btn.grid(row=row, column=col, padx=2, pady=2, sticky="ew")
+            if consulta['actual']:
+                consulta['actual'].cancelar()
+            
+            clave = claves[[REPORTES[c][0] for c in claves].index(reporte_var.get())]
+            columnas = REPORTES[clave][1]
+            tabla.delete(*tabla.get_children())
+            tabla.configure(columns=columnas)
+            for columna in columnas:
+                tabla.heading(columna, text=columna)
             
-            # Configurar columnas para que se expandan uniformemente
-            for i in range(cols):
-                self.mesas_frame.grid_columnconfigure(i, weight=1)
+            consulta['filas'] = 0
+            estado_label.configure(text="Cargando...")
+            consulta['actual'] = ConsultaReporte(
+                self.db, reportes_window, clave,
+                desde.strftime("%Y-%m-%d"), hasta.strftime("%Y-%m-%d"),
+                recibir, terminar, fallar)
+        
+        def cerrar():
+            if consulta['actual']:
+                consulta['actual'].cancelar()
+            reportes_window.destroy()
+        
+        tk.Button(filtros_frame, text="Generar", command=generar,
+                 font=('Arial', 10, 'bold'), bg="#9b59b6", fg="white").pack(side="left", padx=5)
+        
+        reportes_window.protocol("WM_DELETE_WINDOW", cerrar)
+    
+    def abrir_ventana_metricas(self):
+        """Muestra los tiempos medidos por operación y las sentencias más costosas"""
+        if not self.metricas:
+            messagebox.showinfo("Métricas",
+                                "Las métricas están desactivadas.\n"
+                                "Inicie el sistema con BAR_POS_METRICAS=1 para medir tiempos.")
+            return
+        
+        metricas_window = tk.Toplevel(self.root)
+        metricas_window.title("Métricas")
+        metricas_window.geometry("900x500")
+        metricas_window.configure(bg="#ecf0f1")
+        metricas_window.transient(self.root)
+        
+        columnas = ["Operación", "Llamadas", "Media ms", "p50 ms", "p95 ms", "p99 ms", "Máx ms"]
+        tabla_frame = tk.Frame(metricas_window, bg="#ecf0f1")
+        tabla_frame.pack(expand=True, fill="both", padx=10, pady=10)
+        
+        tabla = ttk.Treeview(tabla_frame, columns=columnas, show="headings")
+        for columna in columnas:
+            tabla.heading(columna, text=columna)
+            tabla.column(columna, width=80 if columna != "Operación" else 380, anchor="w")
+        scrollbar = ttk.Scrollbar(tabla_frame, orient="vertical", command=tabla.yview)
+        tabla.configure(yscrollcommand=scrollbar.set)
+        tabla.pack(side="left", expand=True, fill="both")
+        scrollbar.pack(side="right", fill="y")
+        
+        def actualizar():
+            tabla.delete(*tabla.get_children())
+            resumen = self.metricas.resumen()
+            for grupo in ('operaciones', 'sentencias'):
+                for nombre, datos in resumen[grupo].items():
+                    tabla.insert("", "end", values=[
+                        nombre, datos['llamadas'], f"{datos['media_ms']:.2f}",
+                        f"{datos['p50_ms']:.2f}", f"{datos['p95_ms']:.2f}",
+                        f"{datos['p99_ms']:.2f}", f"{datos['max_ms']:.2f}"])
+        
+        def guardar():
+            ruta = f"metricas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            try:
+                self.metricas.volcar(ruta)
+                messagebox.showinfo("Métricas", f"Métricas guardadas en {os.path.abspath(ruta)}")
+            except OSError as e:
+                messagebox.showerror("Error", f"Error al guardar métricas: {str(e)}")
+        
+        def reiniciar():
+            self.metricas.reiniciar()
+            actualizar()
+        
+        botones_frame = tk.Frame(metricas_window, bg="#ecf0f1")
+        botones_frame.pack(pady=5)
+        for texto, comando in (("Actualizar", actualizar), ("Guardar JSON", guardar),
+                               ("Reiniciar", reiniciar)):
+            tk.Button(botones_frame, text=texto, command=comando, font=('Arial', 10, 'bold'),
+                     bg="#34495e", fg="white").pack(side="left", padx=5)
+        
+        actualizar()
+    
+    def abrir_ventana_productos(self):
+        """Importa o exporta el catálogo completo desde archivos CSV / JSON Lines"""
+        if not hasattr(self.db, 'get_connection'):
+            messagebox.showinfo("Productos", "La importación del catálogo se hace "
+                                "desde la terminal que corre el servicio de pedidos.")
+            return
+        
+        productos_window = tk.Toplevel(self.root)
+        productos_window.title("Gestionar Productos")
+        productos_window.geometry("500x260")
+        productos_window.configure(bg="#ecf0f1")
+        productos_window.transient(self.root)
+        
+        tk.Label(productos_window, text="Catálogo de productos", font=('Arial', 14, 'bold'),
+                bg="#ecf0f1").pack(pady=10)
+        tk.Label(productos_window, text="Columnas: codigo, nombre, categoria, precio,\n"
+                "stock, stock_minimo, activo (las tres primeras obligatorias salvo codigo)",
+                font=('Arial', 9), bg="#ecf0f1").pack()
+        
+        estado_label = tk.Label(productos_window, text="", font=('Arial', 10), bg="#ecf0f1",
+                                wraplength=460, justify="left")
+        estado_label.pack(pady=10)
+        
+        botones_frame = tk.Frame(productos_window, bg="#ecf0f1")
+        botones_frame.pack(pady=5)
+        botones = []
+        tipos = [("CSV", "*.csv"), ("JSON Lines", "*.jsonl")]
+        
+        def en_segundo_plano(trabajo, al_terminar):
+            """Corre el trabajo en un hilo y entrega el resultado al hilo de Tk"""
+            resultado = {}
+            def ejecutar():
+                try:
+                    resultado['valor'] = trabajo()
+                except Exception as e:
+                    resultado['error'] = e
+                finally:
+                    # El hilo es de una sola tarea: cerrar su conexión a la base
+                    if hasattr(self.db, 'liberar_conexion'):
+                        self.db.liberar_conexion()
+            
+            def revisar():
+                if hilo.is_alive():
+                    productos_window.after(100, revisar)
+                    return
+                for boton in botones:
+                    boton.configure(state="normal")
+                if 'error' in resultado:
+                    estado_label.configure(text="")
+                    messagebox.showerror("Error", str(resultado['error']), parent=productos_window)
+                else:
+                    al_terminar(resultado['valor'])
+            
+            for boton in botones:
+                boton.configure(state="disabled")
+            hilo = threading.Thread(target=ejecutar, name="catalogo", daemon=True)
+            hilo.start()
+            revisar()
+        
+        def importar(simular):
+            import catalogo
+            ruta = filedialog.askopenfilename(parent=productos_window, filetypes=tipos)
+            if not ruta:
+                return
+            
+            def terminar(resultado):
+                texto = (f"{resultado['filas']} filas: {resultado['insertados']} productos nuevos, "
+                         f"{resultado['actualizados']} actualizados, "
+                         f"{resultado['categorias']} categorías nuevas")
+                if simular:
+                    texto += "\n(simulación: no se aplicó ningún cambio)"
+                else:
+                    self.load_productos()
+                estado_label.configure(text=texto)
+            
+            estado_label.configure(text="Importando...")
+            en_segundo_plano(lambda: catalogo.importar(self.db, catalogo.leer(ruta), simular=simular),
+                             terminar)
+        
+        def exportar():
+            import catalogo
+            ruta = filedialog.asksaveasfilename(parent=productos_window, filetypes=tipos,
+                                                defaultextension=".csv",
+                                                initialfile="catalogo.csv")
+            if not ruta:
+                return
+            estado_label.configure(text="Exportando...")
+            en_segundo_plano(lambda: catalogo.exportar(self.db, ruta),
+                             lambda cantidad: estado_label.configure(
+                                 text=f"{cantidad} productos exportados a {ruta}"))
+        
+        for texto, comando in (("Importar", lambda: importar(False)),
+                               ("Simular importación", lambda: importar(True)),
+                               ("Exportar", exportar)):
+            boton = tk.Button(botones_frame, text=texto, command=comando,
+                              font=('Arial', 10, 'bold'), bg="#1abc9c", fg="white")
+            boton.pack(side="left", padx=5)
+            botones.append(boton)
+    
+    def load_mesas(self):
+        """Actualiza el mapa de mesas con el estado actual de la base"""
+        try:
+            # Solo se reconfiguran los botones de las mesas que cambiaron
+            self.mapa_mesas.actualizar(self.db.get_mesas())
         
         except Exception as e:
             messagebox.showerror("Error", f"Error al cargar mesas: {str(e)}")
     
+    def vigilar_cambios(self):
+        """Programa la revisión periódica del registro de cambios de mesas"""
+        if self._revision_cambios is not None:
+            self.root.after_cancel(self._revision_cambios)
+        self._revision_cambios = self.root.after(self.INTERVALO_CAMBIOS, self.revisar_cambios)
+    
+    def revisar_cambios(self):
+        """Aplica al mapa los cambios de mesas hechos desde otras terminales"""
+        self._revision_cambios = None
+        if not self.mesas_frame.winfo_exists():
+            return  # se cerró la sesión
+        
+        try:
+            self.seq_cambios, cambios = self.db.get_cambios_desde(self.seq_cambios)
+            if cambios is None:
+                # El registro ya no cubre lo que vimos: recargar todo una vez
+                self.load_mesas()
+                cambios = []
+            
+            for _, mesa_id, estado, pedido_id in cambios:
+                mesa = self.mapa_mesas.get_mesa(mesa_id)
+                if mesa is None or mesa[3] == estado:
+                    continue
+                self.actualizar_estado_mesa(mesa, estado)
+                
+                if self.mesa_actual and self.mesa_actual[0] == mesa_id:
+                    if estado == 'libre' and pedido_id == self.pedido_actual:
+                        # Otra terminal cobró o canceló el pedido que estamos viendo
+                        self.pedido_actual = None
+                        self.mesa_actual = None
+                        self.load_pedido_actual()
+                        self.mesa_info_label.configure(text="Seleccione una mesa")
+                    else:
+                        self.mesa_actual = self.mapa_mesas.get_mesa(mesa_id)
+                        self.mesa_info_label.configure(
+                            text=f"Mesa {mesa[1]} - {estado.upper()}")
+        except Exception:
+            pass  # un error transitorio no debe frenar la vigilancia
+        
+        self.vigilar_cambios()
+    
+    def actualizar_estado_mesa(self, mesa, estado):
+        """Refleja en el mapa el nuevo estado de una mesa sin recargar las demás"""
+        if mesa:
+            mesa_id, numero, capacidad, _ = mesa
+            self.mapa_mesas.actualizar_mesa((mesa_id, numero, capacidad, estado))
+    
+    def avisar_stock_bajo(self, alertas):
+        """Avisa de los productos que quedaron en o por debajo de su stock mínimo"""
+        if not alertas:
+            return
+        
+        lineas = [f"{nombre}: quedan {stock} (mínimo {minimo})"
+                  for _, nombre, stock, minimo in alertas]
+        messagebox.showwarning("Stock bajo", "\n".join(lineas))
+    
     def seleccionar_mesa(self, mesa):
         """Selecciona una mesa para trabajar"""
         try:
@@ -346,7 +652,7 @@ class POSSystem:
                 # Crear nuevo pedido si la mesa está libre
                 if estado == 'libre':
                     self.pedido_actual = self.db.crear_pedido(mesa_id, self.usuario_actual[0])
-                    self.load_mesas()  # Actualizar estado de mesas
+                    self.actualizar_estado_mesa(mesa, 'ocupada')
             
             self.load_pedido_actual()
         
@@ -355,56 +661,47 @@ class POSSystem:
     
     def load_productos(self):
         """Carga los productos según la categoría seleccionada"""
-        # Limpiar productos existentes
-        for widget in self.productos_frame.winfo_children():
-            widget.destroy()
-        
         try:
             categoria_id = self.categoria_var.get()
             categoria_id = None if categoria_id == "0" else int(categoria_id)
             
-            productos = self.db.get_productos_por_categoria(categoria_id)
-            
-            # Crear frame con scroll
-            canvas = tk.Canvas(self.productos_frame, bg="#ecf0f1")
-            scrollbar = ttk.Scrollbar(self.productos_frame, orient="vertical", command=canvas.yview)
-            scrollable_frame = tk.Frame(canvas, bg="#ecf0f1")
-            
-            scrollable_frame.bind(
-                "<Configure>",
-                lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-            )
-            
-            canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-            canvas.configure(yscrollcommand=scrollbar.set)
-            
-            # Crear botones de productos
-            cols = 3
-            for i, producto in enumerate(productos):
-                row = i // cols
-                col = i % cols
-                
-                prod_id, nombre, precio, stock, categoria = producto
-                
-                btn = tk.Button(scrollable_frame, 
-                               text=f"{nombre}\n${precio:,.0f}",
-                               command=lambda p=producto: self.agregar_producto(p),
-                               font=('Arial', 9, 'bold'),
-                               bg="#3498db", fg="white",
-                               width=15, height=4,
-                               wraplength=100)
-                btn.grid(row=row, column=col, padx=2, pady=2, sticky="ew")
-            
-            # Configurar columnas
-            for i in range(cols):
-                scrollable_frame.grid_columnconfigure(i, weight=1)
-            
-            canvas.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
+            self.grilla_productos.mostrar(self.db.get_productos_por_categoria(categoria_id))
         
         except Exception as e:
             messagebox.showerror("Error", f"Error al cargar productos: {str(e)}")
     
+    def crear_buscador(self, parent, grilla, al_vaciar, antes_de=None):
+        """Crea la caja de búsqueda de productos que alimenta una grilla"""
+        buscar_frame = tk.Frame(parent, bg="#ecf0f1")
+        buscar_frame.pack(fill="x", pady=(0,10), before=antes_de)
+        
+        tk.Label(buscar_frame, text="Buscar:", font=('Arial', 11, 'bold'),
+                bg="#ecf0f1").pack(side="left", padx=5)
+        
+        busqueda_var = tk.StringVar()
+        buscar_entry = tk.Entry(buscar_frame, textvariable=busqueda_var, font=('Arial', 11))
+        buscar_entry.pack(side="left", fill="x", expand=True, padx=5)
+        
+        def buscar(*args):
+            texto = busqueda_var.get().strip()
+            # Sin texto se vuelve a la categoría seleccionada
+            if not texto:
+                al_vaciar()
+                return
+            try:
+                grilla.mostrar(self.db.buscar_productos(texto))
+            except Exception as e:
+                messagebox.showerror("Error", f"Error al buscar productos: {str(e)}")
+        
+        busqueda_var.trace_add("write", buscar)
+        buscar_entry.bind('<Escape>', lambda e: busqueda_var.set(""))
+        
+        tk.Button(buscar_frame, text="✕", command=lambda: busqueda_var.set(""),
+                 font=('Arial', 8, 'bold'), bg="#95a5a6", fg="white",
+                 width=3).pack(side="left", padx=5)
+        
+        return busqueda_var
+    
     def agregar_producto(self, producto):
         """Agrega un producto al pedido actual"""
         if not self.pedido_actual:
@@ -427,7 +724,7 @@ class POSSystem:
         tk.Label(cantidad_window, text=f"Producto: {nombre}",
                 font=('Arial', 12, 'bold'), bg="#ecf0f1").pack(pady=10)
         
-        tk.Label(cantidad_window, text=f"Precio: ${precio:,.0f}",
+        tk.Label(cantidad_window, text=f"Precio: {formatear(precio)}",
                 font=('Arial', 11), bg="#ecf0f1").pack(pady=5)
         
         tk.Label(cantidad_window, text="Cantidad:",
@@ -446,8 +743,14 @@ class POSSystem:
                 if cantidad <= 0:
                     raise ValueError("La cantidad debe ser mayor a cero")
                 
-                self.db.agregar_producto_pedido(self.pedido_actual, prod_id, cantidad)
-                self.load_pedido_actual()
+                pedido_id = self.pedido_actual
+                
+                def al_aplicar(linea):
+                    # El mozo pudo haber pasado a otra mesa mientras se aplicaba
+                    if self.pedido_actual == pedido_id:
+                        self.panel_pedido.aplicar_linea((linea[0], nombre) + tuple(linea[1:]))
+                
+                self.agregar_al_pedido(pedido_id, prod_id, cantidad, al_aplicar)
                 cantidad_window.destroy()
                 
             except ValueError as e:
@@ -473,83 +776,87 @@ class POSSystem:
         cantidad_window.bind('<Return>', lambda e: confirmar())
         cantidad_window.bind('<Escape>', lambda e: cancelar())
     
+    def agregar_al_pedido(self, pedido_id, producto_id, cantidad, al_aplicar):
+        """Agrega un producto al pedido; al_aplicar recibe la línea cuando ya está en la base"""
+        if self.journal is None:
+            al_aplicar(self.db.agregar_producto_pedido(pedido_id, producto_id, cantidad))
+            return
+        self.journal.agregar(pedido_id, producto_id, cantidad, al_aplicar, self.avisar_edicion_fallida)
+        self.vigilar_journal()
+    
+    def quitar_del_pedido(self, pedido_id, detalle_id, al_aplicar):
+        """Quita una línea del pedido; al_aplicar se llama cuando ya se quitó de la base"""
+        if self.journal is None:
+            al_aplicar(self.db.eliminar_detalle_pedido(detalle_id))
+            return
+        self.journal.eliminar(pedido_id, detalle_id, al_aplicar, self.avisar_edicion_fallida)
+        self.vigilar_journal()
+    
+    def vigilar_journal(self):
+        """Programa la entrega de las ediciones que el diario ya aplicó"""
+        if self._revision_journal is None:
+            self._revision_journal = self.root.after(self.INTERVALO_JOURNAL, self.revisar_journal)
+    
+    def revisar_journal(self):
+        """Refleja en pantalla las ediciones aplicadas; sigue revisando mientras haya pendientes"""
+        self._revision_journal = None
+        if self.journal.entregar():
+            self.vigilar_journal()
+    
+    def esperar_journal(self, pedido_id, accion, reintentar):
+        """Si el pedido tiene ediciones sin aplicar, reintenta la acción más tarde y devuelve True
+        
+        Hay como mucho un reintento programado por pedido y acción: los clics
+        repetidos mientras se espera no abren más de una ventana.
+        """
+        if self.journal is None or not self.journal.pendientes(pedido_id):
+            return False
+        
+        clave = (pedido_id, accion)
+        if clave not in self._reintentos_journal:
+            self._reintentos_journal.add(clave)
+            
+            def reintentar_una_vez():
+                self._reintentos_journal.discard(clave)
+                reintentar()
+            
+            self.root.after(self.INTERVALO_JOURNAL, reintentar_una_vez)
+        return True
+    
+    def avisar_edicion_fallida(self, error):
+        """Informa una edición del pedido que no se pudo aplicar en la base"""
+        messagebox.showerror("Error", f"No se pudo modificar el pedido: {str(error)}")
+    
     def load_pedido_actual(self):
         """Carga los detalles del pedido actual"""
-        # Limpiar lista actual
-        for widget in self.pedido_listbox_frame.winfo_children():
-            widget.destroy()
-        
         if not self.pedido_actual:
-            self.total_label.configure(text="Total: $0.00")
-            self.finalizar_btn.configure(state="disabled")
-            self.cancelar_btn.configure(state="disabled")
+            self.panel_pedido.limpiar()
             return
         
         try:
-            detalles = self.db.get_detalles_pedido(self.pedido_actual)
-            
-            if not detalles:
-                self.total_label.configure(text="Total: $0.00")
-                self.finalizar_btn.configure(state="disabled")
-                self.cancelar_btn.configure(state="disabled")
-                return
-            
-            # Crear lista con scroll
-            canvas = tk.Canvas(self.pedido_listbox_frame, bg="white")
-            scrollbar = ttk.Scrollbar(self.pedido_listbox_frame, orient="vertical", command=canvas.yview)
-            scrollable_frame = tk.Frame(canvas, bg="white")
-            
-            scrollable_frame.bind(
-                "<Configure>",
-                lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-            )
-            
-            canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-            canvas.configure(yscrollcommand=scrollbar.set)
-            
-            total = 0
-            for detalle in detalles:
-                detalle_id, nombre, cantidad, precio_unit, subtotal = detalle
-                total += subtotal
-                
-                # Frame para cada item
-                item_frame = tk.Frame(scrollable_frame, bg="white", relief="solid", bd=1)
-                item_frame.pack(fill="x", padx=2, pady=1)
-                
-                # Información del producto
-                info_frame = tk.Frame(item_frame, bg="white")
-                info_frame.pack(side="left", fill="both", expand=True, padx=5, pady=5)
-                
-                tk.Label(info_frame, text=nombre, font=('Arial', 10, 'bold'),
-                        bg="white", anchor="w").pack(fill="x")
-                
-                tk.Label(info_frame, text=f"{cantidad} x ${precio_unit:,.0f} = ${subtotal:,.0f}",
-                        font=('Arial', 9), bg="white", fg="#666", anchor="w").pack(fill="x")
-                
-                # Botón eliminar
-                del_btn = tk.Button(item_frame, text="✕", 
-                                   command=lambda d_id=detalle_id: self.eliminar_detalle(d_id),
-                                   font=('Arial', 8, 'bold'), bg="#e74c3c", fg="white",
-                                   width=3)
-                del_btn.pack(side="right", padx=5, pady=5)
-            
-            canvas.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
-            
-            # Actualizar total
-            self.total_label.configure(text=f"Total: ${total:,.0f}")
-            self.finalizar_btn.configure(state="normal" if detalles else "disabled")
-            self.cancelar_btn.configure(state="normal" if detalles else "disabled")
+            # Solo se crean, actualizan o quitan las filas que difieren
+            self.panel_pedido.cargar(self.db.get_detalles_pedido(self.pedido_actual))
         
         except Exception as e:
             messagebox.showerror("Error", f"Error al cargar pedido: {str(e)}")
     
+    def actualizar_total_pedido(self, total, lineas):
+        """Actualiza el total y los botones del pedido actual"""
+        self.total_label.configure(text=f"Total: {formatear(total if lineas else 0)}")
+        self.finalizar_btn.configure(state="normal" if lineas else "disabled")
+        self.cancelar_btn.configure(state="normal" if lineas else "disabled")
+    
     def eliminar_detalle(self, detalle_id):
         """Elimina un detalle del pedido"""
         if messagebox.askyesno("Confirmar", "¿Eliminar este producto del pedido?"):
+            pedido_id = self.pedido_actual
+            
+            def al_aplicar(_):
+                if self.pedido_actual == pedido_id:
+                    self.panel_pedido.quitar_linea(detalle_id)
+            
             try:
-                self.db.eliminar_detalle_pedido(detalle_id)
-                self.load_pedido_actual()
+                self.quitar_del_pedido(pedido_id, detalle_id, al_aplicar)
             except Exception as e:
                 messagebox.showerror("Error", f"Error al eliminar producto: {str(e)}")
     
@@ -557,17 +864,20 @@ class POSSystem:
         """Cancela el pedido actual"""
         if not self.pedido_actual:
             return
+        if self.esperar_journal(self.pedido_actual, 'cancelar', self.cancelar_pedido_actual):
+            return
         
         if messagebox.askyesno("Confirmar", "¿Está seguro de cancelar el pedido actual?\nEsto liberará la mesa y eliminará todos los productos."):
             try:
                 self.db.cancelar_pedido(self.pedido_actual)
+                mesa = self.mesa_actual
                 
                 # Limpiar pedido actual
                 self.pedido_actual = None
                 self.mesa_actual = None
                 
                 # Actualizar interfaz
-                self.load_mesas()
+                self.actualizar_estado_mesa(mesa, 'libre')
                 self.load_pedido_actual()
                 self.mesa_info_label.configure(text="Seleccione una mesa")
                 
@@ -576,153 +886,49 @@ class POSSystem:
             except Exception as e:
                 messagebox.showerror("Error", f"Error al cancelar pedido: {str(e)}")
     
+    def precargar_facturas(self):
+        """Importa el módulo de facturas y compila la plantilla en un hilo aparte"""
+        def precargar():
+            try:
+                import factura
+                factura.get_plantilla()
+            except Exception:
+                pass  # el error se informa al generar la primera factura
+        
+        threading.Thread(target=precargar, name="precarga-facturas", daemon=True).start()
+    
+    def get_cola_facturas(self):
+        """Obtiene la cola de facturas, creándola la primera vez"""
+        if self.facturas is None:
+            from factura import ColaFacturas
+            self.facturas = ColaFacturas(self.db, self.root)
+        return self.facturas
+    
     def generar_factura_pdf(self, pedido_id):
-        """Genera una factura en PDF del pedido"""
-        try:
-            pedido_completo = self.db.get_pedido_completo(pedido_id)
-            if not pedido_completo:
-                messagebox.showerror("Error", "No se pudo obtener la información del pedido")
-                return
-            
-            # Crear directorio de facturas si no existe
-            if not os.path.exists("facturas"):
-                os.makedirs("facturas")
-            
-            pedido_info = pedido_completo['pedido']
-            filename = f"facturas/factura_{pedido_info[0]:06d}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            
-            # Crear documento PDF
-            doc = SimpleDocTemplate(filename, pagesize=letter)
-            story = []
-            
-            # Estilos
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=18,
-                spaceAfter=30,
-                alignment=TA_CENTER
-            )
-            
-            header_style = ParagraphStyle(
-                'CustomHeader',
-                parent=styles['Normal'],
-                fontSize=12,
-                spaceAfter=20,
-                alignment=TA_CENTER
-            )
-            
-            normal_style = styles['Normal']
-            
-            # Encabezado
-            story.append(Paragraph("FACTURA", title_style))
-            story.append(Paragraph("Bar & Restaurant", header_style))
-            story.append(Paragraph("Dirección: Calle Principal 123<br/>Tel: (341) 123-4567", header_style))
-            story.append(Spacer(1, 20))
-            
-            # Información del pedido
-            fecha_formateada = datetime.strptime(pedido_info[1], "%Y-%m-%d %H:%M:%S").strftime("%d/%m/%Y %H:%M")
-            
-            info_data = [
-                ['Factura N°:', f"{pedido_info[0]:06d}", 'Fecha:', fecha_formateada],
-                ['Atendido por:', pedido_info[6], 'Método de Pago:', pedido_info[3].title()],
-                ['Mesa N°:' if pedido_info[5] else 'Tipo:', 
-                 pedido_info[5] if pedido_info[5] else 'Venta Directa', '', '']
-            ]
-            
-            info_table = Table(info_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
-            info_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 0),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-            ]))
-            
-            story.append(info_table)
-            story.append(Spacer(1, 30))
-            
-            # Tabla de productos
-            productos_data = [['Producto', 'Cantidad', 'Precio Unit.', 'Subtotal']]
-            
-            total_general = 0
-            for detalle in pedido_completo['detalles']:
-                cantidad, precio_unitario, subtotal, nombre = detalle
-                total_general += subtotal
-                productos_data.append([
-                    nombre,
-                    str(cantidad),
-                    f"${precio_unitario:,.0f}",
-                    f"${subtotal:,.0f}"
-                ])
-            
-            # Agregar línea de total
-            productos_data.append(['', '', 'TOTAL:', f"${total_general:,.0f}"])
-            
-            productos_table = Table(productos_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1.5*inch])
-            productos_table.setStyle(TableStyle([
-                # Encabezados
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                
-                # Contenido
-                ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -2), 10),
-                ('ALIGN', (1, 1), (-1, -2), 'CENTER'),
-                ('ALIGN', (0, 1), (0, -2), 'LEFT'),
-                
-                # Línea de total
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, -1), (-1, -1), 12),
-                ('ALIGN', (2, -1), (-1, -1), 'RIGHT'),
-                ('BACKGROUND', (2, -1), (-1, -1), colors.lightgrey),
-                
-                # Bordes
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            
-            story.append(productos_table)
-            story.append(Spacer(1, 30))
-            
-            # Pie de página
-            story.append(Paragraph("¡Gracias por su visita!", header_style))
-            
-            # Generar PDF
-            doc.build(story)
-            
-            messagebox.showinfo("Éxito", f"Factura PDF generada: {filename}")
-            
+        """Encola la generación de la factura PDF del pedido"""
+        def al_terminar(filename):
             # Abrir el PDF automáticamente (opcional)
             try:
-                import subprocess
-                import sys
-                if sys.platform.startswith('win'):
-                    os.startfile(filename)
-                elif sys.platform.startswith('darwin'):
-                    subprocess.call(['open', filename])
-                else:
-                    subprocess.call(['xdg-open', filename])
-            except:
+                from factura import abrir_archivo
+                abrir_archivo(filename)
+            except Exception:
                 pass  # Si no puede abrir automáticamente, no importa
-                
-        except ImportError:
-            messagebox.showerror("Error", 
-                               "ReportLab no está instalado.\n" + 
-                               "Instale con: pip install reportlab")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al generar factura PDF: {str(e)}")
+        
+        def al_fallar(error):
+            messagebox.showerror("Error", f"Error al generar factura PDF: {str(error)}")
+        
+        # La factura se arma en segundo plano: el cajero puede seguir vendiendo
+        try:
+            self.get_cola_facturas().encolar(pedido_id, al_terminar, al_fallar)
+        except ImportError as e:
+            al_fallar(e)
     
     def finalizar_pedido(self):
         """Finaliza el pedido actual"""
         if not self.pedido_actual:
             return
+        if self.esperar_journal(self.pedido_actual, 'finalizar', self.finalizar_pedido):
+            return
         
         try:
             # Verificar que hay productos en el pedido
@@ -748,7 +954,7 @@ class POSSystem:
             # Mostrar total
             total = sum(d[4] for d in detalles)
             
-            tk.Label(pago_window, text=f"Total a pagar: ${total:,.0f}",
+            tk.Label(pago_window, text=f"Total a pagar: {formatear(total)}",
                     font=('Arial', 14, 'bold'), bg="#ecf0f1", fg="#e74c3c").pack(pady=10)
             
             tk.Label(pago_window, text="Seleccionar método de pago:",
@@ -772,14 +978,15 @@ class POSSystem:
                     metodo = pago_var.get()
                     pedido_finalizado = self.pedido_actual  # Guardar referencia antes de limpiar
                     
-                    self.db.finalizar_pedido(self.pedido_actual, metodo)
+                    alertas = self.db.finalizar_pedido(self.pedido_actual, metodo)
+                    mesa = self.mesa_actual
                     
                     # Limpiar pedido actual
                     self.pedido_actual = None
                     self.mesa_actual = None
                     
                     # Actualizar interfaz
-                    self.load_mesas()
+                    self.actualizar_estado_mesa(mesa, 'libre')
                     self.load_pedido_actual()
                     self.mesa_info_label.configure(text="Seleccione una mesa")
                     
@@ -790,9 +997,10 @@ class POSSystem:
                     
                     messagebox.showinfo("Éxito", 
                                        f"Pedido finalizado correctamente\n"
-                                       f"Total: ${total:,.0f}\n"
+                                       f"Total: {formatear(total)}\n"
                                        f"Pago: {metodo.title()}\n"
                                        f"Factura generada automáticamente")
+                    self.avisar_stock_bajo(alertas)
                 
                 except Exception as e:
                     messagebox.showerror("Error", f"Error al finalizar pedido: {str(e)}")
@@ -883,7 +1091,7 @@ class POSSystem:
         for cat_id, cat_nombre in categorias:
             btn = tk.Radiobutton(cat_frame, text=cat_nombre,
                                variable=categoria_directa_var, value=cat_id,
-                               command=lambda: self.load_productos_directa(productos_directa_frame, categoria_directa_var, pedido_id, actualizar_pedido_directa),
+                               command=lambda: self.load_productos_directa(grilla_directa, categoria_directa_var),
                                bg="#ecf0f1", font=('Arial', 10))
             btn.pack(side="left", padx=5)
         
@@ -892,6 +1100,12 @@ class POSSystem:
         # Frame de productos
         productos_directa_frame = tk.Frame(left_frame, bg="#ecf0f1")
         productos_directa_frame.pack(expand=True, fill="both")
+        grilla_directa = GrillaProductos(
+            productos_directa_frame,
+            lambda p: self.agregar_producto_directa(p, pedido_id, panel_directa.aplicar_linea))
+        self.crear_buscador(left_frame, grilla_directa,
+                            lambda: self.load_productos_directa(grilla_directa, categoria_directa_var),
+                            antes_de=productos_directa_frame)
         
         # Panel derecho - Pedido
         right_frame = tk.Frame(main_frame, bg="#ecf0f1", width=350)
@@ -910,7 +1124,7 @@ class POSSystem:
         total_directa_frame.pack(fill="x", padx=10, pady=10)
         total_directa_frame.pack_propagate(False)
         
-        total_directa_label = tk.Label(total_directa_frame, text="Total: $0.00",
+        total_directa_label = tk.Label(total_directa_frame, text=f"Total: {formatear(0)}",
                                      font=('Arial', 14, 'bold'), bg="#ecf0f1")
         total_directa_label.pack()
         
@@ -926,82 +1140,34 @@ class POSSystem:
         cancelar_directa_btn.pack(fill="x")
         
         # Funciones auxiliares para la venta directa
-        def actualizar_pedido_directa():
-            # Limpiar lista actual
-            for widget in pedido_directa_frame.winfo_children():
-                widget.destroy()
-            
-            try:
-                detalles = self.db.get_detalles_pedido(pedido_id)
-                
-                if not detalles:
-                    total_directa_label.configure(text="Total: $0.00")
-                    finalizar_directa_btn.configure(state="disabled")
-                    return
-                
-                # Crear lista con scroll
-                canvas = tk.Canvas(pedido_directa_frame, bg="white")
-                scrollbar = ttk.Scrollbar(pedido_directa_frame, orient="vertical", command=canvas.yview)
-                scrollable_frame = tk.Frame(canvas, bg="white")
-                
-                scrollable_frame.bind(
-                    "<Configure>",
-                    lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-                )
-                
-                canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-                canvas.configure(yscrollcommand=scrollbar.set)
-                
-                total = 0
-                for detalle in detalles:
-                    detalle_id, nombre, cantidad, precio_unit, subtotal = detalle
-                    total += subtotal
-                    
-                    # Frame para cada item
-                    item_frame = tk.Frame(scrollable_frame, bg="white", relief="solid", bd=1)
-                    item_frame.pack(fill="x", padx=2, pady=1)
-                    
-                    # Información del producto
-                    info_frame = tk.Frame(item_frame, bg="white")
-                    info_frame.pack(side="left", fill="both", expand=True, padx=5, pady=5)
-                    
-                    tk.Label(info_frame, text=nombre, font=('Arial', 10, 'bold'),
-                            bg="white", anchor="w").pack(fill="x")
-                    
-                    tk.Label(info_frame, text=f"{cantidad} x ${precio_unit:,.0f} = ${subtotal:,.0f}",
-                            font=('Arial', 9), bg="white", fg="#666", anchor="w").pack(fill="x")
-                    
-                    # Botón eliminar
-                    del_btn = tk.Button(item_frame, text="✕", 
-                                       command=lambda d_id=detalle_id: eliminar_detalle_directa(d_id),
-                                       font=('Arial', 8, 'bold'), bg="#e74c3c", fg="white",
-                                       width=3)
-                    del_btn.pack(side="right", padx=5, pady=5)
-                
-                canvas.pack(side="left", fill="both", expand=True)
-                scrollbar.pack(side="right", fill="y")
-                
-                # Actualizar total
-                total_directa_label.configure(text=f"Total: ${total:,.0f}")
-                finalizar_directa_btn.configure(state="normal" if detalles else "disabled")
-            
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al actualizar pedido: {str(e)}")
+        def actualizar_total_directa(total, lineas):
+            total_directa_label.configure(text=f"Total: {formatear(total if lineas else 0)}")
+            finalizar_directa_btn.configure(state="normal" if lineas else "disabled")
         
         def eliminar_detalle_directa(detalle_id):
             if messagebox.askyesno("Confirmar", "¿Eliminar este producto?"):
                 try:
-                    self.db.eliminar_detalle_pedido(detalle_id)
-                    actualizar_pedido_directa()
+                    self.quitar_del_pedido(pedido_id, detalle_id,
+                                           lambda _: panel_directa.quitar_linea(detalle_id))
                 except Exception as e:
                     messagebox.showerror("Error", f"Error al eliminar producto: {str(e)}")
         
+        panel_directa = PanelPedido(pedido_directa_frame, eliminar_detalle_directa,
+                                    actualizar_total_directa)
+        
         # Cargar productos iniciales
-        self.load_productos_directa(productos_directa_frame, categoria_directa_var, pedido_id, actualizar_pedido_directa)
-        actualizar_pedido_directa()
+        self.load_productos_directa(grilla_directa, categoria_directa_var)
+        try:
+            panel_directa.cargar(self.db.get_detalles_pedido(pedido_id))
+        except Exception as e:
+            messagebox.showerror("Error", f"Error al actualizar pedido: {str(e)}")
     
     def confirmar_cierre_venta_directa(self, pedido_id):
         """Confirma si se debe cerrar la ventana de venta directa"""
+        if self.esperar_journal(pedido_id, 'cerrar',
+                                lambda: self.confirmar_cierre_venta_directa(pedido_id)):
+            return
+        
         try:
             # Verificar si hay productos en el pedido
             detalles = self.db.get_detalles_pedido(pedido_id)
@@ -1028,54 +1194,13 @@ class POSSystem:
         except Exception as e:
             messagebox.showerror("Error", f"Error al cerrar ventana: {str(e)}")
     
-    def load_productos_directa(self, productos_frame, categoria_var, pedido_id, callback=None):
+    def load_productos_directa(self, grilla, categoria_var):
         """Carga productos para venta directa"""
-        # Limpiar productos existentes
-        for widget in productos_frame.winfo_children():
-            widget.destroy()
-        
         try:
             categoria_id = categoria_var.get()
             categoria_id = None if categoria_id == "0" else int(categoria_id)
             
-            productos = self.db.get_productos_por_categoria(categoria_id)
-            
-            # Crear frame con scroll
-            canvas = tk.Canvas(productos_frame, bg="#ecf0f1")
-            scrollbar = ttk.Scrollbar(productos_frame, orient="vertical", command=canvas.yview)
-            scrollable_frame = tk.Frame(canvas, bg="#ecf0f1")
-            
-            scrollable_frame.bind(
-                "<Configure>",
-                lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-            )
-            
-            canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-            canvas.configure(yscrollcommand=scrollbar.set)
-            
-            # Crear botones de productos
-            cols = 3
-            for i, producto in enumerate(productos):
-                row = i // cols
-                col = i % cols
-                
-                prod_id, nombre, precio, stock, categoria = producto
-                
-                btn = tk.Button(scrollable_frame, 
-                               text=f"{nombre}\n${precio:,.0f}",
-                               command=lambda p=producto: self.agregar_producto_directa(p, pedido_id, callback),
-                               font=('Arial', 9, 'bold'),
-                               bg="#3498db", fg="white",
-                               width=15, height=4,
-                               wraplength=100)
-                btn.grid(row=row, column=col, padx=2, pady=2, sticky="ew")
-            
-            # Configurar columnas
-            for i in range(cols):
-                scrollable_frame.grid_columnconfigure(i, weight=1)
-            
-            canvas.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
+            grilla.mostrar(self.db.get_productos_por_categoria(categoria_id))
         
         except Exception as e:
             messagebox.showerror("Error", f"Error al cargar productos: {str(e)}")
@@ -1101,7 +1226,7 @@ class POSSystem:
         tk.Label(cantidad_window, text=f"Producto: {nombre}",
                 font=('Arial', 12, 'bold'), bg="#ecf0f1").pack(pady=10)
         
-        tk.Label(cantidad_window, text=f"Precio: ${precio:,.0f}",
+        tk.Label(cantidad_window, text=f"Precio: {formatear(precio)}",
                 font=('Arial', 11), bg="#ecf0f1").pack(pady=5)
         
         tk.Label(cantidad_window, text="Cantidad:",
@@ -1120,9 +1245,14 @@ class POSSystem:
                 if cantidad <= 0:
                     raise ValueError("La cantidad debe ser mayor a cero")
                 
-                self.db.agregar_producto_pedido(pedido_id, prod_id, cantidad)
-                if callback:
-                    callback()
+                ventana = self.venta_directa_window
+                
+                def al_aplicar(linea):
+                    # Solo si la venta sigue abierta en pantalla
+                    if callback and self.venta_directa_window is ventana:
+                        callback((linea[0], nombre) + tuple(linea[1:]))
+                
+                self.agregar_al_pedido(pedido_id, prod_id, cantidad, al_aplicar)
                 cantidad_window.destroy()
                 
             except ValueError as e:
@@ -1149,6 +1279,9 @@ class POSSystem:
     
     def cancelar_venta_directa(self, pedido_id, confirmar=True):
         """Cancela la venta directa"""
+        if self.esperar_journal(pedido_id, 'cancelar',
+                                lambda: self.cancelar_venta_directa(pedido_id, confirmar)):
+            return
         if confirmar:
             if not messagebox.askyesno("Confirmar", "¿Está seguro de cancelar esta venta?\nSe perderán todos los productos agregados."):
                 return
@@ -1165,6 +1298,10 @@ class POSSystem:
     
     def finalizar_venta_directa(self, pedido_id, total_label, cerrar_ventana=False):
         """Finaliza la venta directa"""
+        if self.esperar_journal(pedido_id, 'finalizar', lambda: self.finalizar_venta_directa(
+                pedido_id, total_label, cerrar_ventana)):
+            return
+        
         try:
             detalles = self.db.get_detalles_pedido(pedido_id)
             if not detalles:
@@ -1190,7 +1327,7 @@ class POSSystem:
             tk.Label(pago_window, text="FINALIZAR VENTA", 
                     font=('Arial', 16, 'bold'), bg="#ecf0f1").pack(pady=20)
             
-            tk.Label(pago_window, text=f"Total: ${total:,.0f}",
+            tk.Label(pago_window, text=f"Total: {formatear(total)}",
                     font=('Arial', 14, 'bold'), bg="#ecf0f1", fg="#e74c3c").pack(pady=10)
             
             tk.Label(pago_window, text="Método de pago:",
@@ -1211,7 +1348,7 @@ class POSSystem:
             def confirmar_pago():
                 try:
                     metodo = pago_var.get()
-                    self.db.finalizar_pedido(pedido_id, metodo)
+                    alertas = self.db.finalizar_pedido(pedido_id, metodo)
                     
                     pago_window.destroy()
                     if self.venta_directa_window:
@@ -1223,9 +1360,10 @@ class POSSystem:
                     
                     messagebox.showinfo("Éxito", 
                                        f"Venta finalizada correctamente\n"
-                                       f"Total: ${total:,.0f}\n"
+                                       f"Total: {formatear(total)}\n"
                                        f"Pago: {metodo.title()}\n"
                                        f"Factura generada automáticamente")
+                    self.avisar_stock_bajo(alertas)
                 
                 except Exception as e:
                     messagebox.showerror("Error", f"Error al finalizar venta: {str(e)}")
@@ -1277,6 +1415,8 @@ class POSSystem:
 def main():
     root = tk.Tk()
     
+    app = None
+    
     # Configurar para que se cierre correctamente
     def on_closing():
         if messagebox.askokcancel("Salir", "¿Está seguro de que desea salir del sistema?"):
@@ -1290,6 +1430,16 @@ def main():
     except Exception as e:
         messagebox.showerror("Error Fatal", f"Error al inicializar el sistema: {str(e)}")
         root.destroy()
+    finally:
+        # Terminar las facturas pendientes, aplicar el diario, detener las comandas y cerrar la base de datos
+        if app:
+            if app.facturas:
+                app.facturas.cerrar()
+            if app.journal:
+                app.journal.cerrar()
+            if app.comandas:
+                app.comandas.detener()
+            app.db.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,307 @@
+# migraciones.py - Migraciones versionadas del esquema de la base de datos
+#
+# La versión del esquema se guarda en PRAGMA user_version. Cada migración se
+# aplica una sola vez, en orden, dentro de su propia transacción, de modo que
+# una base existente (bar_pos.db) se actualiza en el lugar al iniciar.
+import sqlite3
+
+import resumenes
+
+def _migracion_1(cursor):
+    """Índices para los accesos frecuentes de pedidos y detalles"""
+    # Unificar líneas duplicadas antes de crear la clave única (pedido, producto)
+    cursor.execute('''
+        UPDATE pedido_detalles SET
+            cantidad = (SELECT SUM(d.cantidad) FROM pedido_detalles d
+                        WHERE d.pedido_id = pedido_detalles.pedido_id
+                          AND d.producto_id = pedido_detalles.producto_id),
+            subtotal = (SELECT SUM(d.subtotal) FROM pedido_detalles d
+                        WHERE d.pedido_id = pedido_detalles.pedido_id
+                          AND d.producto_id = pedido_detalles.producto_id)
+        WHERE id IN (
+            SELECT MIN(id) FROM pedido_detalles
+            GROUP BY pedido_id, producto_id HAVING COUNT(*) > 1
+        )
+    ''')
+    cursor.execute('''
+        DELETE FROM pedido_detalles WHERE id NOT IN (
+            SELECT MIN(id) FROM pedido_detalles GROUP BY pedido_id, producto_id
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pedido_detalles_pedido_producto
+        ON pedido_detalles (pedido_id, producto_id)
+    ''')
+    
+    # get_pedido_activo_mesa: filtra por mesa y estado, ordena por fecha y lee el total
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pedidos_mesa_estado
+        ON pedidos (mesa_id, estado, fecha_hora, total)
+    ''')
+    
+    # Reportes por rango de fechas sobre pedidos finalizados
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pedidos_estado_fecha
+        ON pedidos (estado, fecha_hora)
+    ''')
+
+def _migracion_2(cursor):
+    """Versión del catálogo para invalidar cachés entre procesos"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalogo_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO catalogo_version (id, version) VALUES (1, 0)")
+    
+    # Cualquier cambio del menú incrementa la versión. El stock queda afuera a
+    # propósito: cambia con cada venta y no debe invalidar el catálogo.
+    disparadores = {
+        "categorias_ins": "AFTER INSERT ON categorias",
+        "categorias_upd": "AFTER UPDATE ON categorias",
+        "categorias_del": "AFTER DELETE ON categorias",
+        "productos_ins": "AFTER INSERT ON productos",
+        "productos_upd": "AFTER UPDATE OF nombre, precio, categoria_id, activo ON productos",
+        "productos_del": "AFTER DELETE ON productos",
+    }
+    for nombre, evento in disparadores.items():
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_catalogo_{nombre} {evento}
+            BEGIN
+                UPDATE catalogo_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+def _migracion_3(cursor):
+    """Índice de texto completo (FTS5) sobre el nombre de los productos"""
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+                nombre,
+                content='productos', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='1 2 3'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite compilado sin FTS5: la búsqueda usa LIKE sobre productos
+        return
+    
+    # Mantener el índice sincronizado con cada escritura de productos
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_productos_fts_ins AFTER INSERT ON productos
+        BEGIN
+            INSERT INTO productos_fts (rowid, nombre) VALUES (new.id, new.nombre);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_productos_fts_del AFTER DELETE ON productos
+        BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, nombre) VALUES ('delete', old.id, old.nombre);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_productos_fts_upd AFTER UPDATE OF nombre ON productos
+        BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, nombre) VALUES ('delete', old.id, old.nombre);
+            INSERT INTO productos_fts (rowid, nombre) VALUES (new.id, new.nombre);
+        END
+    ''')
+    cursor.execute("INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')")
+
+def _migracion_4(cursor):
+    """Índice cubriente para los reportes de pedidos por rango de fechas"""
+    # Reemplaza a idx_pedidos_estado_fecha: mismo prefijo, más las columnas
+    # que agregan los reportes, para no leer la tabla pedidos
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pedidos_reportes
+        ON pedidos (estado, fecha_hora, usuario_id, metodo_pago, total)
+    ''')
+    cursor.execute("DROP INDEX IF EXISTS idx_pedidos_estado_fecha")
+
+def _migracion_5(cursor):
+    """Tablas de resumen de ventas, pobladas desde los datos existentes"""
+    resumenes.crear_tablas(cursor)
+    # Todavía no hay histórico: alcanza con los pedidos vivos
+    resumenes.reconstruir(cursor, resumenes.VIVAS)
+
+def _migracion_6(cursor):
+    """Stock mínimo por producto e índice parcial de productos con stock bajo"""
+    cursor.execute("ALTER TABLE productos ADD COLUMN stock_minimo INTEGER DEFAULT 5")
+    # Solo contiene los productos en alerta: consultarlos no recorre el catálogo
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_productos_stock_bajo
+        ON productos (id) WHERE stock <= stock_minimo
+    ''')
+
+def _migracion_7(cursor):
+    """Registro de cambios de estado de las mesas para las demás terminales"""
+    # seq crece siempre (AUTOINCREMENT no reutiliza valores aunque se purgue)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cambios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            mesa_id INTEGER NOT NULL,
+            estado TEXT NOT NULL,
+            pedido_id INTEGER,
+            fecha_hora TEXT NOT NULL,
+            FOREIGN KEY (mesa_id) REFERENCES mesas (id)
+        )
+    ''')
+
+def _migracion_8(cursor):
+    """Un solo pedido abierto por mesa, garantizado por un índice único parcial"""
+    # Cancelar los pedidos abiertos duplicados de una mesa, conservando el más antiguo
+    cursor.execute('''
+        SELECT id FROM pedidos
+        WHERE estado = 'abierto' AND mesa_id IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id) FROM pedidos
+              WHERE estado = 'abierto' AND mesa_id IS NOT NULL
+              GROUP BY mesa_id
+          )
+    ''')
+    for (pedido_id,) in cursor.fetchall():
+        cursor.execute("UPDATE pedidos SET estado = 'cancelado' WHERE id = ?", (pedido_id,))
+        resumenes.acumular_cancelado(cursor, pedido_id)
+    
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pedidos_mesa_abierto
+        ON pedidos (mesa_id) WHERE estado = 'abierto'
+    ''')
+
+def _migracion_9(cursor):
+    """Código de producto para la importación masiva del catálogo"""
+    cursor.execute("ALTER TABLE productos ADD COLUMN codigo TEXT")
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_productos_codigo
+        ON productos (codigo) WHERE codigo IS NOT NULL
+    ''')
+    # Productos sin código: la importación los busca por nombre
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_productos_nombre
+        ON productos (nombre)
+    ''')
+
+# Columnas de importes que pasan de pesos a centavos (ver moneda.py)
+COLUMNAS_IMPORTES = [
+    ("productos", ["precio"]),
+    ("pedidos", ["total"]),
+    ("pedido_detalles", ["precio_unitario", "subtotal"]),
+    ("resumen_ventas_producto", ["total"]),
+    ("resumen_ventas_mozo", ["total", "total_cancelado"]),
+]
+
+def a_centavos(cursor, tablas):
+    """Multiplica por 100 los importes de las tablas indicadas, en el lugar"""
+    for tabla, columnas in tablas:
+        asignaciones = ", ".join(f"{c} = CAST(ROUND({c} * 100) AS INTEGER)" for c in columnas)
+        cursor.execute(f"UPDATE {tabla} SET {asignaciones}")
+
+def _migracion_10(cursor):
+    """Importes en centavos enteros"""
+    # La base histórica no está adjunta durante las migraciones: se convierte
+    # al adjuntarla (ver archivo.adjuntar)
+    a_centavos(cursor, COLUMNAS_IMPORTES)
+
+def _migracion_11(cursor):
+    """Estación de cada categoría y bandeja de salida de comandas"""
+    cursor.execute('''
+        ALTER TABLE categorias ADD COLUMN estacion TEXT NOT NULL DEFAULT 'cocina'
+        CHECK (estacion IN ('barra', 'cocina'))
+    ''')
+    cursor.execute("UPDATE categorias SET estacion = 'barra' WHERE nombre = 'Bebidas'")
+    
+    # Una fila por producto cargado; comandas.py las agrupa en tickets por estación.
+    # despachador/vence reservan la fila mientras se imprime; enviada la cierra.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS comandas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pedido_id INTEGER NOT NULL,
+            producto_id INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            estacion TEXT NOT NULL,
+            creada REAL NOT NULL,
+            despachador TEXT,
+            vence REAL,
+            intentos INTEGER NOT NULL DEFAULT 0,
+            enviada TEXT,
+            FOREIGN KEY (pedido_id) REFERENCES pedidos (id),
+            FOREIGN KEY (producto_id) REFERENCES productos (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_comandas_pendientes
+        ON comandas (creada) WHERE enviada IS NULL
+    ''')
+
+def _migracion_12(cursor):
+    """Última edición aplicada de cada diario local de terminal"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS journal_aplicado (
+            journal TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL
+        )
+    ''')
+
+def _migracion_13(cursor):
+    """Quita el índice de detalles que repetía el índice único"""
+    # idx_pedido_detalles_pedido_producto ya resuelve las búsquedas por pedido_id;
+    # el índice cubriente duplicaba su prefijo y encarecía cada línea escrita
+    cursor.execute("DROP INDEX IF EXISTS idx_pedido_detalles_cobertura")
+
+def _migracion_14(cursor):
+    """Versión del stock para refrescar el stock en caché entre terminales"""
+    # Aparte de la versión del catálogo: una venta de otra terminal solo obliga
+    # a releer el stock, no a recargar todo el menú
+    cursor.execute("ALTER TABLE catalogo_version ADD COLUMN stock INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_catalogo_stock AFTER UPDATE OF stock ON productos
+        BEGIN
+            UPDATE catalogo_version SET stock = stock + 1 WHERE id = 1;
+        END
+    ''')
+
+# Lista ordenada de migraciones: (versión, descripción, función)
+MIGRACIONES = [
+    (1, "Índices de pedidos y detalles", _migracion_1),
+    (2, "Versión del catálogo de productos", _migracion_2),
+    (3, "Búsqueda de productos por nombre", _migracion_3),
+    (4, "Índice cubriente para reportes", _migracion_4),
+    (5, "Resúmenes de ventas", _migracion_5),
+    (6, "Stock mínimo y alertas de stock bajo", _migracion_6),
+    (7, "Registro de cambios de mesas", _migracion_7),
+    (8, "Un pedido abierto por mesa", _migracion_8),
+    (9, "Código de producto para importar el catálogo", _migracion_9),
+    (10, "Importes en centavos", _migracion_10),
+    (11, "Comandas para barra y cocina", _migracion_11),
+    (12, "Diario local de ediciones de pedidos", _migracion_12),
+    (13, "Sin índice duplicado en detalles", _migracion_13),
+    (14, "Versión del stock de productos", _migracion_14),
+]
+
+VERSION_ACTUAL = MIGRACIONES[-1][0]
+
+def get_version(conn):
+    """Obtiene la versión de esquema registrada en la base de datos"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def aplicar_migraciones(conn):
+    """Aplica en orden las migraciones pendientes y devuelve la versión final"""
+    for version, descripcion, migracion in MIGRACIONES:
+        if get_version(conn) >= version:
+            continue
+        
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Otra terminal pudo haber migrado mientras esperábamos el lock
+            if get_version(conn) < version:
+                migracion(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+    
+    return get_version(conn)
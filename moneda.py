@@ -0,0 +1,80 @@
+# moneda.py - Importes en centavos
+#
+# Precios, subtotales, totales y resúmenes se guardan y se calculan como
+# enteros en centavos: las sumas son exactas y SQLite las resuelve con
+# aritmética entera, sin floats ni Decimal por fila. Solo se pasa a pesos al
+# mostrar un importe o al leerlo de un archivo.
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+CENTAVOS = 100
+
+# Separador de miles: grupos de tres dígitos después de uno a tres dígitos
+_MILES = {sep: re.compile(rf"[+-]?\d{{1,3}}(?:{re.escape(sep)}\d{{3}})+") for sep in ".,"}
+
+def _normalizar(texto, valor, miles):
+    """Quita los separadores de miles y deja '.' como separador decimal"""
+    if "," in texto and "." in texto:
+        decimal = "," if texto.rfind(",") > texto.rfind(".") else "."
+        separador = "." if decimal == "," else ","
+        entero, _, fraccion = texto.rpartition(decimal)
+        if not _MILES[separador].fullmatch(entero):
+            raise ValueError(f"Importe inválido: {valor!r}")
+        return f"{entero.replace(separador, '')}.{fraccion}"
+    
+    separador = "," if "," in texto else "." if "." in texto else None
+    if separador is None:
+        return texto
+    if texto.count(separador) > 1:
+        if not _MILES[separador].fullmatch(texto):
+            raise ValueError(f"Importe inválido: {valor!r}")
+        return texto.replace(separador, "")
+    if _MILES[separador].fullmatch(texto):
+        # Un solo grupo de tres dígitos: depende de la convención de la lista
+        if miles is None:
+            raise ValueError(f"Importe ambiguo: {valor!r} (escriba '1500', '1.500,00' o "
+                             "'1,500.00', o indique el separador de miles)")
+        return texto.replace(separador, "" if miles == separador else ".")
+    return texto.replace(separador, ".")
+
+def a_centavos(valor, miles=None):
+    """Convierte un importe en pesos ('1.234,50', '1234.5', '$ 1500', 12.5) a centavos
+    
+    Con los dos separadores, el último es el decimal y el otro separa miles. Un
+    separador repetido ('1.234.567', '1,234,567') separa miles. Un separador
+    único seguido de exactamente tres dígitos ('1.500', '1,500') es ambiguo: se
+    toma como de miles si coincide con `miles` ('.' o ','), como decimal si
+    `miles` es el otro, y sin `miles` se rechaza. Cualquier otro separador
+    único es decimal.
+    """
+    if isinstance(valor, bool):
+        raise ValueError(f"Importe inválido: {valor!r}")
+    if isinstance(valor, int):
+        return valor * CENTAVOS
+    if miles not in (None, ".", ","):
+        raise ValueError(f"Separador de miles no válido: {miles!r}")
+    
+    texto = repr(valor) if isinstance(valor, float) else str(valor)
+    texto = texto.strip().replace("$", "").replace(" ", "")
+    if not isinstance(valor, float):
+        texto = _normalizar(texto, valor, miles)
+    
+    try:
+        pesos = Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f"Importe inválido: {valor!r}")
+    if not pesos.is_finite():
+        raise ValueError(f"Importe inválido: {valor!r}")
+    return int((pesos * CENTAVOS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def a_pesos(centavos):
+    """Importe en pesos como texto sin separador de miles ('1500' o '1500.50')"""
+    signo = "-" if centavos < 0 else ""
+    pesos, resto = divmod(abs(int(centavos)), CENTAVOS)
+    return f"{signo}{pesos}.{resto:02d}" if resto else f"{signo}{pesos}"
+
+def formatear(centavos):
+    """Texto para mostrar un importe: '$1,500' o '$1,500.50'"""
+    signo = "-" if centavos < 0 else ""
+    pesos, resto = divmod(abs(int(centavos)), CENTAVOS)
+    return f"{signo}${pesos:,}.{resto:02d}" if resto else f"{signo}${pesos:,}"
@@ -0,0 +1,268 @@
+# reportes.py - Reportes de ventas sobre las tablas de resumen
+#
+# Cada reporte es una única consulta agregada (GROUP BY) sobre las tablas de
+# resumen (resumen_ventas_*, ver resumenes.py) de un rango de fechas, resuelta
+# con sus claves primarias; no se recorren pedidos ni pedido_detalles. Los
+# resultados se leen por páginas con fetchmany, sin cargar todo en memoria, y
+# una consulta en segundo plano los entrega a la interfaz página por página.
+import sys
+import queue
+import argparse
+import threading
+
+from database import DatabaseManager
+
+# clave -> (título, columnas, consulta). La consulta recibe (desde, hasta) como
+# fechas AAAA-MM-DD, con hasta excluido. Se resuelven sobre las tablas de
+# resumen (ver resumenes.py): unos cientos de filas por mes en lugar de
+# millones de líneas de pedido.
+REPORTES = {
+    'dia': (
+        "Ventas por día",
+        ["Día", "Pedidos", "Total"],
+        '''
+            SELECT fecha, SUM(pedidos), SUM(total)
+            FROM resumen_ventas_mozo
+            WHERE fecha >= ? AND fecha < ? AND pedidos > 0
+            GROUP BY fecha
+            ORDER BY fecha
+        '''
+    ),
+    'hora': (
+        "Ventas por hora",
+        ["Hora", "Cantidad", "Total"],
+        '''
+            SELECT printf('%02d', hora), SUM(cantidad), SUM(total)
+            FROM resumen_ventas_producto
+            WHERE fecha >= ? AND fecha < ?
+            GROUP BY hora
+            ORDER BY hora
+        '''
+    ),
+    'mozo': (
+        "Ventas por mozo",
+        ["Mozo", "Pedidos", "Total"],
+        '''
+            SELECT u.nombre, v.pedidos, v.total
+            FROM (
+                SELECT usuario_id, SUM(pedidos) AS pedidos, SUM(total) AS total
+                FROM resumen_ventas_mozo
+                WHERE fecha >= ? AND fecha < ? AND pedidos > 0
+                GROUP BY usuario_id
+            ) v
+            LEFT JOIN usuarios u ON u.id = v.usuario_id
+            ORDER BY v.total DESC
+        '''
+    ),
+    'metodo_pago': (
+        "Ventas por método de pago",
+        ["Método de pago", "Pedidos", "Total"],
+        '''
+            SELECT metodo_pago, SUM(pedidos), SUM(total)
+            FROM resumen_ventas_mozo
+            WHERE fecha >= ? AND fecha < ? AND pedidos > 0
+            GROUP BY metodo_pago
+            ORDER BY SUM(total) DESC
+        '''
+    ),
+    'producto': (
+        "Ventas por producto",
+        ["Producto", "Cantidad", "Total"],
+        '''
+            SELECT pr.nombre, v.cantidad, v.total
+            FROM (
+                SELECT producto_id, SUM(cantidad) AS cantidad, SUM(total) AS total
+                FROM resumen_ventas_producto
+                WHERE fecha >= ? AND fecha < ?
+                GROUP BY producto_id
+            ) v
+            LEFT JOIN productos pr ON pr.id = v.producto_id
+            ORDER BY v.total DESC
+        '''
+    ),
+    'categoria': (
+        "Ventas por categoría",
+        ["Categoría", "Cantidad", "Total"],
+        '''
+            SELECT c.nombre, SUM(v.cantidad), SUM(v.total)
+            FROM (
+                SELECT producto_id, SUM(cantidad) AS cantidad, SUM(total) AS total
+                FROM resumen_ventas_producto
+                WHERE fecha >= ? AND fecha < ?
+                GROUP BY producto_id
+            ) v
+            LEFT JOIN productos pr ON pr.id = v.producto_id
+            LEFT JOIN categorias c ON c.id = pr.categoria_id
+            GROUP BY pr.categoria_id
+            ORDER BY SUM(v.total) DESC
+        '''
+    ),
+    'cancelaciones': (
+        "Cancelaciones por mozo",
+        ["Mozo", "Cancelados", "Total"],
+        '''
+            SELECT u.nombre, v.cancelados, v.total
+            FROM (
+                SELECT usuario_id, SUM(cancelados) AS cancelados, SUM(total_cancelado) AS total
+                FROM resumen_ventas_mozo
+                WHERE fecha >= ? AND fecha < ? AND cancelados > 0
+                GROUP BY usuario_id
+            ) v
+            LEFT JOIN usuarios u ON u.id = v.usuario_id
+            ORDER BY v.cancelados DESC
+        '''
+    ),
+}
+
+class Reportes:
+    """Ejecuta los reportes de ventas sobre la base de datos"""
+    
+    def __init__(self, db):
+        self.db = db
+    
+    def pagina(self, clave, desde, hasta, inicio, tamano_pagina):
+        """Devuelve `tamano_pagina` filas del reporte a partir de la fila `inicio`"""
+        if clave not in REPORTES:
+            raise ValueError("Reporte no válido")
+        titulo, columnas, consulta = REPORTES[clave]
+        cursor = self.db.get_connection().cursor()
+        try:
+            cursor.execute(f"{consulta} LIMIT ? OFFSET ?",
+                           (desde, hasta, int(tamano_pagina), int(inicio)))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+    
+    def paginas(self, clave, desde, hasta, tamano_pagina=200):
+        """Genera las filas del reporte en páginas de `tamano_pagina` filas"""
+        if clave not in REPORTES:
+            raise ValueError("Reporte no válido")
+        
+        if not hasattr(self.db, 'get_connection'):
+            # Cliente del servicio de pedidos: cada página se pide por separado,
+            # así ni el servidor ni el cliente arman el reporte completo
+            inicio = 0
+            while True:
+                pagina = self.db.get_reporte_pagina(clave, desde, hasta, inicio, tamano_pagina)
+                if pagina:
+                    yield pagina
+                if len(pagina) < tamano_pagina:
+                    return
+                inicio += len(pagina)
+        
+        titulo, columnas, consulta = REPORTES[clave]
+        cursor = self.db.get_connection().cursor()
+        cursor.execute(consulta, (desde, hasta))
+        try:
+            while True:
+                pagina = cursor.fetchmany(tamano_pagina)
+                if not pagina:
+                    break
+                yield pagina
+        finally:
+            cursor.close()
+
+class ConsultaReporte:
+    """Ejecuta un reporte en un hilo y entrega las páginas al hilo de Tk con root.after"""
+    
+    INTERVALO_REVISION = 50  # ms
+    
+    def __init__(self, db, root, clave, desde, hasta, al_recibir, al_terminar, al_fallar,
+                 tamano_pagina=200):
+        self.root = root
+        self.al_recibir = al_recibir
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self._paginas = queue.Queue(maxsize=8)  # limita la memoria si la UI se atrasa
+        self._cancelada = threading.Event()
+        
+        self._hilo = threading.Thread(
+            target=self._ejecutar, args=(Reportes(db), clave, desde, hasta, tamano_pagina),
+            name="reporte", daemon=True)
+        self._hilo.start()
+        self._revision = self.root.after(self.INTERVALO_REVISION, self._revisar)
+    
+    def cancelar(self):
+        """Detiene la consulta; no se entregan más páginas"""
+        self._cancelada.set()
+        try:
+            self.root.after_cancel(self._revision)
+        except Exception:
+            pass
+        # Liberar al hilo si está bloqueado esperando lugar en la cola
+        try:
+            while True:
+                self._paginas.get_nowait()
+        except queue.Empty:
+            pass
+    
+    def _poner(self, elemento):
+        """Encola un elemento salvo que la consulta se haya cancelado"""
+        while not self._cancelada.is_set():
+            try:
+                self._paginas.put(elemento, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _ejecutar(self, reportes, clave, desde, hasta, tamano_pagina):
+        """Lee el reporte página por página en el hilo de trabajo"""
+        paginas = reportes.paginas(clave, desde, hasta, tamano_pagina)
+        try:
+            for pagina in paginas:
+                if not self._poner(('pagina', pagina)):
+                    return
+            self._poner(('fin', None))
+        except Exception as e:
+            self._poner(('error', e))
+        finally:
+            # El hilo termina con la consulta: cerrar el cursor y su conexión a la base
+            paginas.close()
+            if hasattr(reportes.db, 'liberar_conexion'):
+                reportes.db.liberar_conexion()
+    
+    def _revisar(self):
+        """Entrega en el hilo de Tk las páginas disponibles (como mucho unas pocas por vez)"""
+        for _ in range(4):
+            try:
+                tipo, valor = self._paginas.get_nowait()
+            except queue.Empty:
+                break
+            
+            if tipo == 'pagina':
+                self.al_recibir(valor)
+            elif tipo == 'fin':
+                self.al_terminar()
+                return
+            else:
+                self.al_fallar(valor)
+                return
+        
+        if not self._cancelada.is_set():
+            self._revision = self.root.after(self.INTERVALO_REVISION, self._revisar)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de los resúmenes de ventas")
+    parser.add_argument("--db", default="bar_pos.db")
+    parser.add_argument("--reconstruir", action="store_true",
+                        help="recalcular los resúmenes desde los pedidos")
+    args = parser.parse_args()
+    
+    db = DatabaseManager(args.db)
+    try:
+        if args.reconstruir:
+            diferencias = db.reconstruir_resumenes()
+            print("Resúmenes reconstruidos")
+        else:
+            diferencias = db.verificar_resumenes()
+    finally:
+        db.close()
+    
+    for diferencia in diferencias:
+        print("Diferencia:", diferencia)
+    print("Resúmenes verificados: OK" if not diferencias else f"{len(diferencias)} diferencias")
+    return 1 if diferencias else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# resumenes.py - Tablas de resumen de ventas mantenidas en forma incremental
+#
+# resumen_ventas_producto: (fecha, hora, producto_id) -> cantidad, total
+# resumen_ventas_mozo:     (fecha, usuario_id, metodo_pago) -> pedidos, total,
+#                          cancelados, total_cancelado
+# Los totales están en centavos, como todos los importes (ver moneda.py).
+#
+# finalizar_pedido y cancelar_pedido las actualizan dentro de su transacción;
+# reconstruir() las recalcula desde los datos crudos en una sola pasada.
+# Las cancelaciones se registran con metodo_pago = '' (no hubo cobro).
+#
+# reconstruir() y verificar() leen por defecto las vistas que incluyen los
+# pedidos archivados (ver archivo.py); las acumulaciones leen solo los datos
+# vivos, donde está el pedido recién cerrado.
+
+# (pedidos, pedido_detalles) sobre los que se calculan los agregados crudos
+VIVAS = ("pedidos", "pedido_detalles")
+TODAS = ("pedidos_todos", "pedido_detalles_todos")
+
+CREAR_TABLAS = [
+    '''
+        CREATE TABLE IF NOT EXISTS resumen_ventas_producto (
+            fecha TEXT NOT NULL,
+            hora INTEGER NOT NULL,
+            producto_id INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (fecha, hora, producto_id)
+        ) WITHOUT ROWID
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS resumen_ventas_mozo (
+            fecha TEXT NOT NULL,
+            usuario_id INTEGER NOT NULL,
+            metodo_pago TEXT NOT NULL,
+            pedidos INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            cancelados INTEGER NOT NULL DEFAULT 0,
+            total_cancelado INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (fecha, usuario_id, metodo_pago)
+        ) WITHOUT ROWID
+    ''',
+]
+
+# Agregados crudos por producto y por mozo. {filtro} restringe los pedidos;
+# {pedidos} y {detalles} son las tablas de origen.
+_SELECT_PRODUCTO = '''
+    SELECT date(p.fecha_hora), CAST(strftime('%H', p.fecha_hora) AS INTEGER),
+           pd.producto_id, SUM(pd.cantidad), SUM(pd.subtotal)
+    FROM {pedidos} p
+    JOIN {detalles} pd ON pd.pedido_id = p.id
+    WHERE p.estado = 'finalizado' AND {filtro}
+    GROUP BY 1, 2, 3
+'''
+
+_SELECT_MOZO = '''
+    SELECT date(p.fecha_hora), COALESCE(p.usuario_id, 0),
+           CASE WHEN p.estado = 'finalizado' THEN COALESCE(p.metodo_pago, '') ELSE '' END,
+           SUM(p.estado = 'finalizado'),
+           SUM(CASE WHEN p.estado = 'finalizado' THEN p.total ELSE 0 END),
+           SUM(p.estado = 'cancelado'),
+           SUM(CASE WHEN p.estado = 'cancelado' THEN p.total ELSE 0 END)
+    FROM {pedidos} p
+    WHERE p.estado IN ('finalizado', 'cancelado') AND {filtro}
+    GROUP BY 1, 2, 3
+'''
+
+_UPSERT_PRODUCTO = '''
+    INSERT INTO resumen_ventas_producto (fecha, hora, producto_id, cantidad, total)
+    ''' + _SELECT_PRODUCTO + '''
+    ON CONFLICT (fecha, hora, producto_id) DO UPDATE SET
+        cantidad = cantidad + excluded.cantidad,
+        total = total + excluded.total
+'''
+
+_UPSERT_MOZO = '''
+    INSERT INTO resumen_ventas_mozo
+        (fecha, usuario_id, metodo_pago, pedidos, total, cancelados, total_cancelado)
+    ''' + _SELECT_MOZO + '''
+    ON CONFLICT (fecha, usuario_id, metodo_pago) DO UPDATE SET
+        pedidos = pedidos + excluded.pedidos,
+        total = total + excluded.total,
+        cancelados = cancelados + excluded.cancelados,
+        total_cancelado = total_cancelado + excluded.total_cancelado
+'''
+
+def crear_tablas(cursor):
+    """Crea las tablas de resumen si no existen"""
+    for sql in CREAR_TABLAS:
+        cursor.execute(sql)
+
+def acumular_finalizado(cursor, pedido_id):
+    """Suma un pedido recién finalizado a los resúmenes"""
+    pedidos, detalles = VIVAS
+    cursor.execute(_UPSERT_PRODUCTO.format(filtro="p.id = ?", pedidos=pedidos, detalles=detalles),
+                   (pedido_id,))
+    cursor.execute(_UPSERT_MOZO.format(filtro="p.id = ?", pedidos=pedidos), (pedido_id,))
+
+def acumular_cancelado(cursor, pedido_id):
+    """Registra un pedido recién cancelado en el resumen por mozo"""
+    cursor.execute(_UPSERT_MOZO.format(filtro="p.id = ?", pedidos=VIVAS[0]), (pedido_id,))
+
+def reconstruir(cursor, tablas=TODAS):
+    """Recalcula los resúmenes completos desde pedidos y pedido_detalles"""
+    pedidos, detalles = tablas
+    cursor.execute("DELETE FROM resumen_ventas_producto")
+    cursor.execute("DELETE FROM resumen_ventas_mozo")
+    cursor.execute(_UPSERT_PRODUCTO.format(filtro="1", pedidos=pedidos, detalles=detalles))
+    cursor.execute(_UPSERT_MOZO.format(filtro="1", pedidos=pedidos))
+
+def verificar(cursor, tablas=TODAS):
+    """Compara los resúmenes con los datos crudos; devuelve las filas que difieren"""
+    pedidos, detalles = tablas
+    diferencias = []
+    for tabla, columnas, select in (
+        ("resumen_ventas_producto", "fecha, hora, producto_id, cantidad, total", _SELECT_PRODUCTO),
+        ("resumen_ventas_mozo",
+         "fecha, usuario_id, metodo_pago, pedidos, total, cancelados, total_cancelado", _SELECT_MOZO),
+    ):
+        crudo = select.format(filtro="1", pedidos=pedidos, detalles=detalles)
+        cursor.execute(f'''
+            SELECT '{tabla}', 'falta en resumen', * FROM ({crudo} EXCEPT SELECT {columnas} FROM {tabla})
+            UNION ALL
+            SELECT '{tabla}', 'sobra en resumen', * FROM (SELECT {columnas} FROM {tabla} EXCEPT {crudo})
+        ''')
+        diferencias += cursor.fetchall()
+    return diferencias
@@ -0,0 +1,254 @@
+# servicio.py - Servicio local de pedidos para varias terminales
+#
+# Un único proceso es dueño de la base de datos y atiende a las terminales por
+# HTTP con JSON. Las lecturas se resuelven en los hilos del servidor (WAL permite
+# lectores concurrentes); las escrituras pasan por una cola y las aplica un solo
+# hilo escritor, en orden de llegada, sin competir por el lock de SQLite.
+#
+# Uso:
+#   python servicio.py --db bar_pos.db --puerto 8765
+#   BAR_POS_SERVICIO=127.0.0.1:8765 python main.py
+#
+# Con el servicio, las comandas de barra y cocina las despacha este proceso.
+import sys
+import json
+import queue
+import argparse
+import threading
+import http.client
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from database import DatabaseManager
+from reportes import Reportes
+import comandas
+
+PUERTO_DEFECTO = 8765
+
+# Operaciones de DatabaseManager expuestas por el servicio
+LECTURAS = [
+    'get_productos_por_categoria', 'get_producto', 'get_categorias', 'buscar_productos',
+    'get_productos_stock_bajo', 'get_catalogo_version', 'get_mesas', 'get_usuarios',
+    'get_pedido_activo_mesa', 'get_detalles_pedido', 'get_pedido_completo',
+    'get_pedidos_finalizados', 'verificar_resumenes', 'get_cambios_desde', 'get_ultimo_cambio',
+]
+ESCRITURAS = [
+    'cambiar_estado_mesa', 'crear_pedido', 'agregar_producto_pedido',
+    'agregar_productos_pedido', 'eliminar_detalle_pedido', 'finalizar_pedido',
+    'cancelar_pedido', 'reconstruir_resumenes',
+]
+
+# Forma del resultado de cada operación: JSON no distingue tuplas de listas, así
+# que el cliente rearma las filas de sqlite3 (tuplas) según lo que devuelve cada
+# método de DatabaseManager. Las operaciones que no figuran devuelven escalares
+# o listas de valores sueltos y se entregan tal cual.
+FILA = 'fila'    # una fila o None
+FILAS = 'filas'  # lista de filas
+FORMAS = {
+    'get_productos_por_categoria': FILAS,
+    'get_producto': FILA,
+    'get_categorias': FILAS,
+    'buscar_productos': FILAS,
+    'get_productos_stock_bajo': FILAS,
+    'get_mesas': FILAS,
+    'get_usuarios': FILAS,
+    'get_pedido_activo_mesa': FILA,
+    'get_detalles_pedido': FILAS,
+    'get_pedido_completo': {'pedido': FILA, 'detalles': FILAS},
+    'verificar_resumenes': FILAS,
+    'get_cambios_desde': (None, FILAS),
+    'agregar_producto_pedido': FILA,
+    'agregar_productos_pedido': FILAS,
+    'finalizar_pedido': FILAS,
+    'reconstruir_resumenes': FILAS,
+    'get_reporte_pagina': FILAS,
+}
+
+class ServicioPedidos:
+    """Servidor HTTP que expone DatabaseManager con un único hilo escritor"""
+    
+    def __init__(self, db_name="bar_pos.db", host="127.0.0.1", puerto=PUERTO_DEFECTO,
+                 politica_stock=None):
+        self.db = DatabaseManager(db_name, politica_stock)
+        self._escrituras = queue.Queue()
+        self._escritor = threading.Thread(target=self._escribir, name="escritor", daemon=True)
+        self._escritor.start()
+        
+        servicio = self
+        
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # conexiones persistentes por terminal
+            disable_nagle_algorithm = True  # respuestas chicas: sin esperar el ACK
+            
+            def do_POST(self):
+                largo = int(self.headers.get("Content-Length", 0))
+                try:
+                    pedido = json.loads(self.rfile.read(largo))
+                    respuesta = {'ok': True,
+                                 'resultado': servicio.ejecutar(pedido['metodo'],
+                                                                pedido.get('args', []))}
+                except ValueError as e:
+                    respuesta = {'ok': False, 'tipo': 'ValueError', 'error': str(e)}
+                except Exception as e:
+                    respuesta = {'ok': False, 'tipo': type(e).__name__, 'error': str(e)}
+                
+                cuerpo = json.dumps(respuesta).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+            
+            def finish(self):
+                # Cada conexión de terminal tiene su propio hilo: al cerrarse se
+                # libera la conexión a la base que abrieron sus lecturas
+                try:
+                    super().finish()
+                finally:
+                    servicio.db.liberar_conexion()
+            
+            def log_message(self, formato, *args):
+                pass
+        
+        self.servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        self.servidor.daemon_threads = True
+    
+    @property
+    def direccion(self):
+        """Dirección host:puerto en la que escucha el servicio"""
+        host, puerto = self.servidor.server_address[:2]
+        return f"{host}:{puerto}"
+    
+    def ejecutar(self, metodo, args):
+        """Resuelve una operación; las escrituras esperan su turno en la cola"""
+        if metodo == 'get_reporte_pagina':
+            return Reportes(self.db).pagina(*args)
+        if metodo in LECTURAS:
+            return getattr(self.db, metodo)(*args)
+        if metodo in ESCRITURAS:
+            futuro = Future()
+            self._escrituras.put((metodo, args, futuro))
+            return futuro.result()
+        raise ValueError("Operación no válida")
+    
+    def _escribir(self):
+        """Aplica las escrituras de a una, en orden de llegada"""
+        while True:
+            elemento = self._escrituras.get()
+            if elemento is None:
+                return
+            metodo, args, futuro = elemento
+            try:
+                futuro.set_result(getattr(self.db, metodo)(*args))
+            except Exception as e:
+                futuro.set_exception(e)
+    
+    def iniciar(self):
+        """Atiende pedidos en un hilo de fondo (para pruebas y benchmarks)"""
+        hilo = threading.Thread(target=self.servidor.serve_forever, name="servicio", daemon=True)
+        hilo.start()
+        return hilo
+    
+    def detener(self):
+        """Deja de atender, termina las escrituras pendientes y cierra la base"""
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        self._escrituras.put(None)
+        self._escritor.join()
+        self.db.close()
+
+def _convertir(valor, forma):
+    """Convierte un resultado JSON a la forma que devuelve DatabaseManager"""
+    if valor is None or forma is None:
+        return valor
+    if forma == FILA:
+        return tuple(valor)
+    if forma == FILAS:
+        return [tuple(fila) for fila in valor]
+    if isinstance(forma, dict):
+        return {clave: _convertir(v, forma.get(clave)) for clave, v in valor.items()}
+    return tuple(_convertir(v, f) for v, f in zip(valor, forma))
+
+class ClienteServicio:
+    """Cliente del servicio de pedidos con la misma interfaz que DatabaseManager"""
+    
+    def __init__(self, direccion, timeout=10):
+        host, _, puerto = direccion.rpartition(":")
+        self.host = host or "127.0.0.1"
+        self.puerto = int(puerto)
+        self.timeout = timeout
+        self._local = threading.local()  # una conexión HTTP por hilo
+        self._conexiones = []
+        self._lock = threading.Lock()
+    
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=self.timeout)
+            self._local.conexion = conexion
+            with self._lock:
+                self._conexiones.append(conexion)
+        return conexion
+    
+    def llamar(self, metodo, *args):
+        """Ejecuta una operación en el servicio y devuelve su resultado"""
+        # En bytes, http.client envía encabezados y cuerpo en un solo segmento
+        cuerpo = json.dumps({'metodo': metodo, 'args': args}).encode("utf-8")
+        for intento in range(2):
+            conexion = self._conexion()
+            enviado = False
+            try:
+                conexion.request("POST", "/", cuerpo, {"Content-Type": "application/json"})
+                enviado = True
+                respuesta = conexion.getresponse()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # Conexión persistente vencida (p. ej. el servicio se reinició): se
+                # reintenta una vez, salvo una escritura que pudo haberse aplicado
+                conexion.close()
+                if intento or (enviado and metodo in ESCRITURAS):
+                    raise
+        datos = json.loads(respuesta.read())
+        
+        if not datos['ok']:
+            if datos['tipo'] == 'ValueError':
+                raise ValueError(datos['error'])
+            raise RuntimeError(f"{datos['tipo']}: {datos['error']}")
+        return _convertir(datos['resultado'], FORMAS.get(metodo))
+    
+    def __getattr__(self, metodo):
+        if metodo in LECTURAS or metodo in ESCRITURAS or metodo == 'get_reporte_pagina':
+            return lambda *args: self.llamar(metodo, *args)
+        raise AttributeError(metodo)
+    
+    def close(self):
+        """Cierra las conexiones HTTP abiertas por este cliente"""
+        with self._lock:
+            for conexion in self._conexiones:
+                conexion.close()
+            self._conexiones.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio local de pedidos para varias terminales")
+    parser.add_argument("--db", default="bar_pos.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO_DEFECTO)
+    parser.add_argument("--politica-stock", choices=DatabaseManager.POLITICAS_STOCK,
+                        help="qué hacer al vender sin stock (por defecto BAR_POS_POLITICA_STOCK o 'advertir')")
+    args = parser.parse_args()
+    
+    servicio = ServicioPedidos(args.db, args.host, args.puerto, args.politica_stock)
+    despachador = comandas.iniciar(servicio.db)
+    print(f"Servicio de pedidos en {servicio.direccion} ({args.db})")
+    try:
+        servicio.servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if despachador:
+            despachador.detener()
+        servicio.detener()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
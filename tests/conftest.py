@@ -0,0 +1,16 @@
+# conftest.py - Configuración común de las pruebas
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+@pytest.fixture
+def db(tmp_path):
+    """Base nueva en un directorio temporal, con los datos iniciales"""
+    base = DatabaseManager(str(tmp_path / "bar_pos.db"))
+    yield base
+    base.close()
@@ -0,0 +1,58 @@
+# test_archivo.py - Archivo de pedidos viejos en la base histórica
+import archivo
+from reportes import Reportes
+
+def _adjuntas(db):
+    return [fila[1] for fila in db.get_connection().execute("PRAGMA database_list")]
+
+def test_historico_adjunto_solo_durante_el_bloque(db):
+    db.get_pedido_completo(1)
+    db.verificar_resumenes()
+    assert archivo.ALIAS not in _adjuntas(db)
+    
+    with db.historico():
+        assert archivo.ALIAS in _adjuntas(db)
+        with db.historico():  # anidado: lo separa solo el bloque que lo adjuntó
+            pass
+        assert archivo.ALIAS in _adjuntas(db)
+        assert db.get_pedidos_finalizados("2000-01-01", "2100-01-01") == []
+    assert archivo.ALIAS not in _adjuntas(db)
+    
+    # Las escrituras de pedidos no toman el lock del histórico
+    pedido_id = db.crear_pedido(1, 1)
+    db.agregar_producto_pedido(pedido_id, 1, 1)
+    assert archivo.ALIAS not in _adjuntas(db)
+
+def test_archivar_y_leer_desde_el_historico(db):
+    pedidos = []
+    for mesa_id in (1, 2, 3):
+        pedido_id = db.crear_pedido(mesa_id, 1)
+        db.agregar_productos_pedido(pedido_id, [(1, mesa_id), (2, 1)])
+        db.finalizar_pedido(pedido_id, 'efectivo')
+        pedidos.append(pedido_id)
+    abierto = db.crear_pedido(4, 1)
+    db.agregar_producto_pedido(abierto, 1, 1)
+    
+    with db.transaccion() as cursor:
+        cursor.execute("UPDATE pedidos SET fecha_hora = '2020-01-01 21:00:00'")
+    db.reconstruir_resumenes()
+    antes = {pedido_id: db.get_pedido_completo(pedido_id) for pedido_id in pedidos}
+    reporte = list(Reportes(db).paginas('dia', "2020-01-01", "2020-01-02"))
+    
+    # Los pedidos abiertos no se archivan
+    assert archivo.archivar(db, dias=30, lote=2) == 3
+    vivos = db.get_connection().execute("SELECT id FROM pedidos").fetchall()
+    assert vivos == [(abierto,)]
+    
+    # Las consultas sobre pedidos_todos siguen viendo los archivados
+    assert {pedido_id: db.get_pedido_completo(pedido_id) for pedido_id in pedidos} == antes
+    assert db.get_pedidos_finalizados("2020-01-01", "2020-01-02") == pedidos
+    assert db.verificar_resumenes() == []
+    assert db.reconstruir_resumenes() == []
+    assert list(Reportes(db).paginas('dia', "2020-01-01", "2020-01-02")) == reporte
+    
+    # Un lote interrumpido (copiado pero todavía vivo) no se cuenta dos veces
+    with db.historico() as conn:
+        conn.execute(f"INSERT INTO {archivo.ALIAS}.pedidos (id, estado) VALUES (?, 'abierto')",
+                     (abierto,))
+        assert conn.execute("SELECT COUNT(*) FROM pedidos_todos").fetchone() == (4,)
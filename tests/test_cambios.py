@@ -0,0 +1,39 @@
+# test_cambios.py - Registro de cambios de mesas entre terminales
+import pytest
+
+from database import DatabaseManager
+
+@pytest.fixture
+def otra_terminal(db):
+    terminal = DatabaseManager(db.db_name)
+    yield terminal
+    terminal.close()
+
+def test_cambios_de_otra_terminal(db, otra_terminal):
+    seq = db.get_ultimo_cambio()
+    assert db.get_cambios_desde(seq) == (seq, [])
+    
+    pedido_id = otra_terminal.crear_pedido(1, 1)
+    otra_terminal.cambiar_estado_mesa(2, 'reservada')
+    ultimo, cambios = db.get_cambios_desde(seq)
+    assert ultimo == otra_terminal.get_ultimo_cambio()
+    assert [c[1:] for c in cambios] == [(1, 'ocupada', pedido_id), (2, 'reservada', None)]
+    
+    # Sin escrituras nuevas no hay nada más que leer
+    assert db.get_cambios_desde(ultimo) == (ultimo, [])
+
+def test_purgar_conserva_los_ultimos(db, otra_terminal):
+    db.CAMBIOS_CONSERVADOS = 3
+    inicial = db.get_ultimo_cambio()
+    for estado in ['reservada', 'libre'] * 3:
+        db.cambiar_estado_mesa(1, estado)
+    
+    db.purgar_cambios()
+    ultimo = db.get_ultimo_cambio()
+    conservados = db.get_connection().execute("SELECT seq FROM cambios ORDER BY seq").fetchall()
+    assert [fila[0] for fila in conservados] == [ultimo - 2, ultimo - 1, ultimo]
+    
+    # Quien quedó antes de lo purgado debe recargar todo
+    assert otra_terminal.get_cambios_desde(inicial) == (ultimo, None)
+    seq, cambios = otra_terminal.get_cambios_desde(ultimo - 3)
+    assert (seq, len(cambios)) == (ultimo, 3)
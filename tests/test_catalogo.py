@@ -0,0 +1,41 @@
+# test_catalogo.py - Importación y exportación del catálogo
+import sqlite3
+import sys
+
+import pytest
+
+import catalogo
+
+def test_importar_y_exportar(db, tmp_path):
+    ruta = tmp_path / "catalogo.csv"
+    ruta.write_text("codigo,nombre,categoria,precio,stock\n"
+                    "X1,Tostado,Comidas,\"1500,50\",10\n", encoding="utf-8")
+    resultado = catalogo.importar(db, catalogo.leer(str(ruta)))
+    assert resultado['insertados'] == 1
+    
+    exportado = tmp_path / "exportado.jsonl"
+    catalogo.exportar(db, str(exportado))
+    assert '"precio": "1500.50"' in exportado.read_text(encoding="utf-8")
+
+def test_precio_con_un_grupo_de_miles(db, tmp_path):
+    ruta = tmp_path / "catalogo.csv"
+    ruta.write_text("codigo,nombre,categoria,precio\n"
+                    "X1,Tostado,Comidas,1.500\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Línea 2.*ambiguo"):
+        catalogo.importar(db, catalogo.leer(str(ruta)))
+    
+    catalogo.importar(db, catalogo.leer(str(ruta)), miles=".")
+    cursor = db.get_connection().execute("SELECT precio FROM productos WHERE codigo = 'X1'")
+    assert cursor.fetchone()[0] == 150000
+
+def test_main_informa_errores_de_la_base(db, tmp_path, monkeypatch, capsys):
+    ruta = tmp_path / "catalogo.csv"
+    ruta.write_text("nombre,categoria,precio\nTostado,Comidas,1500\n", encoding="utf-8")
+    
+    def importar_bloqueado(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+    
+    monkeypatch.setattr(catalogo, "importar", importar_bloqueado)
+    monkeypatch.setattr(sys, "argv", ["catalogo.py", "importar", str(ruta), "--db", db.db_name])
+    assert catalogo.main() == 1
+    assert "database is locked" in capsys.readouterr().err
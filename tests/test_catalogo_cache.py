@@ -0,0 +1,44 @@
+# test_catalogo_cache.py - Caché del catálogo en memoria
+import pytest
+
+from database import DatabaseManager
+
+def test_venta_actualiza_el_stock_en_la_cache(db):
+    producto = db.catalogo.get_producto(1)
+    categoria_id = db.get_connection().execute(
+        "SELECT categoria_id FROM productos WHERE id = 1").fetchone()[0]
+    
+    pedido_id = db.crear_pedido(1, 1)
+    db.agregar_producto_pedido(pedido_id, 1, 3)
+    db.finalizar_pedido(pedido_id, 'efectivo')
+    
+    stock = producto[3] - 3
+    assert db.catalogo.get_producto(1)[3] == stock
+    assert [p[3] for p in db.catalogo.get_productos() if p[0] == 1] == [stock]
+    assert [p[3] for p in db.catalogo.get_productos(categoria_id) if p[0] == 1] == [stock]
+    # Lo mismo que se leería de la base
+    db.catalogo.invalidar()
+    assert db.catalogo.get_producto(1)[3] == stock
+
+def test_venta_de_otra_terminal_refresca_el_stock(tmp_path):
+    terminal_a = DatabaseManager(str(tmp_path / "bar_pos.db"), 'rechazar')
+    terminal_b = DatabaseManager(str(tmp_path / "bar_pos.db"), 'rechazar')
+    try:
+        stock = terminal_a.get_producto(1)[3]
+        version = terminal_a.get_catalogo_version()
+        
+        pedido_id = terminal_b.crear_pedido(1, 1)
+        terminal_b.agregar_producto_pedido(pedido_id, 1, stock)
+        terminal_b.finalizar_pedido(pedido_id, 'efectivo')
+        
+        assert terminal_a.get_producto(1)[3] == 0
+        assert terminal_a.get_catalogo_version() == version  # el menú no se recargó
+        
+        # La terminal A rechaza con el stock de la base aunque su caché lo tuviera
+        pedido_id = terminal_a.crear_pedido(2, 1)
+        terminal_a.agregar_producto_pedido(pedido_id, 1, 1)
+        with pytest.raises(ValueError, match="Stock insuficiente"):
+            terminal_a.finalizar_pedido(pedido_id, 'efectivo')
+    finally:
+        terminal_a.close()
+        terminal_b.close()
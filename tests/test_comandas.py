@@ -0,0 +1,50 @@
+# test_comandas.py - Despacho de comandas a barra y cocina
+import comandas
+
+class SalidaMemoria:
+    def __init__(self):
+        self.tickets = []
+    
+    def enviar(self, texto):
+        self.tickets.append(texto)
+    
+    def cerrar(self):
+        pass
+
+def _despachador(db):
+    salidas = {estacion: SalidaMemoria() for estacion in comandas.ESTACIONES}
+    return comandas.Despachador(db, salidas, ventana=0), salidas
+
+def _nombre(db, producto_id):
+    return db.get_connection().execute(
+        "SELECT nombre FROM productos WHERE id = ?", (producto_id,)).fetchone()[0]
+
+def test_linea_quitada_antes_de_despachar_no_se_imprime(db):
+    despachador, salidas = _despachador(db)
+    pedido_id = db.crear_pedido(1, 1)
+    quitada, queda = db.agregar_productos_pedido(pedido_id, [(1, 2), (2, 1)])
+    db.eliminar_detalle_pedido(quitada[0])
+    
+    despachador.despachar()
+    texto = "".join(t for salida in salidas.values() for t in salida.tickets)
+    assert _nombre(db, 2) in texto
+    assert _nombre(db, 1) not in texto
+
+def test_pedido_cancelado_antes_de_despachar_no_se_imprime(db):
+    despachador, salidas = _despachador(db)
+    pedido_id = db.crear_pedido(1, 1)
+    db.agregar_producto_pedido(pedido_id, 1, 1)
+    db.cancelar_pedido(pedido_id)
+    
+    assert despachador.despachar() == 0
+    assert all(not salida.tickets for salida in salidas.values())
+
+def test_comanda_despachada_una_sola_vez(db):
+    despachador, salidas = _despachador(db)
+    pedido_id = db.crear_pedido(1, 1)
+    db.agregar_producto_pedido(pedido_id, 1, 3)
+    
+    assert despachador.despachar() == 1
+    assert despachador.despachar() == 0
+    tickets = [t for salida in salidas.values() for t in salida.tickets]
+    assert len(tickets) == 1 and f"3 x {_nombre(db, 1)}" in tickets[0]
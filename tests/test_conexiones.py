@@ -0,0 +1,46 @@
+# test_conexiones.py - Conexiones por hilo de ConnectionManager
+import gc
+import weakref
+import threading
+
+from database import DatabaseManager
+
+def _en_hilo(funcion):
+    hilo = threading.Thread(target=funcion)
+    hilo.start()
+    hilo.join()
+
+def test_hilos_terminados_no_dejan_conexiones(db):
+    for _ in range(30):
+        _en_hilo(db.get_mesas)
+    assert db.conexiones.abiertas() == 1
+
+def test_liberar_cierra_la_conexion_del_hilo(db):
+    def tarea():
+        db.get_mesas()
+        assert db.conexiones.abiertas() == 2
+        db.liberar_conexion()
+        assert db.conexiones.abiertas() == 1
+        db.get_mesas()  # abre otra si hace falta
+    
+    _en_hilo(tarea)
+    assert db.conexiones.abiertas() == 1
+
+def test_base_en_memoria_sobrevive_a_sus_hilos():
+    db = DatabaseManager(":memory:")
+    try:
+        categorias = []
+        for _ in range(3):
+            _en_hilo(lambda: categorias.append(db.get_categorias()))
+        assert categorias[0] == categorias[-1] != []
+    finally:
+        db.close()
+
+def test_instancia_descartada_cierra_sus_conexiones(tmp_path):
+    db = DatabaseManager(str(tmp_path / "bar_pos.db"))
+    referencia = weakref.ref(db)
+    conexiones = db.conexiones
+    del db
+    gc.collect()
+    assert referencia() is None  # nada la retiene hasta la salida del programa
+    assert conexiones.abiertas() == 0
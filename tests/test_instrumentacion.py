@@ -0,0 +1,27 @@
+# test_instrumentacion.py - Métricas por operación y por sentencia
+import time
+
+from instrumentacion import Metricas
+
+def _metricas(db, tmp_path):
+    metricas = Metricas(umbral_lenta_ms=50, archivo_lentas=str(tmp_path / "lentas.log"))
+    metricas.instrumentar_db(db)
+    return metricas
+
+def test_sentencias_fuera_de_una_operacion_no_se_miden(db, tmp_path):
+    metricas = _metricas(db, tmp_path)
+    # Como el despachador de comandas: consulta directa y después espera
+    db.get_connection().execute("SELECT 1 FROM comandas LIMIT 1").fetchall()
+    time.sleep(0.1)
+    db.get_mesas()
+    
+    sentencias = metricas.resumen()['sentencias']
+    assert not any("comandas" in sql for sql in sentencias)
+    assert all(s['max_ms'] < 50 for s in sentencias.values())
+
+def test_sentencias_de_una_operacion_se_miden(db, tmp_path):
+    metricas = _metricas(db, tmp_path)
+    db.get_mesas()
+    resumen = metricas.resumen()
+    assert resumen['operaciones']['db.get_mesas']['llamadas'] == 1
+    assert any("FROM mesas" in sql for sql in resumen['sentencias'])
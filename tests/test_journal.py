@@ -0,0 +1,120 @@
+# test_journal.py - Diario local de ediciones de pedidos
+import json
+import sqlite3
+
+import pytest
+
+from journal import Journal, base_ocupada
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / "bar_pos_journal_prueba.jsonl")
+
+def test_edicion_mal_formada_no_traba_la_cola(db, ruta):
+    diario = Journal(db, ruta).iniciar()
+    try:
+        pedido_id = db.crear_pedido(1, 1)
+        fallidas, aplicadas = [], []
+        diario.agregar(pedido_id, 1, 1, aplicadas.append, fallidas.append)
+        diario._anotar({'op': 'agregar', 'pedido_id': pedido_id}, None, fallidas.append)  # sin producto
+        diario._anotar({'op': 'agregar', 'pedido_id': pedido_id, 'producto_id': 1,
+                        'cantidad': "x"}, None, fallidas.append)
+        diario.agregar(pedido_id, 2, 1, aplicadas.append, fallidas.append)
+        
+        assert diario.esperar(timeout=5)
+        diario.entregar()
+        assert len(aplicadas) == 2
+        assert [type(e) for e in fallidas] == [KeyError, TypeError]
+        assert [d[2] for d in db.get_detalles_pedido(pedido_id)] == [1, 1]
+        seq = db.get_connection().execute(
+            "SELECT seq FROM journal_aplicado WHERE journal = ?", (diario.id,)).fetchone()[0]
+        assert seq == 4
+    finally:
+        diario.cerrar()
+
+def test_reinicio_aplica_lo_pendiente_una_sola_vez(db, ruta):
+    diario = Journal(db, ruta).iniciar()
+    pedido_id = db.crear_pedido(1, 1)
+    diario.agregar(pedido_id, 1, 2)
+    assert diario.esperar(timeout=5)
+    diario.cerrar()
+    
+    # Ediciones anotadas pero no aplicadas (corte de luz), una línea sin
+    # secuencia y una línea cortada al final
+    with open(ruta, "a", encoding="utf-8") as f:
+        f.write(json.dumps({'op': 'agregar', 'pedido_id': pedido_id, 'producto_id': 1,
+                            'cantidad': 1, 'seq': 2}) + "\n")
+        f.write(json.dumps({'op': 'agregar'}) + "\n")
+        f.write('{"op": "agre')
+    
+    for _ in range(2):
+        diario = Journal(db, ruta).iniciar()
+        assert diario.esperar(timeout=5)
+        diario.cerrar()
+    assert [d[2] for d in db.get_detalles_pedido(pedido_id)] == [3]
+
+def test_segunda_instancia_con_el_mismo_archivo_no_arranca(db, ruta):
+    diario = Journal(db, ruta).iniciar()
+    try:
+        with pytest.raises(ValueError, match="en uso"):
+            Journal(db, ruta).iniciar()
+    finally:
+        diario.cerrar()
+    # Cerrado el primero, el archivo se puede volver a abrir
+    Journal(db, ruta).iniciar().cerrar()
+
+def test_compactar_vacia_el_archivo(db, ruta, monkeypatch):
+    monkeypatch.setattr("journal.TAMANO_COMPACTAR", 500)
+    diario = Journal(db, ruta).iniciar()
+    pedido_id = db.crear_pedido(1, 1)
+    for _ in range(20):
+        diario.agregar(pedido_id, 1, 1)
+    assert diario.esperar(timeout=5)
+    diario.agregar(pedido_id, 1, 1)
+    assert diario.esperar(timeout=5)
+    diario.cerrar()
+    
+    with open(ruta, encoding="utf-8") as f:
+        assert len(f.read()) < 500
+    diario = Journal(db, ruta).iniciar()
+    assert diario.pendientes() == 0 and diario._seq == 21
+    diario.cerrar()
+    assert [d[2] for d in db.get_detalles_pedido(pedido_id)] == [21]
+
+def test_solo_se_reintenta_con_la_base_ocupada(tmp_path):
+    ruta = str(tmp_path / "ocupada.db")
+    una = sqlite3.connect(ruta, timeout=0, isolation_level=None)
+    otra = sqlite3.connect(ruta, timeout=0, isolation_level=None)
+    una.execute("CREATE TABLE t (x)")
+    una.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError) as ocupada:
+        otra.execute("BEGIN IMMEDIATE")
+    una.execute("ROLLBACK")
+    with pytest.raises(sqlite3.OperationalError) as sin_tabla:
+        otra.execute("SELECT * FROM no_existe")
+    
+    assert base_ocupada(ocupada.value)
+    assert not base_ocupada(sin_tabla.value)
+    assert base_ocupada(sqlite3.OperationalError("database is locked"))
+
+def test_error_permanente_falla_el_lote_sin_trabar_la_cola(db, ruta):
+    diario = Journal(db, ruta).iniciar()
+    pedido_id = db.crear_pedido(1, 1)
+    fallidas = []
+    with db.transaccion() as cursor:
+        cursor.execute("ALTER TABLE journal_aplicado RENAME TO journal_aplicado_viejo")
+    try:
+        diario.agregar(pedido_id, 1, 1, None, fallidas.append)
+        assert diario.esperar(timeout=5)
+        diario.entregar()
+        assert [type(e) for e in fallidas] == [sqlite3.OperationalError]
+    finally:
+        diario.cerrar()
+        with db.transaccion() as cursor:
+            cursor.execute("ALTER TABLE journal_aplicado_viejo RENAME TO journal_aplicado")
+    
+    # La edición fallida quedó marcada como descartada: no se reaplica al reiniciar
+    diario = Journal(db, ruta).iniciar()
+    assert diario.pendientes() == 0
+    diario.cerrar()
+    assert db.get_detalles_pedido(pedido_id) == []
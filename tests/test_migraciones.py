@@ -0,0 +1,112 @@
+# test_migraciones.py - Actualización en el lugar de una base existente
+import sqlite3
+
+import archivo
+from database import DatabaseManager
+from migraciones import VERSION_ACTUAL, get_version
+
+# Esquema anterior a las migraciones: importes en pesos (REAL)
+ESQUEMA_ORIGINAL = '''
+    CREATE TABLE categorias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL UNIQUE,
+        activo INTEGER DEFAULT 1);
+    CREATE TABLE productos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL, precio REAL NOT NULL,
+        categoria_id INTEGER, stock INTEGER DEFAULT 0, activo INTEGER DEFAULT 1);
+    CREATE TABLE mesas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, numero INTEGER NOT NULL UNIQUE,
+        capacidad INTEGER DEFAULT 4, estado TEXT DEFAULT 'libre');
+    CREATE TABLE usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL,
+        tipo TEXT DEFAULT 'mozo', activo INTEGER DEFAULT 1);
+    CREATE TABLE pedidos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, mesa_id INTEGER, usuario_id INTEGER,
+        fecha_hora DATETIME DEFAULT CURRENT_TIMESTAMP, total REAL DEFAULT 0,
+        estado TEXT DEFAULT 'abierto', tipo_venta TEXT DEFAULT 'mesa', metodo_pago TEXT);
+    CREATE TABLE pedido_detalles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, pedido_id INTEGER, producto_id INTEGER,
+        cantidad INTEGER NOT NULL, precio_unitario REAL NOT NULL, subtotal REAL NOT NULL);
+    
+    INSERT INTO categorias (nombre) VALUES ('Bebidas');
+    INSERT INTO productos (nombre, precio, categoria_id, stock) VALUES ('Cerveza', 1500.5, 1, 10);
+    INSERT INTO mesas (numero) VALUES (1), (2);
+    INSERT INTO usuarios (nombre) VALUES ('Ana');
+    INSERT INTO pedidos (mesa_id, usuario_id, fecha_hora, total, estado, metodo_pago)
+        VALUES (1, 1, '2024-03-01 21:00:00', 4501.5, 'finalizado', 'efectivo');
+    -- La misma línea cargada dos veces, antes de la clave única
+    INSERT INTO pedido_detalles (pedido_id, producto_id, cantidad, precio_unitario, subtotal)
+        VALUES (1, 1, 2, 1500.5, 3001.0), (1, 1, 1, 1500.5, 1500.5);
+    -- Dos pedidos abiertos en la misma mesa
+    INSERT INTO pedidos (mesa_id, usuario_id, fecha_hora, estado)
+        VALUES (2, 1, '2024-03-02 20:00:00', 'abierto'), (2, 1, '2024-03-02 20:05:00', 'abierto');
+'''
+
+def _base_original(ruta):
+    conn = sqlite3.connect(ruta)
+    conn.executescript(ESQUEMA_ORIGINAL)
+    conn.close()
+
+def test_base_existente_se_migra_en_el_lugar(tmp_path):
+    ruta = str(tmp_path / "bar_pos.db")
+    _base_original(ruta)
+    db = DatabaseManager(ruta)
+    try:
+        conn = db.get_connection()
+        assert get_version(conn) == VERSION_ACTUAL
+        # Líneas duplicadas unificadas en una
+        assert conn.execute(
+            "SELECT cantidad, subtotal = precio_unitario * 3 FROM pedido_detalles").fetchall() == [
+            (3, 1)]
+        # Un solo pedido abierto por mesa
+        assert conn.execute(
+            "SELECT COUNT(*) FROM pedidos WHERE mesa_id = 2 AND estado = 'abierto'").fetchone() == (1,)
+        # Resúmenes poblados desde los pedidos existentes y sin índice duplicado
+        assert db.verificar_resumenes() == []
+        indices = [fila[0] for fila in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'pedido_detalles'")]
+        assert "idx_pedido_detalles_pedido_producto" in indices
+        assert "idx_pedido_detalles_cobertura" not in indices
+        # Los datos existentes no se reemplazan por los iniciales
+        assert [c[1] for c in db.get_categorias()] == ["Bebidas"]
+    finally:
+        db.close()
+
+def test_importes_en_pesos_pasan_a_centavos(tmp_path):
+    ruta = str(tmp_path / "bar_pos.db")
+    _base_original(ruta)
+    db = DatabaseManager(ruta)
+    try:
+        conn = db.get_connection()
+        assert conn.execute("SELECT precio FROM productos").fetchone() == (150050,)
+        assert conn.execute("SELECT total FROM pedidos WHERE id = 1").fetchone() == (450150,)
+        assert conn.execute(
+            "SELECT precio_unitario, subtotal FROM pedido_detalles").fetchall() == [(150050, 450150)]
+        assert conn.execute(
+            "SELECT SUM(total) FROM resumen_ventas_mozo").fetchone() == (450150,)
+    finally:
+        db.close()
+    
+    # Reabrir una base al día no vuelve a convertir los importes
+    db = DatabaseManager(ruta)
+    try:
+        assert db.get_producto(1)[2] == 150050
+    finally:
+        db.close()
+
+def test_historico_en_pesos_se_convierte_al_adjuntarlo(db):
+    conn = sqlite3.connect(archivo.ruta_historico(db.db_name))
+    conn.executescript('''
+        CREATE TABLE pedidos (id INTEGER PRIMARY KEY, mesa_id INTEGER, usuario_id INTEGER,
+            fecha_hora DATETIME, total REAL, estado TEXT, tipo_venta TEXT, metodo_pago TEXT);
+        CREATE TABLE pedido_detalles (id INTEGER PRIMARY KEY, pedido_id INTEGER NOT NULL,
+            producto_id INTEGER, cantidad INTEGER NOT NULL, precio_unitario REAL NOT NULL,
+            subtotal REAL NOT NULL);
+        INSERT INTO pedidos VALUES (500, NULL, 1, '2020-01-01 12:00:00', 12.5, 'finalizado', 'caja', 'efectivo');
+        INSERT INTO pedido_detalles VALUES (900, 500, 1, 1, 12.5, 12.5);
+    ''')
+    conn.close()
+    
+    for _ in range(2):  # la segunda vez ya está al día
+        pedido = db.get_pedido_completo(500)
+        assert pedido['pedido'][2] == 1250
+        assert [d[:3] for d in pedido['detalles']] == [(1, 1250, 1250)]
@@ -0,0 +1,48 @@
+# test_moneda.py - Conversión de importes a centavos
+import pytest
+
+from moneda import a_centavos, a_pesos, formatear
+
+@pytest.mark.parametrize("texto", ["1.500", "12.500", "1,500", "-1.500", "$ 1.500"])
+def test_separador_unico_con_tres_digitos_es_ambiguo(texto):
+    with pytest.raises(ValueError, match="ambiguo"):
+        a_centavos(texto)
+
+@pytest.mark.parametrize("valor, centavos", [
+    ("1.500,50", 150050),
+    ("1,500.50", 150050),
+    ("1.500,00", 150000),
+    ("1,5", 150),
+    ("1.5", 150),
+    ("1500", 150000),
+    ("1.234.567", 123456700),
+    ("1,234,567", 123456700),
+    ("1.234.567,89", 123456789),
+    ("1,234,567.89", 123456789),
+    ("1234.500", 123450),
+    (1.125, 113),
+    (12, 1200),
+])
+def test_a_centavos(valor, centavos):
+    assert a_centavos(valor) == centavos
+
+@pytest.mark.parametrize("texto", ["12,34,567", "1.234.56", "1234.567,50", "1.234,567.5"])
+def test_grupos_de_miles_mal_formados(texto):
+    with pytest.raises(ValueError, match="inválido"):
+        a_centavos(texto)
+
+@pytest.mark.parametrize("texto, miles, centavos", [
+    ("1.500", ".", 150000),
+    ("1,500", ",", 150000),
+    ("1.500", ",", 150),
+    ("1,500", ".", 150),
+    ("1.500,50", ".", 150050),
+])
+def test_separador_de_miles_indicado(texto, miles, centavos):
+    assert a_centavos(texto, miles) == centavos
+
+def test_a_pesos_y_formatear():
+    assert a_pesos(150050) == "1500.50"
+    assert a_pesos(150000) == "1500"
+    assert formatear(150050) == "$1,500.50"
+    assert formatear(-150000) == "-$1,500"
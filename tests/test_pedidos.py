@@ -0,0 +1,47 @@
+# test_pedidos.py - Líneas de pedido y total incremental
+import pytest
+
+def _total(db, pedido_id):
+    return db.get_connection().execute(
+        "SELECT total FROM pedidos WHERE id = ?", (pedido_id,)).fetchone()[0]
+
+def _suma_lineas(db, pedido_id):
+    return sum(d[4] for d in db.get_detalles_pedido(pedido_id))
+
+def test_mismo_producto_acumula_una_linea(db):
+    pedido_id = db.crear_pedido(1, 1)
+    primera = db.agregar_producto_pedido(pedido_id, 1, 2)
+    segunda = db.agregar_producto_pedido(pedido_id, 1, 3)
+    
+    assert segunda[0] == primera[0]
+    assert segunda[1:] == (5, primera[2], primera[2] * 5)
+    assert len(db.get_detalles_pedido(pedido_id)) == 1
+    assert _total(db, pedido_id) == _suma_lineas(db, pedido_id) == primera[2] * 5
+
+def test_linea_existente_conserva_su_precio(db):
+    pedido_id = db.crear_pedido(1, 1)
+    precio = db.agregar_producto_pedido(pedido_id, 1, 1)[2]
+    with db.transaccion() as cursor:
+        cursor.execute("UPDATE productos SET precio = precio * 2 WHERE id = 1")
+    
+    linea = db.agregar_producto_pedido(pedido_id, 1, 1)
+    assert linea[2:] == (precio, precio * 2)
+    assert _total(db, pedido_id) == precio * 2
+
+def test_total_incremental_con_varias_lineas_y_bajas(db):
+    pedido_id = db.crear_pedido(1, 1)
+    lineas = db.agregar_productos_pedido(pedido_id, [(1, 2), (2, 1), (1, 1)])
+    assert len({linea[0] for linea in lineas}) == 2
+    assert _total(db, pedido_id) == _suma_lineas(db, pedido_id)
+    
+    db.eliminar_detalle_pedido(lineas[1][0])
+    assert _total(db, pedido_id) == _suma_lineas(db, pedido_id) == lineas[2][3]
+
+def test_pedido_cerrado_no_admite_lineas(db):
+    pedido_id = db.crear_pedido(1, 1)
+    db.agregar_producto_pedido(pedido_id, 1, 1)
+    db.finalizar_pedido(pedido_id, 'efectivo')
+    with pytest.raises(ValueError, match="cerrado"):
+        db.agregar_producto_pedido(pedido_id, 1, 1)
+    with pytest.raises(ValueError, match="no está activo"):
+        db.agregar_producto_pedido(db.crear_pedido(2, 1), 999, 1)
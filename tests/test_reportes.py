@@ -0,0 +1,41 @@
+# test_reportes.py - Consultas de reportes en segundo plano
+import time
+
+from reportes import ConsultaReporte
+
+class RaizFalsa:
+    """Reemplaza a root.after de Tk: guarda las funciones programadas"""
+    
+    def __init__(self):
+        self.programadas = []
+    
+    def after(self, ms, funcion):
+        self.programadas.append(funcion)
+        return len(self.programadas)
+    
+    def after_cancel(self, identificador):
+        pass
+    
+    def procesar(self, plazo=5):
+        limite = time.time() + plazo
+        while self.programadas and time.time() < limite:
+            self.programadas.pop(0)()
+            time.sleep(0.01)
+
+def test_cada_reporte_libera_su_conexion(db):
+    pedido_id = db.crear_pedido(1, 1)
+    db.agregar_producto_pedido(pedido_id, 1, 2)
+    db.finalizar_pedido(pedido_id, 'efectivo')
+    
+    raiz = RaizFalsa()
+    filas, terminados = [], []
+    for _ in range(10):
+        consulta = ConsultaReporte(db, raiz, 'dia', "2000-01-01", "2100-01-01",
+                                   filas.extend, lambda: terminados.append(True),
+                                   lambda e: terminados.append(e))
+        raiz.procesar()
+        consulta._hilo.join(5)
+    
+    assert terminados == [True] * 10
+    assert len(filas) == 10
+    assert db.conexiones.abiertas() == 1
@@ -0,0 +1,50 @@
+# test_resumenes.py - Resúmenes de ventas mantenidos al cerrar pedidos
+import pytest
+
+def _resumen_mozo(db):
+    return db.get_connection().execute('''
+        SELECT metodo_pago, pedidos, total, cancelados, total_cancelado
+        FROM resumen_ventas_mozo ORDER BY metodo_pago
+    ''').fetchall()
+
+def _pedido(db, mesa_id, items):
+    pedido_id = db.crear_pedido(mesa_id, 1)
+    db.agregar_productos_pedido(pedido_id, items)
+    return pedido_id
+
+def test_finalizar_y_cancelar_mantienen_los_resumenes(db):
+    assert db.verificar_resumenes() == []
+    
+    finalizado = _pedido(db, 1, [(1, 2), (2, 1)])
+    db.finalizar_pedido(finalizado, 'tarjeta')
+    assert db.verificar_resumenes() == []
+    
+    cancelado = _pedido(db, 2, [(1, 1)])
+    db.cancelar_pedido(cancelado)
+    assert db.verificar_resumenes() == []
+    
+    total = db.get_pedido_completo(finalizado)['pedido'][2]
+    total_cancelado = db.get_pedido_completo(cancelado)['pedido'][2]
+    assert _resumen_mozo(db) == [('', 0, 0, 1, total_cancelado), ('tarjeta', 1, total, 0, 0)]
+    cantidades = db.get_connection().execute(
+        "SELECT producto_id, SUM(cantidad) FROM resumen_ventas_producto GROUP BY producto_id"
+    ).fetchall()
+    assert cantidades == [(1, 2), (2, 1)]
+
+def test_finalizar_fallido_no_toca_los_resumenes(db):
+    pedido_id = _pedido(db, 1, [(1, 1)])
+    db.finalizar_pedido(pedido_id, 'efectivo')
+    antes = _resumen_mozo(db)
+    with pytest.raises(ValueError):
+        db.finalizar_pedido(pedido_id, 'efectivo')
+    assert _resumen_mozo(db) == antes
+
+def test_verificar_detecta_y_reconstruir_corrige(db):
+    pedido_id = _pedido(db, 1, [(1, 1)])
+    db.finalizar_pedido(pedido_id, 'efectivo')
+    with db.transaccion() as cursor:
+        cursor.execute("UPDATE resumen_ventas_mozo SET total = total + 1")
+    
+    assert db.verificar_resumenes()
+    assert db.reconstruir_resumenes() == []
+    assert db.verificar_resumenes() == []
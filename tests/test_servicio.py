@@ -0,0 +1,85 @@
+# test_servicio.py - Servicio local de pedidos
+import time
+
+import pytest
+
+from reportes import Reportes
+from servicio import ServicioPedidos, ClienteServicio
+
+@pytest.fixture
+def servicio(tmp_path):
+    servicio = ServicioPedidos(str(tmp_path / "bar_pos.db"), puerto=0)
+    servicio.iniciar()
+    yield servicio
+    servicio.detener()
+
+def test_reconexiones_no_acumulan_conexiones(servicio):
+    for _ in range(50):
+        cliente = ClienteServicio(servicio.direccion)
+        assert cliente.get_mesas()
+        cliente.close()
+    
+    # Los hilos de las conexiones cerradas terminan apenas el servidor lee el cierre
+    limite = time.time() + 5
+    while servicio.db.conexiones.abiertas() > 2 and time.time() < limite:
+        time.sleep(0.05)
+    assert servicio.db.conexiones.abiertas() <= 2  # escritor y hilo principal
+
+def test_escrituras_y_lecturas_por_el_servicio(servicio):
+    cliente = ClienteServicio(servicio.direccion)
+    try:
+        pedido_id = cliente.crear_pedido(1, 1)
+        cliente.agregar_producto_pedido(pedido_id, 1, 2)
+        detalles = cliente.get_detalles_pedido(pedido_id)
+        assert [(d[2], d[4]) for d in detalles] == [(2, detalles[0][3] * 2)]
+        with pytest.raises(ValueError):
+            cliente.agregar_producto_pedido(pedido_id, 999, 1)
+    finally:
+        cliente.close()
+
+def test_reporte_por_paginas_desde_el_servicio(servicio):
+    conn = servicio.db.get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO resumen_ventas_mozo (fecha, usuario_id, metodo_pago, pedidos, total) "
+            "VALUES (?, 1, 'efectivo', 1, ?)",
+            [(f"2024-01-{dia:02d}", dia * 100) for dia in range(1, 8)])
+    local = list(Reportes(servicio.db).paginas('dia', "2024-01-01", "2024-02-01", 3))
+    
+    cliente = ClienteServicio(servicio.direccion)
+    try:
+        remoto = list(Reportes(cliente).paginas('dia', "2024-01-01", "2024-02-01", 3))
+        assert [len(pagina) for pagina in remoto] == [3, 3, 1]
+        assert remoto == local
+        assert cliente.get_reporte_pagina('dia', "2024-01-01", "2024-02-01", 6, 3) == local[2]
+        assert list(Reportes(cliente).paginas('dia', "2023-01-01", "2023-02-01", 3)) == []
+    finally:
+        cliente.close()
+
+def test_resultados_con_la_forma_de_database_manager(servicio):
+    db = servicio.db
+    cliente = ClienteServicio(servicio.direccion)
+    try:
+        pedido_id = cliente.crear_pedido(1, 1)
+        assert isinstance(cliente.agregar_producto_pedido(pedido_id, 1, 1), tuple)
+        for metodo, args in [
+            ('get_mesas', ()),
+            ('get_categorias', ()),
+            ('get_productos_por_categoria', ()),
+            ('get_producto', (1,)),
+            ('get_producto', (999,)),
+            ('buscar_productos', ("zzz",)),
+            ('get_pedido_activo_mesa', (1,)),
+            ('get_pedido_activo_mesa', (2,)),
+            ('get_detalles_pedido', (pedido_id,)),
+            ('get_pedido_completo', (pedido_id,)),
+            ('get_pedido_completo', (999,)),
+            ('get_cambios_desde', (0,)),
+            ('verificar_resumenes', ()),
+        ]:
+            assert getattr(cliente, metodo)(*args) == getattr(db, metodo)(*args), metodo
+        cliente.finalizar_pedido(pedido_id, "efectivo")
+        assert cliente.get_pedidos_finalizados("2000-01-01", "2100-01-01") == [pedido_id]
+        assert cliente.get_pedido_completo(pedido_id) == db.get_pedido_completo(pedido_id)
+    finally:
+        cliente.close()
@@ -0,0 +1,63 @@
+# test_stock.py - Descuento de stock y alertas de stock bajo
+import pytest
+
+from database import DatabaseManager, get_db
+
+def _vender_hasta_el_minimo(db, mesa_id=1):
+    """Vende un producto hasta dejarlo por debajo de su mínimo; devuelve (id, alertas)"""
+    producto_id, stock, minimo = db.get_connection().execute(
+        "SELECT id, stock, stock_minimo FROM productos WHERE activo = 1 ORDER BY id LIMIT 1"
+    ).fetchone()
+    pedido_id = db.crear_pedido(mesa_id, 1)
+    db.agregar_producto_pedido(pedido_id, producto_id, stock - minimo + 1)
+    return producto_id, db.finalizar_pedido(pedido_id, 'efectivo')
+
+def _base(tmp_path, politica):
+    return DatabaseManager(str(tmp_path / "bar_pos.db"), politica)
+
+@pytest.mark.parametrize("politica, con_alertas", [('advertir', True), ('permitir', False)])
+def test_alertas_segun_politica(tmp_path, politica, con_alertas):
+    db = _base(tmp_path, politica)
+    try:
+        producto_id, alertas = _vender_hasta_el_minimo(db)
+        assert bool(alertas) == con_alertas
+        # El producto queda en alerta igual, aunque 'permitir' no lo avise al vender
+        assert producto_id in [p[0] for p in db.get_productos_stock_bajo()]
+    finally:
+        db.close()
+
+def test_rechazar_sin_stock(tmp_path):
+    db = _base(tmp_path, 'rechazar')
+    try:
+        pedido_id = db.crear_pedido(1, 1)
+        db.agregar_producto_pedido(pedido_id, 1, 10 ** 6)
+        with pytest.raises(ValueError, match="Stock insuficiente"):
+            db.finalizar_pedido(pedido_id, 'efectivo')
+    finally:
+        db.close()
+
+def test_politica_desde_la_configuracion(tmp_path, monkeypatch):
+    monkeypatch.delenv("BAR_POS_SERVICIO", raising=False)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("BAR_POS_POLITICA_STOCK", "rechazar")
+    db = get_db()
+    try:
+        assert db.politica_stock == 'rechazar'
+    finally:
+        db.close()
+    
+    monkeypatch.setenv("BAR_POS_POLITICA_STOCK", "nada")
+    with pytest.raises(ValueError):
+        get_db()
+
+def test_stock_bajo_vendido_desde_otra_terminal(tmp_path):
+    terminal_a = _base(tmp_path, 'advertir')
+    terminal_b = _base(tmp_path, 'advertir')
+    try:
+        assert terminal_a.get_productos_stock_bajo() == []
+        producto_id, alertas = _vender_hasta_el_minimo(terminal_b)
+        assert alertas
+        assert [p[0] for p in terminal_a.get_productos_stock_bajo()] == [producto_id]
+    finally:
+        terminal_a.close()
+        terminal_b.close()
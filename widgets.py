@@ -0,0 +1,313 @@
+# widgets.py - Componentes reutilizables de la interfaz del POS
+import bisect
+import tkinter as tk
+from tkinter import ttk
+
+from moneda import formatear
+
+# Color de cada mesa según su estado
+COLORES_MESA = {
+    'libre': '#2ecc71',
+    'ocupada': '#e74c3c',
+    'reservada': '#f39c12'
+}
+
+class MapaMesas:
+    """Grilla de mesas con un botón por mesa que solo se reconfigura si cambió"""
+    
+    def __init__(self, parent, al_seleccionar, cols=3):
+        self.parent = parent
+        self.al_seleccionar = al_seleccionar
+        self.cols = cols
+        self._botones = {}   # mesa_id -> botón
+        self._mesas = {}     # mesa_id -> (id, numero, capacidad, estado)
+        self._posiciones = {}  # mesa_id -> índice en la grilla
+        
+        # Configurar columnas para que se expandan uniformemente
+        for i in range(cols):
+            self.parent.grid_columnconfigure(i, weight=1)
+    
+    def get_mesa(self, mesa_id):
+        """Obtiene el último estado conocido de una mesa"""
+        return self._mesas.get(mesa_id)
+    
+    def actualizar(self, mesas):
+        """Aplica el resultado de get_mesas() tocando solo las mesas que cambiaron"""
+        vistas = set()
+        for i, mesa in enumerate(mesas):
+            mesa = tuple(mesa)
+            vistas.add(mesa[0])
+            self.actualizar_mesa(mesa, i)
+        
+        # Quitar mesas que ya no existen
+        for mesa_id in list(self._botones):
+            if mesa_id not in vistas:
+                self._botones.pop(mesa_id).destroy()
+                del self._mesas[mesa_id]
+                del self._posiciones[mesa_id]
+    
+    def actualizar_mesa(self, mesa, posicion=None):
+        """Crea o actualiza el botón de una sola mesa"""
+        mesa = tuple(mesa)
+        mesa_id, numero, capacidad, estado = mesa
+        boton = self._botones.get(mesa_id)
+        
+        if boton is None:
+            boton = tk.Button(self.parent, text=f"Mesa {numero}",
+                              command=lambda m_id=mesa_id: self.al_seleccionar(self._mesas[m_id]),
+                              font=('Arial', 10, 'bold'),
+                              bg=COLORES_MESA.get(estado, '#95a5a6'), fg="white",
+                              width=8, height=3)
+            self._botones[mesa_id] = boton
+            if posicion is None:
+                posicion = len(self._posiciones)
+        elif self._mesas[mesa_id] != mesa:
+            anterior = self._mesas[mesa_id]
+            if anterior[3] != estado:
+                boton.configure(bg=COLORES_MESA.get(estado, '#95a5a6'))
+            if anterior[1] != numero:
+                boton.configure(text=f"Mesa {numero}")
+        
+        self._mesas[mesa_id] = mesa
+        
+        if posicion is not None and self._posiciones.get(mesa_id) != posicion:
+            self._posiciones[mesa_id] = posicion
+            boton.grid(row=posicion // self.cols, column=posicion % self.cols,
+                       padx=2, pady=2, sticky="ew")
+
+class GrillaProductos:
+    """Grilla de productos virtualizada
+    
+    Solo existen botones para las filas visibles (más una de margen); al
+    desplazarse, los botones que salen de la vista se reutilizan para las filas
+    que entran. El costo de mostrar una categoría no depende del tamaño del menú.
+    """
+    
+    def __init__(self, parent, al_seleccionar, cols=3, alto_fila=76):
+        self.al_seleccionar = al_seleccionar
+        self.cols = cols
+        self.alto_fila = alto_fila
+        self._productos = []
+        self._libres = []      # botones disponibles: (botón, item del canvas)
+        self._visibles = {}    # índice de producto -> (botón, item del canvas)
+        self._indices = {}     # botón -> índice de producto que muestra
+        
+        self.canvas = tk.Canvas(parent, bg="#ecf0f1", highlightthickness=0,
+                                yscrollincrement=alto_fila // 4)
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self._desplazar)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        
+        self.canvas.bind("<Configure>", lambda e: self._refrescar(reubicar=True))
+        self._bind_rueda(self.canvas)
+    
+    def _bind_rueda(self, widget):
+        """Desplaza la grilla con la rueda del mouse (Windows/macOS y X11)"""
+        widget.bind("<MouseWheel>", lambda e: self._desplazar("scroll", -1 if e.delta > 0 else 1, "units"))
+        widget.bind("<Button-4>", lambda e: self._desplazar("scroll", -1, "units"))
+        widget.bind("<Button-5>", lambda e: self._desplazar("scroll", 1, "units"))
+    
+    def mostrar(self, productos):
+        """Muestra una nueva lista de productos (id, nombre, precio, stock, categoria)"""
+        self._productos = productos
+        filas = (len(productos) + self.cols - 1) // self.cols
+        self.canvas.configure(scrollregion=(0, 0, 0, filas * self.alto_fila))
+        self.canvas.yview_moveto(0)
+        
+        # Todos los botones visibles deben volver a pintarse con su nuevo producto
+        for indice in list(self._visibles):
+            self._liberar(indice)
+        self._refrescar()
+    
+    def _desplazar(self, *args):
+        """Desplaza la vista y materializa las filas que quedan visibles"""
+        self.canvas.yview(*args)
+        self._refrescar()
+    
+    def _rango_visible(self):
+        """Índices de productos que caen dentro de la vista actual"""
+        arriba = self.canvas.canvasy(0)
+        alto = max(self.canvas.winfo_height(), self.alto_fila)
+        primera = max(int(arriba // self.alto_fila), 0)
+        ultima = int((arriba + alto) // self.alto_fila) + 1
+        return range(primera * self.cols, min(len(self._productos), (ultima + 1) * self.cols))
+    
+    def _refrescar(self, reubicar=False):
+        """Sincroniza los botones materializados con el rango visible"""
+        rango = self._rango_visible()
+        
+        for indice in list(self._visibles):
+            if indice not in rango:
+                self._liberar(indice)
+        
+        ancho_col = max(self.canvas.winfo_width() // self.cols, 1)
+        for indice in rango:
+            if indice in self._visibles:
+                if reubicar:
+                    self._ubicar(indice, ancho_col)
+                continue
+            
+            boton, item = self._libres.pop() if self._libres else self._crear_boton()
+            prod_id, nombre, precio, stock, categoria = self._productos[indice]
+            boton.configure(text=f"{nombre}\n{formatear(precio)}")
+            self._visibles[indice] = (boton, item)
+            self._indices[boton] = indice
+            self._ubicar(indice, ancho_col)
+            self.canvas.itemconfigure(item, state="normal")
+    
+    def _ubicar(self, indice, ancho_col):
+        """Posiciona el botón de un producto en su celda"""
+        boton, item = self._visibles[indice]
+        fila, col = divmod(indice, self.cols)
+        self.canvas.coords(item, col * ancho_col + 2, fila * self.alto_fila + 2)
+        self.canvas.itemconfigure(item, width=ancho_col - 4, height=self.alto_fila - 4)
+    
+    def _crear_boton(self):
+        """Crea un botón nuevo para el pool"""
+        boton = tk.Button(self.canvas, font=('Arial', 9, 'bold'),
+                          bg="#3498db", fg="white", wraplength=100)
+        boton.configure(command=lambda b=boton: self._click(b))
+        # La rueda del mouse sobre un botón también desplaza la grilla
+        self._bind_rueda(boton)
+        item = self.canvas.create_window(0, 0, window=boton, anchor="nw", state="hidden")
+        return boton, item
+    
+    def _liberar(self, indice):
+        """Oculta el botón de un producto y lo devuelve al pool"""
+        boton, item = self._visibles.pop(indice)
+        self._indices.pop(boton, None)
+        self.canvas.itemconfigure(item, state="hidden")
+        self._libres.append((boton, item))
+    
+    def _click(self, boton):
+        """Notifica el producto del botón presionado"""
+        indice = self._indices.get(boton)
+        if indice is not None:
+            self.al_seleccionar(self._productos[indice])
+
+class PanelPedido:
+    """Lista del pedido con una fila por detalle, actualizada en forma incremental
+    
+    Las filas se indexan por id de detalle: agregar, cambiar la cantidad o
+    quitar un producto toca solo esa fila, y el total se ajusta con la
+    diferencia en lugar de volver a sumar el pedido.
+    """
+    
+    def __init__(self, parent, al_eliminar, al_cambiar=None):
+        self.al_eliminar = al_eliminar
+        self.al_cambiar = al_cambiar
+        self.total = 0
+        self._filas = {}   # detalle_id -> (item_frame, resumen_label, detalle)
+        self._orden = []   # (nombre, detalle_id) ordenado, como get_detalles_pedido
+        
+        # Crear lista con scroll
+        self.canvas = tk.Canvas(parent, bg="white")
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.canvas.yview)
+        self.scrollable_frame = tk.Frame(self.canvas, bg="white")
+        
+        self.scrollable_frame.bind(
+            "<Configure>",
+            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        )
+        
+        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+    
+    def __len__(self):
+        return len(self._filas)
+    
+    def cargar(self, detalles):
+        """Sincroniza el panel con get_detalles_pedido() aplicando solo las diferencias"""
+        vistos = set()
+        for detalle in detalles:
+            vistos.add(detalle[0])
+            self.aplicar_linea(detalle, notificar=False)
+        
+        for detalle_id in list(self._filas):
+            if detalle_id not in vistos:
+                self.quitar_linea(detalle_id, notificar=False)
+        
+        self._notificar()
+    
+    def limpiar(self):
+        """Quita todas las filas"""
+        self.cargar([])
+    
+    def aplicar_linea(self, detalle, notificar=True):
+        """Inserta o actualiza una fila (id, nombre, cantidad, precio_unitario, subtotal)"""
+        detalle = tuple(detalle)
+        detalle_id, nombre, cantidad, precio_unit, subtotal = detalle
+        texto = f"{cantidad} x {formatear(precio_unit)} = {formatear(subtotal)}"
+        fila = self._filas.get(detalle_id)
+        
+        if fila is None:
+            item_frame, resumen = self._crear_fila(detalle, texto)
+            self.total += subtotal
+        else:
+            item_frame, resumen, anterior = fila
+            if anterior == detalle:
+                return
+            resumen.configure(text=texto)
+            self.total += subtotal - anterior[4]
+        
+        self._filas[detalle_id] = (item_frame, resumen, detalle)
+        if notificar:
+            self._notificar()
+    
+    def quitar_linea(self, detalle_id, notificar=True):
+        """Quita la fila de un detalle"""
+        fila = self._filas.pop(detalle_id, None)
+        if fila is None:
+            return
+        
+        item_frame, resumen, detalle = fila
+        self._orden.remove((detalle[1], detalle_id))
+        item_frame.destroy()
+        self.total -= detalle[4]
+        if notificar:
+            self._notificar()
+    
+    def _crear_fila(self, detalle, texto):
+        """Crea los widgets de una fila en su posición ordenada por nombre"""
+        detalle_id, nombre = detalle[0], detalle[1]
+        
+        # Frame para cada item
+        item_frame = tk.Frame(self.scrollable_frame, bg="white", relief="solid", bd=1)
+        clave = (nombre, detalle_id)
+        posicion = bisect.bisect(self._orden, clave)
+        if posicion < len(self._orden):
+            siguiente = self._filas[self._orden[posicion][1]][0]
+            item_frame.pack(fill="x", padx=2, pady=1, before=siguiente)
+        else:
+            item_frame.pack(fill="x", padx=2, pady=1)
+        self._orden.insert(posicion, clave)
+        
+        # Información del producto
+        info_frame = tk.Frame(item_frame, bg="white")
+        info_frame.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        
+        tk.Label(info_frame, text=nombre, font=('Arial', 10, 'bold'),
+                bg="white", anchor="w").pack(fill="x")
+        
+        resumen = tk.Label(info_frame, text=texto,
+                           font=('Arial', 9), bg="white", fg="#666", anchor="w")
+        resumen.pack(fill="x")
+        
+        # Botón eliminar
+        del_btn = tk.Button(item_frame, text="✕", 
+                           command=lambda d_id=detalle_id: self.al_eliminar(d_id),
+                           font=('Arial', 8, 'bold'), bg="#e74c3c", fg="white",
+                           width=3)
+        del_btn.pack(side="right", padx=5, pady=5)
+        
+        return item_frame, resumen
+    
+    def _notificar(self):
+        """Avisa el nuevo total y la cantidad de líneas"""
+        if self.al_cambiar:
+            self.al_cambiar(self.total, len(self._filas))